@@ -1,10 +1,15 @@
 from django.contrib import admin
+from django.urls import reverse
+from django.utils.http import urlencode
 
-from .models import Author, Book, BookInstance, Genre, Language
+from catalog import archive
+from .models import (ArchivedBookInstance, Author, Book, BookInstance, Branch,
+                     Genre, Language, Task)
 
 # Register your models here.
 admin.site.register(Genre)
 admin.site.register(Language)
+admin.site.register(Branch)
 
 class BookInline(admin.TabularInline):
     model = Book
@@ -29,18 +34,69 @@ class BookInstanceInline(admin.TabularInline):
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
     list_display = ['title', 'author', 'display_genre']
+    list_select_related = ['author']
     inlines = [BookInstanceInline]
 
 @admin.register(BookInstance)
 class BookInstanceAdmin(admin.ModelAdmin):
-    list_filter = ('status', 'due_back')
+    list_filter = ('status', 'due_back', 'branch')
 
     list_display = ['display_title', 'status', 'borrower', 'due_back', 'id']
+    list_select_related = ['book', 'borrower']
+    search_fields = ['book__title', 'imprint', 'borrower__username']
     fieldsets = (
         (None, {
             'fields': ('book', 'imprint', 'id')
         }),
         ('Availability', {
-            'fields': [('status', 'due_back', 'borrower')]
+            'fields': [('status', 'due_back', 'borrower'), 'branch']
         })
     )
+
+    # Archived copies listed under the search results
+    archived_match_limit = 20
+
+    def changelist_view(self, request, extra_context=None):
+        """List archived copies matching the search below the live ones."""
+        query = request.GET.get('q')
+        if query:
+            archive_admin = self.admin_site._registry[ArchivedBookInstance]
+            archived, _ = archive_admin.get_search_results(
+                request, ArchivedBookInstance.objects.select_related('book'), query)
+            extra_context = {
+                **(extra_context or {}),
+                'archived_matches': archived[:self.archived_match_limit],
+                'archived_count': archived.count(),
+                'archive_search_url': '{}?{}'.format(
+                    reverse('admin:catalog_archivedbookinstance_changelist'),
+                    urlencode({'q': query})),
+            }
+        return super().changelist_view(request, extra_context)
+
+@admin.register(ArchivedBookInstance)
+class ArchivedBookInstanceAdmin(admin.ModelAdmin):
+    """Read-only view of archived copies; they come back with the restore
+        action or the `restore_archived` command.
+    """
+    list_filter = ('status', 'branch')
+    list_display = ['book', 'status', 'imprint', 'archived', 'id']
+    list_select_related = ['book']
+    search_fields = ['book__title', 'imprint', 'borrower__username']
+    actions = ['restore_copies']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description='Restore selected copies',
+                  permissions=['delete'])
+    def restore_copies(self, request, queryset):
+        copies, events = archive.restore(queryset.values_list('pk', flat=True))
+        self.message_user(request, f'Restored {copies} copies and {events} loan events.')
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_filter = ('status',)
+    list_display = ['name', 'status', 'attempts', 'run_at', 'created']
@@ -0,0 +1,234 @@
+"""
+Read-only JSON API for the catalog.
+
+    /catalog/api/books/?ids=1,2,3&fields=title,author&include=author
+    /catalog/api/authors/?after=42&limit=100
+
+* `fields` - comma separated fields to return; only those columns are read.
+* `ids` - fetch these primary keys in one query.
+* `include` - side-load related objects into `included`, one batched query
+  per relation.
+* `after`/`limit` - keyset pagination on the primary key; follow `next`.
+
+    /catalog/api/changes/?since=1200
+
+returns the change feed (see catalog.changefeed) for mirrors.
+
+A page therefore costs one query, plus one per many-to-many field requested
+and one per included relation, however many rows it holds.
+"""
+from django.core.exceptions import ValidationError
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
+
+from catalog import changefeed, inventory
+from catalog.models import Author, Book, BookInstance, Branch, Genre, Language
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class ApiError(Exception):
+    pass
+
+
+class Resource:
+    """How a model is exposed: its public fields and includable relations
+        (relation name -> resource name).
+    """
+    def __init__(self, model, fields, includes=None):
+        self.model = model
+        self.fields = fields
+        self.includes = includes or {}
+
+    def column(self, name):
+        """Database column (attname) behind a public field, or None for a
+            many-to-many field.
+        """
+        field = self.model._meta.get_field(name)
+        if field.many_to_many:
+            return None
+        return field.attname
+
+    def parse_fields(self, value):
+        if not value:
+            return list(self.fields)
+        fields = [name for name in value.split(',') if name]
+        unknown = set(fields) - set(self.fields)
+        if unknown:
+            raise ApiError(f'Unknown fields: {", ".join(sorted(unknown))}')
+        if 'id' not in fields:
+            fields.insert(0, 'id')
+        return fields
+
+    def parse_includes(self, value):
+        if not value:
+            return []
+        includes = [name for name in value.split(',') if name]
+        unknown = set(includes) - set(self.includes)
+        if unknown:
+            raise ApiError(f'Cannot include: {", ".join(sorted(unknown))}')
+        return includes
+
+    def fetch(self, fields, queryset=None):
+        """Rows for `queryset` as dicts holding only `fields`."""
+        if queryset is None:
+            queryset = self.model.objects.all()
+        columns = [self.column(name) for name in fields]
+        rows = list(queryset.values(*[c for c in columns if c]))
+        for row in rows:
+            for name, column in zip(fields, columns):
+                if column and column != name:
+                    row[name] = row.pop(column)
+
+        many_to_many = [name for name, column in zip(fields, columns) if not column]
+        if many_to_many and rows:
+            by_pk = {row['id']: row for row in rows}
+            for name in many_to_many:
+                for row in rows:
+                    row[name] = []
+                field = self.model._meta.get_field(name)
+                through = field.remote_field.through
+                source = field.m2m_field_name() + '_id'
+                target = field.m2m_reverse_field_name() + '_id'
+                pairs = through.objects\
+                        .filter(**{source + '__in': list(by_pk)})\
+                        .values_list(source, target)
+                for pk, related_pk in pairs:
+                    by_pk[pk][name].append(related_pk)
+        return rows
+
+
+RESOURCES = {
+    'books': Resource(Book,
+        ['id', 'title', 'author', 'summary', 'isbn', 'genre', 'language'],
+        {'author': 'authors', 'genre': 'genres', 'language': 'languages'}),
+    'authors': Resource(Author,
+        ['id', 'first_name', 'last_name', 'date_of_birth', 'date_of_death']),
+    'copies': Resource(BookInstance,
+        ['id', 'book', 'imprint', 'due_back', 'status', 'branch'],
+        {'book': 'books', 'branch': 'branches'}),
+    'branches': Resource(Branch, ['id', 'name', 'address']),
+    'genres': Resource(Genre, ['id', 'name']),
+    'languages': Resource(Language, ['id', 'name']),
+}
+
+
+def parse_limit(value, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    if not value:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ApiError('limit must be an integer')
+    if not 1 <= limit <= maximum:
+        raise ApiError(f'limit must be between 1 and {maximum}')
+    return limit
+
+
+def parse_ids(value, model):
+    """Primary keys from `value`, converted to the model's pk type."""
+    pk_field = model._meta.pk
+    try:
+        return [pk_field.to_python(pk) for pk in value.split(',') if pk]
+    except ValidationError:
+        raise ApiError(f'Invalid id in {value}')
+
+
+@require_GET
+def api_list(request, resource):
+    try:
+        spec = RESOURCES[resource]
+    except KeyError:
+        raise Http404(f'No API resource {resource}')
+
+    try:
+        fields = spec.parse_fields(request.GET.get('fields'))
+        includes = spec.parse_includes(request.GET.get('include'))
+        limit = parse_limit(request.GET.get('limit'))
+
+        # Relations to side-load need their key in the rows
+        fetched = fields + [name for name in includes if name not in fields]
+
+        queryset = spec.model.objects.order_by('pk')
+        if request.GET.get('ids'):
+            queryset = queryset.filter(pk__in=parse_ids(request.GET['ids'], spec.model))
+        if request.GET.get('after'):
+            after = parse_ids(request.GET['after'], spec.model)
+            if len(after) != 1:
+                raise ApiError('after must be a single id')
+            queryset = queryset.filter(pk__gt=after[0])
+    except ApiError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    # One extra row tells whether there is a next page
+    rows = spec.fetch(fetched, queryset[:limit + 1])
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+
+    included = {}
+    for name in includes:
+        related_ids = set()
+        for row in rows:
+            value = row[name]
+            related_ids.update(value if isinstance(value, list) else [value])
+        related_ids.discard(None)
+        related_name = spec.includes[name]
+        related = RESOURCES[related_name]
+        included[related_name] = related.fetch(
+            list(related.fields),
+            related.model.objects.filter(pk__in=related_ids).order_by('pk'))
+        if name not in fields:
+            for row in rows:
+                del row[name]
+
+    response = {'data': rows}
+    if includes:
+        response['included'] = included
+    if has_next:
+        query = request.GET.copy()
+        query['after'] = str(rows[-1]['id'])
+        response['next'] = f'{request.path}?{query.urlencode()}'
+    return JsonResponse(response)
+
+
+@require_GET
+def book_availability(request, pk):
+    """Branches where copies of a book can be had right now, from the
+        availability index.
+    """
+    book = get_object_or_404(Book.objects.only('pk'), pk=pk)
+    return JsonResponse({'data': [
+        {'branch': row.branch_id,
+         'branch_name': row.branch.name if row.branch else None,
+         'available': row.count}
+        for row in inventory.available_at(book)
+    ]})
+
+
+@require_GET
+def changes(request):
+    """Catalog changes after sequence number `since`, oldest first, e.g.
+        /catalog/api/changes/?since=1200&limit=500. Clients store `next` and
+        pass it as `since` on their next call; `has_more` says whether to
+        call again straight away.
+    """
+    try:
+        try:
+            since = int(request.GET.get('since') or 0)
+        except ValueError:
+            raise ApiError('since must be an integer')
+        limit = parse_limit(request.GET.get('limit'),
+                            changefeed.DEFAULT_LIMIT, changefeed.MAX_LIMIT)
+    except ApiError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    entries = changefeed.changes_since(since, limit + 1)
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    return JsonResponse({
+        'data': [changefeed.serialize(entry) for entry in entries],
+        'next': entries[-1].position if entries else since,
+        'has_more': has_more,
+    })
@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CatalogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'catalog'
+
+    def ready(self):
+        # Connect signal receivers and register system checks
+        from catalog import checks, signals
+
+        if getattr(settings, 'LAZY_LOAD_DETECTION', None):
+            from catalog import lazyload
+            lazyload.install(settings.LAZY_LOAD_DETECTION)
@@ -0,0 +1,141 @@
+"""
+Hot/cold archival.
+
+Copies that have been out of circulation for a long time, and old loan
+history, are moved out of BookInstance and LoanEvent into
+ArchivedBookInstance and ArchivedLoanEvent, so the tables the loan lists and
+the admin scan only hold live rows. The policy is set with:
+
+* ARCHIVE_COPY_STATUSES - statuses of copies that may be archived;
+* ARCHIVE_COPY_IDLE_DAYS - days without loan activity or a due date before
+  such a copy is archived, together with its loan history;
+* ARCHIVE_LOAN_EVENT_DAYS - age after which the loan events of copies still
+  in circulation are archived.
+
+Rows move in batches, one transaction each, so an interrupted run loses
+nothing and the next run carries on. Rows keep their ids and can be moved
+back with `restore()`. Loan reports read the rollups, which are not
+affected.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from catalog import changefeed, inventory
+from catalog.middleware import invalidate_page_cache
+from catalog.models import (ArchivedBookInstance, ArchivedLoanEvent,
+                            BookInstance, LoanEvent)
+
+COPY_FIELDS = ['id', 'legacy_id', 'book_id', 'imprint', 'due_back', 'status',
+               'borrower_id', 'branch_id', 'version']
+EVENT_FIELDS = ['id', 'book_instance_id', 'book_id', 'borrower_id', 'kind',
+                'due_back', 'created']
+
+
+def days_ago(setting, default, now=None):
+    days = getattr(settings, setting, default)
+    return (now or timezone.now()) - datetime.timedelta(days=days)
+
+
+def cold_copies(now=None):
+    """Copies the policy says should be archived."""
+    cutoff = days_ago('ARCHIVE_COPY_IDLE_DAYS', 365, now)
+    recent_loans = LoanEvent.objects.filter(book_instance=OuterRef('pk'),
+                                            created__gte=cutoff)
+    return BookInstance.objects\
+            .filter(status__in=getattr(settings, 'ARCHIVE_COPY_STATUSES', ['m']))\
+            .filter(Q(due_back__isnull=True) | Q(due_back__lt=cutoff.date()))\
+            .exclude(Exists(recent_loans))
+
+
+def old_loan_events(now=None):
+    return LoanEvent.objects.filter(
+        created__lt=days_ago('ARCHIVE_LOAN_EVENT_DAYS', 2 * 365, now))
+
+
+def move_events(events):
+    """Move the LoanEvents `events` to the archive; returns how many."""
+    rows = list(events.order_by().values(*EVENT_FIELDS))
+    ArchivedLoanEvent.objects.bulk_create([ArchivedLoanEvent(**row) for row in rows])
+    LoanEvent.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+    return len(rows)
+
+
+def archive_copies(batch_size=500, now=None):
+    """Archive cold copies with their loan history; returns the number of
+        copies moved.
+    """
+    moved = 0
+    while True:
+        with transaction.atomic():
+            copies = cold_copies(now).order_by('pk')
+            if connection.features.has_select_for_update_skip_locked:
+                copies = copies.select_for_update(skip_locked=True)
+            rows = list(copies.values(*COPY_FIELDS)[:batch_size])
+            if not rows:
+                break
+            ids = [row['id'] for row in rows]
+            ArchivedBookInstance.objects.bulk_create(
+                [ArchivedBookInstance(**row) for row in rows])
+            move_events(LoanEvent.objects.filter(book_instance_id__in=ids))
+            # A model delete, so post_delete takes the copies out of the
+            # availability index
+            BookInstance.objects.filter(pk__in=ids).delete()
+        moved += len(rows)
+    return moved
+
+
+def archive_loan_events(batch_size=5000, now=None):
+    """Archive loan events older than the policy allows; returns how many."""
+    moved = 0
+    while True:
+        with transaction.atomic():
+            ids = list(old_loan_events(now).order_by('pk')
+                       .values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            moved += move_events(LoanEvent.objects.filter(pk__in=ids))
+    return moved
+
+
+def restore(copy_ids, batch_size=500):
+    """Move the copies `copy_ids` back from the archive, together with the
+        archived loan events of these copies. Returns (copies, events)
+        restored.
+    """
+    copies = events = 0
+    copy_ids = list(copy_ids)
+    for start in range(0, len(copy_ids), batch_size):
+        batch = copy_ids[start:start + batch_size]
+        with transaction.atomic():
+            rows = list(ArchivedBookInstance.objects.filter(pk__in=batch)
+                        .values(*COPY_FIELDS))
+            BookInstance.objects.bulk_create([BookInstance(**row) for row in rows])
+            for row in rows:
+                inventory.copy_changed(None, (row['book_id'], row['branch_id'],
+                                              row['status']))
+            changefeed.record_rows(BookInstance, [row['id'] for row in rows], 'c')
+            ArchivedBookInstance.objects.filter(pk__in=batch).delete()
+
+            # Only events whose copy is back in circulation, including any
+            # archived under the random id the copy had before rekey_copies
+            hot = BookInstance.objects.filter(pk__in=batch)
+            rekeyed = dict(hot.filter(legacy_id__isnull=False)
+                           .values_list('legacy_id', 'pk'))
+            archived_events = ArchivedLoanEvent.objects.filter(
+                Q(book_instance_id__in=hot.values('pk'))
+                | Q(book_instance_id__in=list(rekeyed)))
+            event_rows = list(archived_events.order_by().values(*EVENT_FIELDS))
+            for row in event_rows:
+                row['book_instance_id'] = rekeyed.get(row['book_instance_id'],
+                                                      row['book_instance_id'])
+            LoanEvent.objects.bulk_create([LoanEvent(**row) for row in event_rows])
+            archived_events.delete()
+        copies += len(rows)
+        events += len(event_rows)
+    if copies:
+        invalidate_page_cache()
+    return copies, events
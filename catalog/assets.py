@@ -0,0 +1,35 @@
+"""
+Serving fingerprinted static files.
+
+With ManifestStaticFilesStorage, `collectstatic` writes every asset under a
+name containing a hash of its contents (css/styles.55e7cbb9ba48.css) and
+`{% static %}` links to that name. A fingerprinted file never changes, so it
+can be cached by clients forever; a changed file gets a new name.
+"""
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+
+# Files named by ManifestStaticFilesStorage: <name>.<12 hex digits>.<ext>
+fingerprinted_re = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def is_fingerprinted(path):
+    return bool(fingerprinted_re.search(path))
+
+
+def serve_static(request, path):
+    """Serve a collected static file. Fingerprinted names are marked
+        immutable with a one year lifetime, anything else must be revalidated.
+    """
+    response = serve(request, path, document_root=settings.STATIC_ROOT)
+    if is_fingerprinted(path):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE,
+                            immutable=True)
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    return response
@@ -0,0 +1,160 @@
+"""
+Change feed for catalog mirrors.
+
+Every create, update and delete of a Book, Author, BookInstance, Genre or
+Language appends a ChangeLogEntry holding the new state of the row, in the
+same transaction as the change (the models save atomically). Mirrors poll
+/catalog/api/changes/?since=<seq> (or the `changes` command) with the last
+sequence number they applied and get the rows changed since, in batches.
+
+`compact()` deletes entries superseded by a newer entry for the same row, so
+the log grows with the number of rows rather than the number of changes, and
+eventually drops old delete tombstones. A mirror that has fallen behind the
+tombstone retention must re-export.
+
+The sequence number a mirror sees is the entry's `position`, not its `seq`:
+`seq` is taken at insert and transactions commit in any order, so a long
+transaction could commit a lower `seq` after higher ones were served.
+`sequence()` gives committed entries positions past every position given
+before, so an entry committed late lands after the cursor instead of behind
+it.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from catalog.models import (Author, Book, BookInstance, ChangeFeedPosition,
+                            ChangeLogEntry, Genre, Language)
+
+FEED_MODELS = (Author, Book, BookInstance, Genre, Language)
+
+# Fields not published to mirrors
+EXCLUDED_FIELDS = {
+    BookInstance: {'borrower'},
+}
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+
+
+def label(model):
+    return model._meta.label_lower
+
+
+def snapshot(instance):
+    """The published fields of `instance`, with many-to-many fields as
+        lists of ids.
+    """
+    model = type(instance)
+    excluded = EXCLUDED_FIELDS.get(model, set())
+    data = {field.attname: field.value_from_object(instance)
+            for field in model._meta.concrete_fields if field.name not in excluded}
+    for field in model._meta.many_to_many:
+        # Through the join table, so no related manager on the instance
+        data[field.name] = list(field.remote_field.through.objects
+                                .filter(**{field.m2m_field_name(): instance.pk})
+                                .order_by()
+                                .values_list(field.m2m_reverse_field_name() + '_id',
+                                             flat=True))
+    return data
+
+
+def record(instance, action):
+    """Log a change of `instance`; `action` is a ChangeLogEntry.action."""
+    model = type(instance)
+    if model not in FEED_MODELS:
+        return
+    ChangeLogEntry.objects.create(
+        model=label(model),
+        object_id=str(instance.pk),
+        action=action,
+        data=None if action == 'd' else snapshot(instance),
+    )
+
+
+def record_rows(model, pks, action='u'):
+    """Log changes of rows written without signals, e.g. by update()."""
+    if model not in FEED_MODELS:
+        return
+    pks = list(pks)
+    if action == 'd':
+        ChangeLogEntry.objects.bulk_create([
+            ChangeLogEntry(model=label(model), object_id=str(pk), action='d')
+            for pk in pks])
+        return
+    ChangeLogEntry.objects.bulk_create([
+        ChangeLogEntry(model=label(model), object_id=str(instance.pk),
+                       action=action, data=snapshot(instance))
+        for instance in model._base_manager.filter(pk__in=pks).order_by('pk')])
+
+
+def sequence(batch_size=MAX_LIMIT):
+    """Give committed entries without a position the next positions, in
+        `seq` order. Returns the number of entries sequenced.
+    """
+    if not ChangeLogEntry.objects.filter(position__isnull=True).exists():
+        return 0
+    with transaction.atomic():
+        # Lock the counter before reading the pending entries, so that a
+        # concurrent call waits and then finds them sequenced
+        counter = ChangeFeedPosition.objects.filter(pk=1)
+        if not counter.update(last=F('last')):
+            ChangeFeedPosition.objects.get_or_create(pk=1)
+            counter.update(last=F('last'))
+        last = counter.values_list('last', flat=True).get()
+        pending = list(ChangeLogEntry.objects.filter(position__isnull=True)
+                       .order_by('seq').only('seq')[:batch_size])
+        for offset, entry in enumerate(pending, 1):
+            entry.position = last + offset
+        ChangeLogEntry.objects.bulk_update(pending, ['position'])
+        counter.update(last=last + len(pending))
+    return len(pending)
+
+
+def changes_since(since, limit=DEFAULT_LIMIT):
+    """Up to `limit` entries after position `since`."""
+    sequence()
+    return list(ChangeLogEntry.objects
+                .filter(position__gt=since)
+                .order_by('position')[:limit])
+
+
+def serialize(entry):
+    return {
+        'seq': entry.position,
+        'model': entry.model,
+        'id': entry.object_id,
+        'action': entry.action,
+        'data': entry.data,
+        'created': entry.created,
+    }
+
+
+def compact(batch_size=5000, tombstone_days=None):
+    """Delete entries superseded by a newer one for the same row, then
+        delete tombstones older than `tombstone_days` (default
+        CHANGE_FEED_TOMBSTONE_DAYS). Returns the number of entries deleted.
+    """
+    if tombstone_days is None:
+        tombstone_days = getattr(settings, 'CHANGE_FEED_TOMBSTONE_DAYS', 30)
+    newer = ChangeLogEntry.objects.filter(model=OuterRef('model'),
+                                          object_id=OuterRef('object_id'),
+                                          seq__gt=OuterRef('seq'))
+    superseded = ChangeLogEntry.objects.filter(Exists(newer))
+    old_tombstones = ChangeLogEntry.objects.filter(
+        action='d',
+        created__lt=timezone.now() - datetime.timedelta(days=tombstone_days))
+
+    deleted = 0
+    for queryset in (superseded, old_tombstones):
+        while True:
+            with transaction.atomic():
+                seqs = list(queryset.order_by('seq')
+                            .values_list('seq', flat=True)[:batch_size])
+                if not seqs:
+                    break
+                deleted += ChangeLogEntry.objects.filter(seq__in=seqs).delete()[0]
+    return deleted
@@ -0,0 +1,83 @@
+"""
+Checking out "any available copy" of a book.
+
+Many librarians may ask for the same popular title at once. `check_out()`
+picks a few available copies and claims one with a conditional UPDATE
+(`... WHERE status = 'a'`), so a copy can only ever be claimed once. Where
+the backend supports it the candidates are first locked with
+SELECT ... FOR UPDATE SKIP LOCKED, so concurrent checkouts pick different
+copies instead of racing for the same one; on SQLite, which has no row
+locks, the candidates are shuffled and a lost race moves on to the next.
+
+A claim is a queryset update and sends no post_save, so the loan log, the
+availability index, the change feed and the page cache are updated here.
+"""
+import datetime
+import random
+from contextlib import nullcontext
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from catalog import changefeed, inventory
+from catalog.loans import record_loan_event
+from catalog.middleware import invalidate_page_cache
+from catalog.models import BookInstance
+
+LOAN_PERIOD = datetime.timedelta(weeks=3)
+
+# Available copies considered per attempt
+CANDIDATES = 10
+
+
+class NoCopyAvailable(Exception):
+    """Raised when every copy of the book is out or being claimed."""
+
+
+def check_out(book_id, borrower, branch_id=None, due_back=None, attempts=5):
+    """Lend `borrower` one available copy of the book, optionally at
+        `branch_id`, and return it. Raises NoCopyAvailable.
+    """
+    due_back = due_back or datetime.date.today() + LOAN_PERIOD
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    for _ in range(attempts):
+        # Without row locks there is nothing to hold between reading and
+        # claiming, and on SQLite a read before the write would make the
+        # transaction fail under contention instead of waiting its turn.
+        with transaction.atomic() if skip_locked else nullcontext():
+            candidates = BookInstance.objects.filter(book_id=book_id, status='a')
+            if branch_id is not None:
+                candidates = candidates.filter(branch_id=branch_id)
+            if skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+            candidates = list(candidates.order_by()
+                              .values_list('pk', 'branch_id')[:CANDIDATES])
+            if not candidates:
+                raise NoCopyAvailable(f'No copy of book {book_id} is available')
+            random.shuffle(candidates)
+
+            for pk, copy_branch_id in candidates:
+                book_instance = claim(pk, book_id, copy_branch_id, borrower, due_back)
+                if book_instance is not None:
+                    return book_instance
+        # Every candidate was claimed by someone else meanwhile; look again
+    raise NoCopyAvailable(f'No copy of book {book_id} is available')
+
+
+def claim(pk, book_id, branch_id, borrower, due_back):
+    """Lend copy `pk` if it is still available; returns it or None."""
+    with transaction.atomic():
+        claimed = BookInstance.objects.filter(pk=pk, status='a').update(
+            status='o',
+            borrower=borrower,
+            due_back=due_back,
+            version=F('version') + 1,
+        )
+        if not claimed:
+            return None
+        inventory.copy_changed((book_id, branch_id, 'a'), (book_id, branch_id, 'o'))
+        book_instance = BookInstance.objects.get(pk=pk)
+        record_loan_event(book_instance, 'c')
+        changefeed.record(book_instance, 'u')
+    invalidate_page_cache()
+    return book_instance
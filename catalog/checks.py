@@ -0,0 +1,51 @@
+"""
+System checks for settings that only work with a cache shared by all worker
+processes.
+"""
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Each process has its own copy, or none at all
+PER_PROCESS_CACHE_BACKENDS = [
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+]
+
+
+def per_process_cache(alias):
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    return backend in PER_PROCESS_CACHE_BACKENDS
+
+
+@register()
+def check_session_cache(app_configs, **kwargs):
+    """catalog.sessions keeps pending changes in the cache only, so another
+        worker wouldn't see them, nor a logout made elsewhere.
+    """
+    alias = getattr(settings, 'SESSION_CACHE_ALIAS', 'default')
+    if settings.SESSION_ENGINE != 'catalog.sessions' or not per_process_cache(alias):
+        return []
+    return [Error(
+        f"SESSION_ENGINE 'catalog.sessions' needs a cache shared by all "
+        f"workers, but the '{alias}' cache is per-process.",
+        hint="Point SESSION_CACHE_ALIAS at memcached or redis, or use "
+             "'django.contrib.sessions.backends.db'.",
+        id='catalog.E001',
+    )]
+
+
+@register()
+def check_rate_limit_cache(app_configs, **kwargs):
+    """RateLimitMiddleware's buckets and concurrency slots would each cover
+        one worker, multiplying the limits by the number of workers.
+    """
+    alias = getattr(settings, 'RATE_LIMIT_CACHE_ALIAS', 'default')
+    if not getattr(settings, 'RATE_LIMIT_ENABLED', True) or not per_process_cache(alias):
+        return []
+    return [Error(
+        f"RATE_LIMIT_ENABLED needs a cache shared by all workers, but the "
+        f"'{alias}' cache is per-process.",
+        hint="Point RATE_LIMIT_CACHE_ALIAS at memcached or redis, or set "
+             "RATE_LIMIT_ENABLED = False.",
+        id='catalog.E002',
+    )]
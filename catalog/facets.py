@@ -0,0 +1,324 @@
+"""
+Faceted browsing of the book list.
+
+Books can be narrowed by genre, language, author and availability. Values of
+one facet are alternatives (fantasy OR poetry), facets combine with AND.
+
+Matching and counting never touch the Book table. A facet index is built
+once from the narrow (id, language, author) and (book, genre) columns and
+cached until a book, author, genre or language changes:
+
+for every facet value, a bitmap (a Python int) of the ids of its books.
+
+The books with status 'a' in the availability index form one more bitmap,
+rebuilt when a copy becomes available or stops being so. Filtering is then
+a few big-int ORs and ANDs, and the count for each value of a facet is
+either precomputed (no other facet selected) or the population count of its
+bitmap ANDed with the books matching the other facets, taken only for the
+values with the most books until the rest can't be shown. The book list
+pages through the matching bitmap without listing all of its ids.
+
+Invalidation happens again when the writing transaction commits, so that an
+index a concurrent request built from the rows as they were before the
+commit doesn't outlive it.
+"""
+import heapq
+import uuid
+from collections import defaultdict
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+
+from catalog.models import Author, Book, BookAvailability, Genre, Language
+
+FACETS = [
+    ('genre', _('Genre')),
+    ('language', _('Language')),
+    ('author', _('Author')),
+    ('available', _('Availability')),
+]
+
+# Most frequent values shown per facet, besides the selected ones
+FACET_LIMIT = 10
+
+INDEX_KEY = 'catalog:facets:index'
+AVAILABLE_KEY = 'catalog:facets:available'
+
+# Facet values are looked up by id; availability has a single value
+AVAILABLE = 1
+
+# Values of a facet counted against a selection, most books first; the
+# rest can't be among the shown ones unless selected
+FACET_SCAN_LIMIT = 200
+
+# Bytes of a bitmap skipped at once when paging
+MEMBERS_BLOCK = 512
+
+
+def bitmap(ids):
+    """An int with bit `id` set for every id in `ids`."""
+    if not ids:
+        return 0
+    data = bytearray(max(ids) // 8 + 1)
+    for pk in ids:
+        data[pk >> 3] |= 1 << (pk & 7)
+    return int.from_bytes(data, 'little')
+
+
+try:
+    popcount = int.bit_count
+except AttributeError:
+    # Python < 3.10
+    def popcount(bits):
+        return bin(bits).count('1')
+
+
+def members(bits, start=0, stop=None):
+    """The ids set in `bits`, in increasing order; with `start` and `stop`,
+        only the start-th to before the stop-th of them. Blocks before
+        `start` are skipped by their population count.
+    """
+    ids = []
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    seen = 0
+    for block_start in range(0, len(data), MEMBERS_BLOCK):
+        block = data[block_start:block_start + MEMBERS_BLOCK]
+        if start:
+            count = popcount(int.from_bytes(block, 'little'))
+            if seen + count <= start:
+                seen += count
+                continue
+        for offset, byte in enumerate(block, block_start):
+            while byte:
+                if stop is not None and seen >= stop:
+                    return ids
+                low = byte & -byte
+                if seen >= start:
+                    ids.append(offset * 8 + low.bit_length() - 1)
+                seen += 1
+                byte ^= low
+    return ids
+
+
+class BitmapIds:
+    """The ids set in a bitmap as a sequence for the Paginator: its length
+        is a population count and a slice extracts only the ids in it.
+    """
+    def __init__(self, bits):
+        self.bits = bits
+        self.length = popcount(bits)
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return iter(members(self.bits))
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            ids = self[index:index + 1] if index >= 0 else self[index:][:1]
+            if not ids:
+                raise IndexError(index)
+            return ids[0]
+        start, stop, step = index.indices(self.length)
+        return members(self.bits, start, max(start, stop))[::step]
+
+
+def build_index():
+    """The facet index: bitmaps and counts per facet value and the value
+        labels.
+    """
+    all_ids = []
+    by_value = {'genre': defaultdict(list), 'language': defaultdict(list),
+                'author': defaultdict(list)}
+
+    books = Book.objects.order_by().values_list('pk', 'language_id', 'author_id')
+    for pk, language_id, author_id in books.iterator(chunk_size=2000):
+        all_ids.append(pk)
+        if language_id is not None:
+            by_value['language'][language_id].append(pk)
+        if author_id is not None:
+            by_value['author'][author_id].append(pk)
+    genres = Book.genre.through.objects.order_by().values_list('book_id', 'genre_id')
+    for book_id, genre_id in genres.iterator(chunk_size=2000):
+        by_value['genre'][genre_id].append(book_id)
+
+    return {
+        'all': bitmap(all_ids),
+        'bitmaps': {facet: {value: bitmap(ids) for value, ids in values.items()}
+                    for facet, values in by_value.items()},
+        'totals': {facet: {value: len(ids) for value, ids in values.items()}
+                   for facet, values in by_value.items()},
+        'ranked': {facet: sorted(values, key=lambda value: -len(values[value]))
+                   for facet, values in by_value.items()},
+        'labels': {
+            'genre': {genre.pk: genre.name for genre in Genre.objects.all_cached()},
+            'language': {language.pk: language.name
+                         for language in Language.objects.all_cached()},
+            'author': {pk: f'{last_name}, {first_name}' for pk, last_name, first_name
+                       in Author.objects.values_list('pk', 'last_name', 'first_name')},
+            'available': {AVAILABLE: _('Available now')},
+        },
+    }
+
+
+def build_available():
+    return bitmap(list(BookAvailability.objects
+                       .filter(status='a', count__gt=0)
+                       .order_by().values_list('book_id', flat=True).distinct()))
+
+
+# This process's copy of the cached values, by generation, to save
+# unpickling them on every request
+_local = {}
+
+
+def cached(key, build):
+    """The value under `key`, rebuilt by `build()` after an invalidate()."""
+    generation = cache.get_or_set(key + ':generation', uuid.uuid4().hex, None)
+    local = _local.get(key)
+    if local is not None and local[0] == generation:
+        return local[1]
+    value = cache.get(f'{key}:{generation}')
+    if value is None:
+        value = build()
+        cache.set(f'{key}:{generation}', value, None)
+    _local[key] = (generation, value)
+    return value
+
+
+def invalidate(key):
+    """Invalidate now, and again on commit in case a concurrent request
+        rebuilt `key` from rows the transaction was still changing.
+    """
+    new_generation(key)
+    transaction.on_commit(partial(new_generation, key))
+
+
+def new_generation(key):
+    # A fresh random generation, so that a cleared cache can't bring back
+    # a generation some process still holds a copy of
+    old = cache.get(key + ':generation')
+    cache.set(key + ':generation', uuid.uuid4().hex, None)
+    if old is not None:
+        cache.delete(f'{key}:{old}')
+
+
+def invalidate_index():
+    invalidate(INDEX_KEY)
+
+
+def invalidate_available():
+    invalidate(AVAILABLE_KEY)
+
+
+def parse_selection(params):
+    """{facet: set of ids} from a query string like ?genre=1&genre=2."""
+    selected = {}
+    for facet, title in FACETS:
+        values = set()
+        for value in params.getlist(facet):
+            try:
+                values.add(int(value))
+            except ValueError:
+                pass
+        if values:
+            selected[facet] = values
+    return selected
+
+
+class Browse:
+    """Matching book ids and the facets to show for a selection."""
+    def __init__(self, params):
+        self.params = params
+        self.selected = parse_selection(params)
+        index = cached(INDEX_KEY, build_index)
+        available = cached(AVAILABLE_KEY, build_available)
+
+        masks = {}
+        for facet, values in self.selected.items():
+            if facet == 'available':
+                masks[facet] = available
+                continue
+            mask = 0
+            for value in values:
+                mask |= index['bitmaps'][facet].get(value, 0)
+            masks[facet] = mask
+
+        matching = index['all']
+        for mask in masks.values():
+            matching &= mask
+        self.book_ids = BitmapIds(matching)
+
+        self.facets = []
+        for facet, title in FACETS:
+            others = index['all']
+            for other, mask in masks.items():
+                if other != facet:
+                    others &= mask
+            if facet == 'available':
+                counts = {AVAILABLE: popcount(others & available)}
+            elif others == index['all']:
+                counts = index['totals'][facet]
+            else:
+                counts = self.top_counts(facet, others, index)
+            self.facets.append((facet, title, self.facet_values(
+                facet, counts, index['labels'][facet])))
+
+    def top_counts(self, facet, others, index):
+        """Counts among the books in `others` of the values of `facet` that
+            can be shown, and of the selected ones. Values are counted in
+            decreasing order of their total, which bounds their count, until
+            no other value could be shown, or FACET_SCAN_LIMIT were counted.
+        """
+        bitmaps, totals = index['bitmaps'][facet], index['totals'][facet]
+        counts, best = {}, []
+        for value in index['ranked'][facet][:FACET_SCAN_LIMIT]:
+            if len(best) == FACET_LIMIT and totals[value] < best[0]:
+                break
+            counts[value] = count = popcount(others & bitmaps[value])
+            if count:
+                if len(best) < FACET_LIMIT:
+                    heapq.heappush(best, count)
+                else:
+                    heapq.heappushpop(best, count)
+        for value in self.selected.get(facet, ()):
+            if value not in counts and value in bitmaps:
+                counts[value] = popcount(others & bitmaps[value])
+        return counts
+
+    def facet_values(self, facet, counts, labels):
+        chosen = self.selected.get(facet, set())
+        ranked = sorted((value for value, count in counts.items() if count),
+                        key=lambda value: (-counts[value], str(labels.get(value, ''))))
+        shown = ranked[:FACET_LIMIT]
+        shown += [value for value in ranked[FACET_LIMIT:] if value in chosen]
+        shown += [value for value in chosen if value not in counts and value in labels]
+        return [{
+            'value': value,
+            'label': labels.get(value, value),
+            'count': counts.get(value, 0),
+            'selected': value in chosen,
+            'query': self.toggle(facet, value),
+        } for value in shown]
+
+    def toggle(self, facet, value):
+        """Query string selecting or unselecting `value`, back on page 1."""
+        params = self.params.copy()
+        params.pop('page', None)
+        values = params.getlist(facet)
+        if str(value) in values:
+            values.remove(str(value))
+        else:
+            values.append(str(value))
+        params.setlist(facet, values)
+        return params.urlencode()
+
+    @property
+    def query(self):
+        """The current selection as a query string, without the page."""
+        params = self.params.copy()
+        params.pop('page', None)
+        return params.urlencode()
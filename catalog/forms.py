@@ -1,11 +1,20 @@
 import datetime
 
 from django import forms
+from django.contrib.auth.forms import PasswordResetForm
 from django.core.exceptions import ValidationError
+from django.template import loader
+from django.urls import reverse_lazy
 from django.utils.translation import gettext_lazy as _ # to make translation easy later on
 
+from catalog.models import Book
+from catalog.objectcache import CachingManager
+from catalog.tasks import enqueue, send_email
+
 class RenewBookForm(forms.Form):
     renewal_date = forms.DateField(help_text="Enter a date between now and 4 weeks (default 3 weeks).")
+    # Version of the BookInstance the librarian was looking at
+    version = forms.IntegerField(widget=forms.HiddenInput, required=False)
 
     def clean_renewal_date(self):
         data = self.cleaned_data['renewal_date']
@@ -20,3 +29,97 @@ class RenewBookForm(forms.Form):
 
         # Always remember to return clean, validated data
         return data
+
+class VersionedModelForm(forms.ModelForm):
+    """ModelForm carrying the instance version in a hidden field so a stale
+       submission can be detected when it is written back.
+    """
+    version = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk is not None:
+            self.fields['version'].initial = self.instance.version
+
+class AutocompleteSelectMixin:
+    """Render only the currently selected options; the rest are fetched from
+       the `autocomplete` endpoint as the user types. Keeps form rendering
+       independent of the size of the related table.
+    """
+    def __init__(self, model_name, attrs=None):
+        super().__init__(attrs)
+        self.model_name = model_name
+
+    class Media:
+        js = ('js/autocomplete.js',)
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocomplete-url'] = \
+            reverse_lazy('autocomplete', args=[self.model_name])
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        # Values come straight from the request when a bound form re-renders
+        pk_field = self.choices.queryset.model._meta.pk
+        selected = []
+        for v in value:
+            try:
+                selected.append(pk_field.to_python(v))
+            except ValidationError:
+                continue
+        selected = [v for v in selected if v]
+        options = [
+            self.create_option(name, obj.pk, str(obj), True, index,
+                               attrs=attrs)
+            for index, obj in enumerate(self.selected_objects(selected))
+        ]
+        return [(None, options, 0)]
+
+    def selected_objects(self, pks):
+        queryset = self.choices.queryset
+        if not pks:
+            return []
+        manager = queryset.model._default_manager
+        if not isinstance(manager, CachingManager) or queryset.query.has_filters():
+            return queryset.filter(pk__in=pks)
+        # Unrestricted choices: the rows can come from the object cache
+        objects = []
+        for pk in pks:
+            try:
+                objects.append(manager.get_cached(pk))
+            except queryset.model.DoesNotExist:
+                continue
+        return objects
+
+class AutocompleteSelect(AutocompleteSelectMixin, forms.Select):
+    pass
+
+class AutocompleteSelectMultiple(AutocompleteSelectMixin, forms.SelectMultiple):
+    pass
+
+class BookForm(VersionedModelForm):
+    class Meta:
+        model = Book
+        fields = ['title', 'author', 'summary', 'isbn', 'genre', 'language']
+        widgets = {
+            'author': AutocompleteSelect('author'),
+            'genre': AutocompleteSelectMultiple('genre'),
+            'language': AutocompleteSelect('language'),
+        }
+
+class QueuedPasswordResetForm(PasswordResetForm):
+    """Password reset form that hands the email to the task queue instead of
+       sending it inside the request.
+    """
+    def send_mail(self, subject_template_name, email_template_name, context,
+                  from_email, to_email, html_email_template_name=None):
+        subject = loader.render_to_string(subject_template_name, context)
+        # Email subject *must not* contain newlines
+        subject = ''.join(subject.splitlines())
+        body = loader.render_to_string(email_template_name, context)
+        html_body = None
+        if html_email_template_name is not None:
+            html_body = loader.render_to_string(html_email_template_name, context)
+        enqueue(send_email, subject, body, from_email, [to_email],
+                html_body=html_body)
@@ -0,0 +1,54 @@
+"""
+Denormalized genre names.
+
+Book.genre_names holds the names of a book's genres in alphabetical order so
+that book lists and pages can show them without querying the many-to-many
+table. It is rewritten whenever a book's genres change or a genre is
+renamed or deleted (see catalog.signals), and can be rebuilt and checked
+with the `sync_genre_names` command.
+"""
+from collections import defaultdict
+
+from catalog import changefeed, objectcache
+from catalog.models import Book
+
+
+def names_by_book(book_ids):
+    """{book id: sorted genre names} for `book_ids`, in one query."""
+    names = {book_id: [] for book_id in book_ids}
+    rows = Book.genre.through.objects\
+            .filter(book_id__in=list(names))\
+            .order_by('genre__name')\
+            .values_list('book_id', 'genre__name')
+    for book_id, name in rows:
+        names[book_id].append(name)
+    return names
+
+
+def refresh(book_ids):
+    """Rewrite genre_names of the books `book_ids`, returning the new names."""
+    names = names_by_book(book_ids)
+    grouped = defaultdict(list)
+    for book_id, book_names in names.items():
+        grouped[tuple(book_names)].append(book_id)
+    # One UPDATE per distinct list, e.g. every book of a renamed genre
+    for book_names, ids in grouped.items():
+        Book.objects.filter(pk__in=ids).update(genre_names=list(book_names))
+    # Updates send no post_save
+    objectcache.invalidate_on_commit(Book, list(names))
+    changefeed.record_rows(Book, list(names))
+    return names
+
+
+def books_with_genre(genre):
+    return list(Book.genre.through.objects
+                .filter(genre_id=genre.pk)
+                .values_list('book_id', flat=True))
+
+
+def stale_books(book_ids):
+    """Ids among `book_ids` whose stored genre_names are out of date."""
+    stored = dict(Book.objects.filter(pk__in=book_ids)
+                  .values_list('pk', 'genre_names'))
+    return [book_id for book_id, names in names_by_book(stored).items()
+            if stored[book_id] != names]
@@ -0,0 +1,87 @@
+"""
+Availability index.
+
+BookAvailability holds, for every (book, status, branch), the number of
+copies in that state. It is updated in the same transaction as every
+BookInstance save or delete, so "where can I get this book right now" is a
+single indexed lookup instead of a scan of the copies.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from catalog import facets
+from catalog.models import BookAvailability, BookInstance
+
+
+def adjust(book_id, branch_id, status, delta):
+    """Add `delta` copies to the (book, branch, status) counter."""
+    if book_id is None:
+        return
+    counter = BookAvailability.objects.filter(
+        book_id=book_id, branch_id=branch_id, status=status)
+    if counter.update(count=F('count') + delta) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            BookAvailability.objects.create(book_id=book_id, branch_id=branch_id,
+                                            status=status, count=delta)
+    except IntegrityError:
+        # Created concurrently by another writer
+        counter.update(count=F('count') + delta)
+
+
+def copy_changed(old, new):
+    """Move a copy between (book_id, branch_id, status) buckets; either side
+        may be None for a created or deleted copy.
+    """
+    if old == new:
+        return
+    if old is not None:
+        adjust(*old, -1)
+    if new is not None:
+        adjust(*new, +1)
+    if 'a' in (old and old[2], new and new[2]):
+        facets.invalidate_available()
+
+
+def copy_saved(book_instance, created):
+    old = None if created else getattr(book_instance, '_loaded_inventory_state', None)
+    new = (book_instance.book_id, book_instance.branch_id, book_instance.status)
+    copy_changed(old, new)
+
+
+def copy_deleted(book_instance):
+    old = getattr(book_instance, '_loaded_inventory_state', None) or \
+        (book_instance.book_id, book_instance.branch_id, book_instance.status)
+    copy_changed(old, None)
+
+
+def branch_deleted(branch):
+    """Copies of a deleted branch stay in the catalog without a branch."""
+    for row in BookAvailability.objects.filter(branch=branch):
+        adjust(row.book_id, None, row.status, row.count)
+
+
+def available_at(book, status='a'):
+    """Branches holding copies of `book` in `status`, most copies first."""
+    return BookAvailability.objects\
+            .filter(book=book, status=status, count__gt=0)\
+            .select_related('branch')\
+            .order_by('-count', 'branch__name')
+
+
+def rebuild():
+    """Recount every counter from BookInstance, e.g. after bulk updates
+        that bypassed save(). Returns the number of counters written.
+    """
+    counts = BookInstance.objects\
+            .exclude(book__isnull=True)\
+            .values('book_id', 'branch_id', 'status')\
+            .annotate(count=Count('pk'))\
+            .order_by()
+    with transaction.atomic():
+        BookAvailability.objects.all().delete()
+        BookAvailability.objects.bulk_create(
+            [BookAvailability(**row) for row in counts], batch_size=1000)
+    facets.invalidate_available()
+    return len(counts)
@@ -0,0 +1,122 @@
+"""
+Detection of unintended per-row queries (the "N+1" problem).
+
+When installed, every model instance fetched by a queryset that returned more
+than one row remembers that it has peers. If a related object or related
+manager is then loaded lazily for such an instance - e.g. `copy.book.title`
+in a template loop without `select_related('book')` - the access is logged
+or raised together with the template line or call site that caused it.
+
+Enabled with the LAZY_LOAD_DETECTION setting ('raise' or 'log').
+"""
+import logging
+import sys
+
+from django.db.models import query
+from django.db.models.fields import related_descriptors
+
+logger = logging.getLogger(__name__)
+
+MODES = ('raise', 'log')
+
+_mode = None
+
+
+class LazyLoadError(RuntimeError):
+    pass
+
+
+def install(mode):
+    """Patch queryset fetching and the related descriptors. Must run before
+        the related managers are first used, i.e. from AppConfig.ready().
+    """
+    global _mode
+    if mode not in MODES:
+        raise ValueError(f'LAZY_LOAD_DETECTION must be one of {MODES}, not {mode!r}')
+    if _mode is None:
+        _patch()
+    _mode = mode
+
+
+def _patch():
+    fetch_all = query.QuerySet._fetch_all
+
+    def _fetch_all(self):
+        fetched = self._result_cache is None
+        fetch_all(self)
+        if fetched and len(self._result_cache) > 1 \
+                and issubclass(self._iterable_class, query.ModelIterable):
+            for obj in self._result_cache:
+                _mark(obj, len(self._result_cache))
+
+    query.QuerySet._fetch_all = _fetch_all
+
+    get_object = related_descriptors.ForwardManyToOneDescriptor.get_object
+
+    def get_object_checked(self, instance):
+        _check(instance, self.field.name)
+        return get_object(self, instance)
+
+    related_descriptors.ForwardManyToOneDescriptor.get_object = get_object_checked
+
+    for factory_name in ('create_reverse_many_to_one_manager',
+                         'create_forward_many_to_many_manager'):
+        factory = getattr(related_descriptors, factory_name)
+        setattr(related_descriptors, factory_name, _checked_manager_factory(factory))
+
+
+def _checked_manager_factory(factory):
+    def create_manager(*args, **kwargs):
+        manager_cls = factory(*args, **kwargs)
+
+        class CheckedRelatedManager(manager_cls):
+            def get_queryset(self):
+                queryset = super().get_queryset()
+                # A prefetched relation comes back already evaluated
+                if queryset._result_cache is None:
+                    name = getattr(self, 'prefetch_cache_name', None) \
+                        or self.field.remote_field.get_cache_name()
+                    _check(self.instance, name)
+                return queryset
+
+        return CheckedRelatedManager
+
+    return create_manager
+
+
+def _mark(obj, peers, depth=0):
+    obj._lazy_load_peers = peers
+    # Objects joined in with select_related share the same origin
+    if depth < 3:
+        for related in obj._state.fields_cache.values():
+            if related is not None:
+                _mark(related, peers, depth + 1)
+
+
+def _check(instance, field_name):
+    peers = getattr(instance, '_lazy_load_peers', None)
+    if peers is None or _mode is None:
+        return
+    message = (f'Lazy load of {type(instance).__name__}.{field_name} on an '
+               f'object fetched with {peers - 1} others, at {call_site()}. '
+               f'Use select_related() or prefetch_related().')
+    if _mode == 'raise':
+        raise LazyLoadError(message)
+    logger.warning(message)
+
+
+def call_site():
+    """Describe where the lazy load came from: the template line being
+        rendered if any, otherwise the innermost frame outside Django.
+    """
+    frame = sys._getframe(2)
+    code_site = None
+    while frame is not None:
+        node = frame.f_locals.get('self')
+        if frame.f_code.co_name == 'render_annotated' and getattr(node, 'origin', None):
+            return f'{node.origin.name}, line {node.token.lineno}'
+        filename = frame.f_code.co_filename
+        if code_site is None and '/django/' not in filename and filename != __file__:
+            code_site = f'{filename}, line {frame.f_lineno}'
+        frame = frame.f_back
+    return code_site or 'unknown location'
@@ -0,0 +1,123 @@
+"""
+Loan history and reporting.
+
+Every checkout, return and renewal of a BookInstance appends a LoanEvent and,
+in the same transaction, bumps the per-day counters in the BookLoanRollup,
+GenreLoanRollup and LanguageLoanRollup tables. Reports read the rollups and
+never scan LoanEvent.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from catalog.models import (Book, BookLoanRollup, GenreLoanRollup,
+                            LanguageLoanRollup, LoanEvent)
+
+# LoanEvent.kind -> rollup counter
+ROLLUP_COUNTERS = {
+    'c': 'checkouts',
+    'r': 'returns',
+    'n': 'renewals',
+}
+
+
+def detect_loan_event(book_instance, created=False):
+    """Work out which loan event a save of `book_instance` represents by
+        comparing it with the state it was loaded with. Returns a
+        LoanEvent.kind or None.
+    """
+    if created:
+        previous_status, previous_due_back = None, None
+    else:
+        previous_status, previous_due_back = getattr(
+            book_instance, '_loaded_loan_state', (None, None))
+
+    status = book_instance.status
+    if status == 'o' and previous_status != 'o':
+        return 'c'
+    if previous_status == 'o' and status != 'o':
+        return 'r'
+    if status == 'o' and book_instance.due_back != previous_due_back:
+        return 'n'
+    return None
+
+
+def record_loan_event(book_instance, kind, when=None):
+    """Append a LoanEvent for `book_instance` and update the rollups."""
+    when = when or timezone.now()
+    with transaction.atomic():
+        event = LoanEvent.objects.create(
+            book_instance=book_instance,
+            book_id=book_instance.book_id,
+            borrower_id=book_instance.borrower_id,
+            kind=kind,
+            due_back=book_instance.due_back,
+            created=when,
+        )
+        if book_instance.book_id is not None:
+            update_rollups(book_instance.book_id, kind, timezone.localdate(when))
+    return event
+
+
+def update_rollups(book_id, kind, day):
+    counter = ROLLUP_COUNTERS[kind]
+    bump(BookLoanRollup, counter, day=day, book_id=book_id)
+    genre_ids = Book.genre.through.objects\
+            .filter(book_id=book_id).values_list('genre_id', flat=True)
+    for genre_id in genre_ids:
+        bump(GenreLoanRollup, counter, day=day, genre_id=genre_id)
+    language_id = Book.objects.values_list('language_id', flat=True).get(pk=book_id)
+    if language_id is not None:
+        bump(LanguageLoanRollup, counter, day=day, language_id=language_id)
+
+
+def bump(model, counter, **bucket):
+    """Increment `counter` on the rollup row for `bucket`, creating it on
+        first use. The increment is done in SQL so concurrent writers don't
+        lose counts.
+    """
+    if model.objects.filter(**bucket).update(**{counter: F(counter) + 1}):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**bucket, **{counter: 1})
+    except IntegrityError:
+        # Created concurrently by another writer
+        model.objects.filter(**bucket).update(**{counter: F(counter) + 1})
+
+
+def month_start(today=None):
+    today = today or timezone.localdate()
+    return today.replace(day=1)
+
+
+def most_borrowed_books(start=None, end=None, limit=10):
+    """Books with the most checkouts between `start` and `end` (inclusive),
+        as a list of dicts with `book_id`, `book__title` and `loans`.
+        Defaults to the current month.
+    """
+    rows = BookLoanRollup.objects.filter(day__gte=start or month_start())
+    if end is not None:
+        rows = rows.filter(day__lte=end)
+    return list(rows.values('book_id', 'book__title')
+                .annotate(loans=Sum('checkouts'))
+                .filter(loans__gt=0)
+                .order_by('-loans', 'book__title')[:limit])
+
+
+def loans_by_genre(start=None, end=None):
+    rows = GenreLoanRollup.objects.filter(day__gte=start or month_start())
+    if end is not None:
+        rows = rows.filter(day__lte=end)
+    return list(rows.values('genre_id', 'genre__name')
+                .annotate(loans=Sum('checkouts'))
+                .order_by('-loans', 'genre__name'))
+
+
+def loans_by_language(start=None, end=None):
+    rows = LanguageLoanRollup.objects.filter(day__gte=start or month_start())
+    if end is not None:
+        rows = rows.filter(day__lte=end)
+    return list(rows.values('language_id', 'language__name')
+                .annotate(loans=Sum('checkouts'))
+                .order_by('-loans', 'language__name'))
@@ -0,0 +1,21 @@
+"""
+Moves cold copies and old loan history to the archive tables according to
+the ARCHIVE_* settings (see catalog.archive). Safe to interrupt and rerun.
+"""
+from django.core.management.base import BaseCommand
+
+from catalog import archive
+
+
+class Command(BaseCommand):
+    help = 'Archive retired copies and old loan events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rows moved per transaction')
+
+    def handle(self, *args, **options):
+        copies = archive.archive_copies(options['batch_size'])
+        events = archive.archive_loan_events(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {copies} copies and {events} older loan events'))
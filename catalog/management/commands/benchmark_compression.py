@@ -0,0 +1,66 @@
+"""
+Reports the bytes saved by catalog.middleware.CompressionMiddleware on the
+main catalog pages, rendered against the current database.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+from django.utils.text import compress_string
+
+from catalog.middleware import brotli
+from catalog.models import Author, Book
+
+
+class Command(BaseCommand):
+    help = 'Measure response compression savings on the catalog pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Compressions timed per page')
+
+    def pages(self):
+        yield 'index', reverse('index')
+        yield 'books', reverse('books')
+        yield 'authors', reverse('authors')
+        book = Book.objects.order_by('pk').first()
+        if book is not None:
+            yield 'book-detail', book.get_absolute_url()
+        author = Author.objects.order_by('pk').first()
+        if author is not None:
+            yield 'author-detail', author.get_absolute_url()
+
+    def timed(self, compress, content, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            compressed = compress(content)
+        return len(compressed), (time.perf_counter() - start) / repeat * 1000
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_HOST='localhost')
+        compressors = [('gzip', compress_string)]
+        if brotli is not None:
+            compressors.append(('br', brotli.compress))
+        else:
+            self.stdout.write('brotli is not installed; reporting gzip only')
+
+        total_raw = 0
+        total_saved = {name: 0 for name, _ in compressors}
+        self.stdout.write(f'{"page":<15}{"raw":>9}' + ''.join(
+            f'{name:>9}{"saved":>8}{"ms":>7}' for name, _ in compressors))
+        for name, url in self.pages():
+            # No Accept-Encoding, so the middleware leaves the body alone
+            content = client.get(url).content
+            total_raw += len(content)
+            line = f'{name:<15}{len(content):>9}'
+            for encoding, compress in compressors:
+                size, ms = self.timed(compress, content, options['repeat'])
+                total_saved[encoding] += len(content) - size
+                line += f'{size:>9}{1 - size / len(content):>8.0%}{ms:>7.2f}'
+            self.stdout.write(line)
+
+        for encoding, saved in total_saved.items():
+            self.stdout.write(self.style.SUCCESS(
+                f'{encoding}: {saved} of {total_raw} bytes saved '
+                f'({saved / max(total_raw, 1):.0%})'))
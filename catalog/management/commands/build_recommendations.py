@@ -0,0 +1,148 @@
+"""
+"Readers also borrowed" recommendations.
+
+Checkouts are loaded as (borrower, book) pairs into a sparse borrower x book
+matrix X. X.T @ X counts, for every pair of books, the readers who borrowed
+both; dividing by sqrt(readers(a) * readers(b)) gives cosine similarity. The
+top-k most similar books are stored in BookRecommendation so the detail page
+needs a single indexed query.
+"""
+import numpy as np
+from scipy import sparse
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from catalog.models import ArchivedLoanEvent, BookRecommendation, LoanEvent
+
+
+class Command(BaseCommand):
+    help = 'Precompute "readers also borrowed" recommendations for each book'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=5,
+                            help='Number of recommendations kept per book')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Loan events loaded per query')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only refresh books affected by loans since '
+                                 'the last build')
+
+    def load_pairs(self, chunk_size):
+        """Yield arrays of (borrower_id, book_id) checkouts, walking LoanEvent
+            and then ArchivedLoanEvent in primary key order so memory stays
+            bounded per chunk. An event archived during the walk may be read
+            twice, which the matrix ignores, but is not missed.
+        """
+        for model in (LoanEvent, ArchivedLoanEvent):
+            events = model.objects\
+                    .filter(kind='c', borrower__isnull=False, book__isnull=False)\
+                    .order_by('pk')
+            last_pk = 0
+            while True:
+                rows = list(events.filter(pk__gt=last_pk)
+                            .values_list('pk', 'borrower_id', 'book_id')[:chunk_size])
+                if not rows:
+                    break
+                chunk = np.array(rows, dtype=np.int64)
+                last_pk = int(chunk[-1, 0])
+                yield chunk[:, 1], chunk[:, 2]
+
+    def build_matrix(self, chunk_size):
+        borrowers, books = [], []
+        for borrower_ids, book_ids in self.load_pairs(chunk_size):
+            borrowers.append(borrower_ids)
+            books.append(book_ids)
+        if not books:
+            return None, None, None
+
+        borrower_ids, rows = np.unique(np.concatenate(borrowers), return_inverse=True)
+        book_ids, cols = np.unique(np.concatenate(books), return_inverse=True)
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+            shape=(len(borrower_ids), len(book_ids)))
+        # A reader borrowing the same book twice still counts once
+        matrix.data[:] = 1
+        return matrix, borrower_ids, book_ids
+
+    def affected_columns(self, matrix, borrower_ids, since):
+        """Books whose similarities may have changed since `since`. A
+            checkout after that time changes the reader counts and
+            co-occurrences of every book its reader borrowed, and with them
+            the scores of every book sharing a reader with one of those.
+        """
+        changed_borrowers = LoanEvent.objects\
+                .filter(kind='c', created__gt=since, borrower__isnull=False)\
+                .values_list('borrower_id', flat=True).distinct()
+        changed = np.fromiter(changed_borrowers, dtype=np.int64)
+        rows = np.flatnonzero(np.isin(borrower_ids, changed))
+        changed_books = np.unique(matrix[rows].indices)
+        readers = np.unique(matrix.tocsc()[:, changed_books].indices)
+        return np.unique(matrix[readers].indices)
+
+    def similarities(self, matrix, columns):
+        """Cosine similarity rows for the books at `columns`."""
+        readers = np.asarray(matrix.sum(axis=0)).ravel()
+        norms = np.sqrt(readers)
+        cooccurrence = (matrix[:, columns].T @ matrix).tocsr()
+        cooccurrence = sparse.diags(1 / norms[columns]) @ cooccurrence @ sparse.diags(1 / norms)
+        cooccurrence = cooccurrence.tocsr()
+        # A book is not its own recommendation
+        cooccurrence[np.arange(len(columns)), columns] = 0
+        cooccurrence.eliminate_zeros()
+        return cooccurrence
+
+    def top_k(self, similarity, top_k):
+        """Yield (row, [(column, score), ...]) with the `top_k` best scores."""
+        for row in range(similarity.shape[0]):
+            start, end = similarity.indptr[row], similarity.indptr[row + 1]
+            scores = similarity.data[start:end]
+            columns = similarity.indices[start:end]
+            if len(scores) > top_k:
+                best = np.argpartition(-scores, top_k)[:top_k]
+                scores, columns = scores[best], columns[best]
+            order = np.lexsort((columns, -scores))
+            yield row, list(zip(columns[order], scores[order]))
+
+    def handle(self, *args, **options):
+        started = timezone.now()
+        matrix, borrower_ids, book_ids = self.build_matrix(options['chunk_size'])
+        if matrix is None:
+            self.stdout.write('No loans to build recommendations from')
+            return
+
+        last_build = BookRecommendation.objects.aggregate(last=Max('computed'))['last']
+        if options['incremental'] and last_build is not None:
+            columns = self.affected_columns(matrix, borrower_ids, last_build)
+        else:
+            columns = np.arange(len(book_ids))
+        if not len(columns):
+            self.stdout.write('Recommendations are up to date')
+            return
+
+        similarity = self.similarities(matrix, columns)
+        recommendations = [
+            BookRecommendation(
+                book_id=int(book_ids[columns[row]]),
+                recommended_id=int(book_ids[column]),
+                rank=rank,
+                score=float(score),
+                computed=started,
+            )
+            for row, best in self.top_k(similarity, options['top_k'])
+            for rank, (column, score) in enumerate(best, start=1)
+        ]
+
+        with transaction.atomic():
+            refreshed = book_ids[columns].tolist()
+            if options['incremental']:
+                BookRecommendation.objects.filter(book_id__in=refreshed).delete()
+            else:
+                BookRecommendation.objects.all().delete()
+            BookRecommendation.objects.bulk_create(recommendations, batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {len(recommendations)} recommendations for '
+            f'{len(refreshed)} books'))
@@ -0,0 +1,24 @@
+"""
+Writes the sitemap index and shards for the book and author pages (see
+catalog.sitemaps). By default only shards whose objects changed since the
+last run are rewritten.
+"""
+from django.core.management.base import BaseCommand
+
+from catalog import sitemaps
+
+
+class Command(BaseCommand):
+    help = 'Build sharded sitemaps of the book and author pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url',
+                            help='Scheme and host to prefix URLs with; '
+                                 'defaults to SITEMAP_BASE_URL')
+        parser.add_argument('--full', action='store_true',
+                            help='Rewrite every shard')
+
+    def handle(self, *args, **options):
+        written, total = sitemaps.build(options['base_url'], full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} of {total} sitemap shards to {sitemaps.sitemap_root()}'))
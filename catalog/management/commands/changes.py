@@ -0,0 +1,39 @@
+"""
+Prints catalog changes after a sequence number as JSON lines, one per
+change, fetched in batches; the last line's `seq` is the cursor for the next
+run. With --compact, compacts the change log instead.
+"""
+import json
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from catalog import changefeed
+
+
+class Command(BaseCommand):
+    help = 'Print the catalog change feed since a sequence number'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=int, default=0,
+                            help='Last sequence number already applied')
+        parser.add_argument('--batch-size', type=int, default=changefeed.DEFAULT_LIMIT,
+                            help='Changes read per query')
+        parser.add_argument('--compact', action='store_true',
+                            help='Delete superseded entries and old tombstones')
+
+    def handle(self, *args, **options):
+        if options['compact']:
+            deleted = changefeed.compact()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} change log entries'))
+            return
+
+        since = options['since']
+        while True:
+            entries = changefeed.changes_since(since, options['batch_size'])
+            for entry in entries:
+                self.stdout.write(json.dumps(changefeed.serialize(entry),
+                                             cls=DjangoJSONEncoder))
+            if len(entries) < options['batch_size']:
+                break
+            since = entries[-1].position
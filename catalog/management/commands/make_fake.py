@@ -3,14 +3,10 @@ import random
 
 from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand, CommandError
-from faker import Faker
 from random import randint
 
 from catalog.models import Author, Book, BookInstance, Genre, Language
 
-# Faker.seed(0)
-fake = Faker()
-
 """
 Resource:
 https://docs.djangoproject.com/en/3.1/howto/custom-management-commands/
@@ -26,10 +22,10 @@ class Command(BaseCommand):
         authors = []
         for i in range(number_fake_authors):
             author = Author.objects.create(
-                first_name = fake.first_name(),
-                last_name = fake.last_name(),
-                date_of_birth = fake.date(),
-                date_of_death = fake.date(),
+                first_name = self.fake.first_name(),
+                last_name = self.fake.last_name(),
+                date_of_birth = self.fake.date(),
+                date_of_death = self.fake.date(),
             )
             authors.append(author)
         all_authors = Author.objects.all()
@@ -41,7 +37,7 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.SUCCESS(f'Successfuly deleted {author} record'))
 
     def _create_fake_users(self):
-        simple_profile = fake.simple_profile()
+        simple_profile = self.fake.simple_profile()
         self.stdout.write(str(simple_profile))
 
         first_name, last_name = simple_profile['name'].split(' ')
@@ -96,19 +92,19 @@ class Command(BaseCommand):
         languages = Language.objects.all()
         num_languages = languages.count()
 
-        summary = '\n'.join(fake.paragraphs(nb=3))
+        summary = '\n'.join(self.fake.paragraphs(nb=3))
         for i in range(number_fake_books):
-            title = fake.sentence(nb_words=
+            title = self.fake.sentence(nb_words=
                 random.randint(2, 6)).strip('.').title()
             self.stdout.write(f'Title: {title}')
 
             author = authors[random.randint(0, num_authors-1)]
             self.stdout.write(f'\tAuthor: {author}')
 
-            summary ='\n'.join(fake.paragraphs(nb=3))
+            summary ='\n'.join(self.fake.paragraphs(nb=3))
             self.stdout.write(f'\tsummary: {summary}')
 
-            isbn = fake.isbn13()
+            isbn = self.fake.isbn13()
             self.stdout.write(f'\tisbn13: {isbn}')
 
             book_genre_count = random.randint(1, num_genres)
@@ -134,6 +130,12 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.ERROR(f'Unable to create Book object'))
 
     def handle(self, *args, **options):
+        # Imported here so that loading the command (e.g. `manage.py help`)
+        # doesn't pay for Faker and its locale data.
+        from faker import Faker
+        # Faker.seed(0)
+        self.fake = Faker()
+
         # Create fake authors
         # self._create_fake_authors()
         # self._create_fake_users()
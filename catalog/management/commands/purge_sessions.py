@@ -0,0 +1,22 @@
+"""
+Deletes expired sessions in small batches with a pause between them, so it
+can run against a live SQLite database (see catalog.sessions.purge_expired).
+Safe to interrupt and rerun; `clearsessions` does the same with the defaults.
+"""
+from django.core.management.base import BaseCommand
+
+from catalog import sessions
+
+
+class Command(BaseCommand):
+    help = 'Delete expired sessions in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Sessions deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0.1,
+                            help='Seconds to wait between batches')
+
+    def handle(self, *args, **options):
+        deleted = sessions.purge_expired(options['batch_size'], options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired sessions'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from catalog import inventory
+
+
+class Command(BaseCommand):
+    help = 'Recount the book availability index from the copies'
+
+    def handle(self, *args, **options):
+        written = inventory.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} availability counters'))
@@ -0,0 +1,70 @@
+"""
+Replaces the random (version 4) ids of existing copies with time-ordered
+(version 7) ones, a batch per transaction, so the primary key index stops
+taking inserts at random pages. The old id is kept in `legacy_id` and
+renew-book-librarian URLs using it redirect to the new one.
+
+Rows referencing a copy (e.g. LoanEvent, and ArchivedLoanEvent, whose
+reference isn't a foreign key) are pointed at the new id in the same
+transaction. Run it while librarians aren't editing copies: a copy loaded
+before its re-key and then saved with save() would be written back under the
+old id.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from catalog import changefeed
+from catalog.middleware import invalidate_page_cache
+from catalog.models import ArchivedLoanEvent, BookInstance, uuid7
+
+
+class Command(BaseCommand):
+    help = 'Give copies with random ids a time-ordered id, keeping the old one'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Copies re-keyed per transaction')
+
+    def handle(self, *args, **options):
+        references = [
+            (relation.related_model, relation.field.attname)
+            for relation in BookInstance._meta.related_objects
+            if not relation.many_to_many
+        ]
+        # Archived history outlives the copy, so it holds a plain id
+        references.append((ArchivedLoanEvent, 'book_instance_id'))
+
+        rekeyed = 0
+        after = None
+        while True:
+            with transaction.atomic():
+                copies = BookInstance.objects.filter(legacy_id__isnull=True)
+                if after is not None:
+                    copies = copies.filter(pk__gt=after)
+                batch = list(copies.order_by('pk')
+                             .values_list('pk', flat=True)[:options['batch_size']])
+                if not batch:
+                    break
+                after = batch[-1]
+                old_ids, new_ids = [], []
+                for old_id in batch:
+                    if old_id.version == 7:
+                        continue
+                    new_id = uuid7()
+                    BookInstance.objects.filter(pk=old_id)\
+                            .update(id=new_id, legacy_id=old_id)
+                    for model, column in references:
+                        model._base_manager.filter(**{column: old_id})\
+                                .update(**{column: new_id})
+                    old_ids.append(old_id)
+                    new_ids.append(new_id)
+                    rekeyed += 1
+                # Mirrors see the copy move to its new id
+                changefeed.record_rows(BookInstance, old_ids, 'd')
+                changefeed.record_rows(BookInstance, new_ids, 'c')
+            self.stdout.write(f'{rekeyed} copies re-keyed')
+
+        if rekeyed:
+            # Book pages list the copy ids
+            invalidate_page_cache()
+        self.stdout.write(self.style.SUCCESS(f'Re-keyed {rekeyed} copies'))
@@ -0,0 +1,192 @@
+"""
+Replays a log written by catalog.middleware.TrafficCaptureMiddleware with
+concurrent workers, at the recorded pace scaled by --speed, and reports
+per-route latency and query counts. GET and HEAD requests are replayed as a
+user of the recorded role (replay-staff, replay-librarian or replay-patron,
+created if missing); other methods are skipped since their bodies aren't
+logged. Rate limits are off during the replay.
+
+Run it against a test database (--test-database, filled from --fixture) or
+a copy of production, never production itself. To compare two builds, run
+the first with --save and the second with --compare; otherwise the replay is
+compared with the timings in the log, which came from another machine.
+"""
+import json
+import queue
+import threading
+import time
+from collections import Counter
+
+from django.contrib.auth.models import Permission, User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, teardown_databases
+from django.urls import NoReverseMatch, reverse
+
+from catalog import traffic
+from catalog.middleware import QueryCounter
+
+
+class Command(BaseCommand):
+    help = 'Replay captured traffic and compare per-route latency and queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('log', help='Traffic log (TRAFFIC_LOG) to replay')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Requests replayed at the same time')
+        parser.add_argument('--speed', type=float, default=1,
+                            help='Multiple of the recorded rate; 0 for no pacing')
+        parser.add_argument('--test-database', action='store_true',
+                            help='Replay against a new test database')
+        parser.add_argument('--fixture', action='append', default=[],
+                            help='Fixture loaded into the test database')
+        parser.add_argument('--save', metavar='FILE',
+                            help='Write the per-route results to FILE')
+        parser.add_argument('--compare', metavar='FILE',
+                            help='Compare with results saved from another build')
+
+    def handle(self, *args, **options):
+        try:
+            entries = traffic.read(options['log'])
+            baseline = traffic.recorded(entries)
+            if options['compare']:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        if not entries:
+            raise CommandError('The log has no entries')
+
+        old_config = None
+        if options['test_database']:
+            old_config = setup_databases(verbosity=0, interactive=False)
+            if options['fixture']:
+                call_command('loaddata', *options['fixture'], verbosity=0)
+        try:
+            with override_settings(RATE_LIMIT_ENABLED=False, TRAFFIC_LOG=None):
+                start = time.perf_counter()
+                results, skipped = self.replay(entries, options['workers'],
+                                               options['speed'])
+                elapsed = time.perf_counter() - start
+        finally:
+            if old_config is not None:
+                teardown_databases(old_config, verbosity=0)
+
+        summary = traffic.summarize(results)
+        self.stdout.write(f'Replayed {len(results)} requests in {elapsed:.1f}s '
+                          f'(recorded over '
+                          f'{entries[-1]["time"] - entries[0]["time"]:.1f}s)')
+        for reason, count in sorted(skipped.items()):
+            self.stdout.write(f'Skipped {count}: {reason}')
+        self.report(baseline, summary,
+                    'saved' if options['compare'] else 'recorded')
+
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump(summary, f, indent=2)
+            self.stdout.write(f'Saved the results to {options["save"]}')
+
+    def role_users(self):
+        permission = Permission.objects.get(content_type__app_label='catalog',
+                                            codename='can_mark_returned')
+        users = {'anonymous': None}
+        for role in ('staff', 'librarian', 'patron'):
+            users[role], _ = User.objects.get_or_create(
+                username=f'replay-{role}',
+                defaults={'is_staff': role == 'staff',
+                          'is_superuser': role == 'staff'})
+        users['librarian'].user_permissions.add(permission)
+        return users
+
+    def replay(self, entries, workers, speed):
+        """Replay `entries` on `workers` threads; returns the results as
+            (view, status, latency, queries) and a Counter of skipped ones.
+        """
+        users = self.role_users()
+        pending = queue.Queue()
+        results, skipped = [], Counter()
+        lock = threading.Lock()
+
+        def work():
+            clients = {}
+            try:
+                while (record := pending.get()) is not None:
+                    result = self.send(clients, users, record)
+                    with lock:
+                        if isinstance(result, str):
+                            skipped[result] += 1
+                        else:
+                            results.append(result)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=work) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        first, start = entries[0]['time'], time.perf_counter()
+        for record in entries:
+            if speed:
+                delay = (record['time'] - first) / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            pending.put(record)
+        for _ in threads:
+            pending.put(None)
+        for thread in threads:
+            thread.join()
+        return results, skipped
+
+    def send(self, clients, users, record):
+        """Replay one entry with this thread's client for its role; returns
+            the result or why it was skipped.
+        """
+        if record['method'] not in ('GET', 'HEAD'):
+            return f'{record["method"]} requests'
+        if traffic.REDACTED in record['args'] + list(record['kwargs'].values()):
+            return f'redacted arguments of {record["view"]}'
+        try:
+            url = reverse(record['view'], args=record['args'],
+                          kwargs=record['kwargs'])
+        except NoReverseMatch:
+            return f'no route {record["view"]}'
+        role = record['role'] if record['role'] in users else 'anonymous'
+        if role not in clients:
+            clients[role] = Client(HTTP_HOST='localhost',
+                                   raise_request_exception=False)
+            if users[role] is not None:
+                clients[role].force_login(users[role])
+        request = clients[role].head if record['method'] == 'HEAD' else clients[role].get
+        start = time.perf_counter()
+        with QueryCounter() as queries:
+            response = request(url, record['params'])
+        return (record['view'], response.status_code,
+                time.perf_counter() - start, queries.count)
+
+    def report(self, baseline, summary, label):
+        self.stdout.write(
+            f'{"route":<32}{"n":>6}{"p50 " + label:>16}{"now":>8}{"change":>8}'
+            f'{"p95 " + label:>16}{"now":>8}{"queries":>9}{"now":>6}{"errors":>8}')
+        for view in sorted(set(baseline) | set(summary)):
+            before, after = baseline.get(view), summary.get(view)
+            if after is None:
+                self.stdout.write(f'{view:<32}  not replayed')
+                continue
+            line = f'{view:<32}{after["count"]:>6}'
+            if before is None:
+                line += f'{"-":>16}{after["p50"] * 1000:>8.1f}{"new":>8}' \
+                        f'{"-":>16}{after["p95"] * 1000:>8.1f}' \
+                        f'{"-":>9}{after["queries"]:>6.1f}'
+            else:
+                change = after['p50'] / before['p50'] - 1 if before['p50'] else 0
+                line += f'{before["p50"] * 1000:>16.1f}{after["p50"] * 1000:>8.1f}' \
+                        f'{change:>+8.0%}' \
+                        f'{before["p95"] * 1000:>16.1f}{after["p95"] * 1000:>8.1f}' \
+                        f'{before["queries"]:>9.1f}{after["queries"]:>6.1f}'
+            line += f'{after["errors"]:>8}'
+            queries_changed = before is not None and \
+                round(after['queries'], 1) != round(before['queries'], 1)
+            style = self.style.ERROR if after['errors'] else \
+                self.style.WARNING if queries_changed else str
+            self.stdout.write(style(line))
@@ -0,0 +1,35 @@
+"""
+Moves archived copies, and their archived loan history, back into
+circulation. Copies are given by id or by book.
+"""
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import archive
+from catalog.models import ArchivedBookInstance, BookInstance
+
+
+class Command(BaseCommand):
+    help = 'Restore archived copies and their loan events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('copies', nargs='*', type=uuid.UUID,
+                            help='Ids of copies to restore')
+        parser.add_argument('--book', type=int,
+                            help='Restore every archived copy of this book')
+
+    def handle(self, *args, **options):
+        copy_ids = list(options['copies'])
+        if options['book'] is not None:
+            copy_ids += ArchivedBookInstance.objects\
+                    .filter(book_id=options['book']).values_list('pk', flat=True)
+            # Also bring back old events of its copies still in circulation
+            copy_ids += BookInstance.objects\
+                    .filter(book_id=options['book']).values_list('pk', flat=True)
+        if not copy_ids:
+            raise CommandError('Give copy ids or --book')
+
+        copies, events = archive.restore(copy_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Restored {copies} copies and {events} loan events'))
@@ -0,0 +1,53 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from catalog.tasks import VISIBILITY_TIMEOUT, claim_tasks, run_task
+
+
+def run_in_worker(task):
+    try:
+        return run_task(task)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks in a pool of worker threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Number of worker threads')
+        parser.add_argument('--batch-size', type=int, default=10,
+                            help='Number of tasks claimed per round')
+        parser.add_argument('--visibility-timeout', type=int,
+                            default=VISIBILITY_TIMEOUT,
+                            help='Seconds before a claimed, unfinished task '
+                                 'can be claimed by another worker')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once no task is due')
+
+    def handle(self, *args, **options):
+        done = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                tasks = claim_tasks(options['batch_size'],
+                                    options['visibility_timeout'])
+                if not tasks:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                for ok in pool.map(run_in_worker, tasks):
+                    if ok:
+                        done += 1
+                    else:
+                        failed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Ran {done + failed} tasks: {done} succeeded, {failed} failed'))
@@ -0,0 +1,86 @@
+"""
+Reports where a new worker spends its startup time: per-module import time
+(from `python -X importtime`), AppConfig.ready per app, URLconf loading and
+the WSGI/ASGI entry point. Each run is a fresh interpreter; phases are the
+median over --repeat runs.
+
+As a benchmark: save a baseline on the main branch with --save and compare a
+change against it with --baseline, which fails when a phase got more than
+--threshold percent slower.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import startup
+
+
+class Command(BaseCommand):
+    help = 'Profile worker startup and check it against a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--asgi', action='store_true',
+                            help='Profile the ASGI rather than the WSGI entry point')
+        parser.add_argument('--warm-up', action='store_true',
+                            help='Include catalog.warmup, as with WARM_UP_ON_STARTUP')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Interpreters started; phases are the median')
+        parser.add_argument('--top', type=int, default=20,
+                            help='Slowest modules and packages listed')
+        parser.add_argument('--save', metavar='FILE',
+                            help='Write the phase timings to FILE as a baseline')
+        parser.add_argument('--baseline', metavar='FILE',
+                            help='Fail if a phase is slower than in FILE')
+        parser.add_argument('--threshold', type=float, default=20,
+                            help='Percent slower than the baseline that fails')
+
+    def handle(self, *args, **options):
+        entry_point = startup.entry_point_module('asgi' if options['asgi'] else 'wsgi')
+        runs = []
+        for _ in range(max(1, options['repeat'])):
+            try:
+                runs.append(startup.profile(entry_point, options['warm_up']))
+            except RuntimeError as error:
+                raise CommandError(error)
+        summary = startup.summarize(runs)
+        # Module listings are from the last run; they vary little
+        last = runs[-1]
+
+        self.stdout.write(f'Startup of {entry_point}, median of {len(runs)} runs')
+        for phase, seconds in summary.items():
+            self.stdout.write(f'  {phase:<25}{seconds * 1000:>9.1f} ms')
+
+        self.stdout.write('AppConfig.ready')
+        for label, seconds in sorted(last['ready'].items(), key=lambda item: -item[1]):
+            self.stdout.write(f'  {label:<25}{seconds * 1000:>9.1f} ms')
+
+        top = options['top']
+        self.stdout.write(f'Slowest packages ({len(last["imports"])} modules imported)')
+        for name, self_us in startup.by_package(last['imports'])[:top]:
+            self.stdout.write(f'  {name:<40}{self_us / 1000:>9.1f} ms')
+
+        self.stdout.write('Slowest modules (self / cumulative)')
+        slowest = sorted(last['imports'], key=lambda item: -item[1])[:top]
+        for module, self_us, cumulative_us in slowest:
+            self.stdout.write(f'  {module:<40}{self_us / 1000:>9.1f}'
+                              f'{cumulative_us / 1000:>9.1f} ms')
+
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump(summary, f, indent=2)
+            self.stdout.write(f'Saved the baseline to {options["save"]}')
+
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as error:
+                raise CommandError(f'Cannot read the baseline: {error}')
+            slower = startup.regressions(summary, baseline,
+                                         options['threshold'] / 100)
+            if slower:
+                raise CommandError('Startup regressed: ' + ', '.join(
+                    f'{phase} {before * 1000:.1f} -> {after * 1000:.1f} ms'
+                    for phase, (before, after) in slower.items()))
+            self.stdout.write(self.style.SUCCESS(
+                f'Within {options["threshold"]:g}% of the baseline'))
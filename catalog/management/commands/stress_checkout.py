@@ -0,0 +1,107 @@
+"""
+Has many threads check out copies of one book at once until none is left,
+then verifies that no copy was lent twice and that the loan log and the
+availability index agree. Works on a throwaway book and borrower in a new
+test database, so the change feed, loan log and rollups of the real one
+never see them. With --live-database it runs against the configured
+database instead and deletes the book, copies, borrower and loan events
+afterwards; the change log entries and rollups of the run remain.
+"""
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections
+from django.test.utils import setup_databases, teardown_databases
+
+from catalog.checkout import NoCopyAvailable, check_out
+from catalog.models import Book, BookAvailability, BookInstance, LoanEvent
+
+
+class Command(BaseCommand):
+    help = 'Stress test concurrent checkouts of the same book'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--copies', type=int, default=50,
+                            help='Available copies of the book')
+        parser.add_argument('--clients', type=int, default=8,
+                            help='Threads checking out at the same time')
+        parser.add_argument('--live-database', action='store_true',
+                            help='Run against the configured database instead '
+                                 'of a new test database')
+
+    def client(self, book_id, borrower):
+        claimed, errors = [], 0
+        try:
+            while True:
+                try:
+                    claimed.append(check_out(book_id, borrower).pk)
+                except NoCopyAvailable:
+                    return claimed, errors
+                except OperationalError:
+                    # e.g. SQLite's lock timeout; try again
+                    errors += 1
+        finally:
+            close_old_connections()
+
+    def handle(self, *args, **options):
+        old_config = None
+        if not options['live_database']:
+            old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.run(options['copies'], options['clients'])
+        finally:
+            if old_config is not None:
+                teardown_databases(old_config, verbosity=0)
+
+    def run(self, copies, clients):
+        book = Book.objects.create(title='Checkout stress test', summary='-',
+                                   isbn=f'S{time.time_ns() % 10 ** 12}')
+        borrower = User.objects.create_user(f'stress-{book.isbn}')
+        try:
+            BookInstance.objects.bulk_create([
+                BookInstance(book=book, imprint='stress', status='a')
+                for _ in range(copies)])
+            BookAvailability.objects.create(book=book, status='a', count=copies)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=clients) as pool:
+                results = list(pool.map(lambda _: self.client(book.pk, borrower),
+                                        range(clients)))
+            elapsed = time.perf_counter() - start
+            self.verify(book, copies, results)
+        finally:
+            LoanEvent.objects.filter(book=book).delete()
+            BookInstance.objects.filter(book=book).delete()
+            book.delete()
+            borrower.delete()
+
+        claimed = sum(len(pks) for pks, _ in results)
+        errors = sum(errors for _, errors in results)
+        self.stdout.write(self.style.SUCCESS(
+            f'{claimed} checkouts by {clients} clients in {elapsed:.2f}s '
+            f'({claimed / elapsed:,.0f}/s), {errors} retried database errors, '
+            f'no copy lent twice'))
+
+    def verify(self, book, copies, results):
+        claims = Counter(pk for pks, _ in results for pk in pks)
+        problems = []
+        twice = [pk for pk, count in claims.items() if count > 1]
+        if twice:
+            problems.append(f'{len(twice)} copies lent more than once')
+        if len(claims) != copies:
+            problems.append(f'{len(claims)} of {copies} copies lent')
+        on_loan = BookInstance.objects.filter(book=book, status='o').count()
+        if on_loan != copies:
+            problems.append(f'{on_loan} copies on loan')
+        events = LoanEvent.objects.filter(book=book, kind='c').count()
+        if events != copies:
+            problems.append(f'{events} checkout events')
+        counts = dict(BookAvailability.objects.filter(book=book)
+                      .values_list('status', 'count'))
+        if counts.get('a', 0) != 0 or counts.get('o', 0) != copies:
+            problems.append(f'availability index says {counts}')
+        if problems:
+            raise CommandError('; '.join(problems))
@@ -0,0 +1,48 @@
+"""
+Rebuilds Book.genre_names from the book/genre relation in batches of books,
+or with --check only reports the books whose stored names are out of date.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import genres
+from catalog.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Backfill or verify the denormalized genre names of books'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Books read per query')
+        parser.add_argument('--check', action='store_true',
+                            help='Report stale books without changing them')
+
+    def batches(self, batch_size):
+        after = 0
+        while True:
+            ids = list(Book.objects.filter(pk__gt=after).order_by('pk')
+                       .values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return
+            yield ids
+            after = ids[-1]
+
+    def handle(self, *args, **options):
+        checked = 0
+        stale = []
+        for ids in self.batches(options['batch_size']):
+            checked += len(ids)
+            batch_stale = genres.stale_books(ids)
+            stale += batch_stale
+            if batch_stale and not options['check']:
+                genres.refresh(batch_stale)
+
+        if options['check']:
+            if stale:
+                raise CommandError(
+                    f'{len(stale)} of {checked} books have stale genre names: '
+                    + ', '.join(map(str, stale[:20])))
+            self.stdout.write(self.style.SUCCESS(f'All {checked} books are in sync'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Updated {len(stale)} of {checked} books'))
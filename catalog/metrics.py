@@ -0,0 +1,294 @@
+"""
+Prometheus metrics shared across worker processes.
+
+Every process records its samples in its own memory-mapped file in
+METRICS_DIR, so recording is a dictionary lookup and a struct write with no
+cross-process locking. The /metrics view merges the files of all processes,
+past and present, into the Prometheus text format; gauges only count live
+processes, and a process that reuses a dead one's pid zeroes its gauges.
+"""
+import json
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, math.inf)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, math.inf)
+
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None) or \
+        os.path.join(tempfile.gettempdir(), 'locallibrary-metrics')
+
+
+class MmapValues:
+    """Float values by key in a memory-mapped file written by one process.
+
+        Layout: an int32 holding the bytes used, then entries of
+        [int32 key length][key][padding to 8 bytes][float64 value].
+    """
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, path):
+        self.path = path
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.file = open(path, 'a+b')
+        size = os.fstat(self.file.fileno()).st_size
+        if size == 0:
+            size = self.INITIAL_SIZE
+            self.file.truncate(size)
+        self.capacity = size
+        self.mmap = mmap.mmap(self.file.fileno(), size)
+        self.used = struct.unpack_from('i', self.mmap, 0)[0] or 8
+        self.positions = {key: position for key, position, _
+                          in read_entries(self.mmap, self.used)}
+
+    def inc(self, key, amount=1):
+        with self.lock:
+            position = self.positions.get(key) or self.allocate(key)
+            value = struct.unpack_from('d', self.mmap, position)[0]
+            struct.pack_into('d', self.mmap, position, value + amount)
+
+    def set(self, key, value):
+        with self.lock:
+            position = self.positions.get(key) or self.allocate(key)
+            struct.pack_into('d', self.mmap, position, value)
+
+    def allocate(self, key):
+        encoded = key.encode()
+        padding = (8 - (4 + len(encoded)) % 8) % 8
+        entry = struct.pack(f'i{len(encoded)}s{padding}xd', len(encoded), encoded, 0.0)
+        while self.used + len(entry) > self.capacity:
+            self.capacity *= 2
+            self.file.truncate(self.capacity)
+            self.mmap = mmap.mmap(self.file.fileno(), self.capacity)
+        self.mmap[self.used:self.used + len(entry)] = entry
+        position = self.used + len(entry) - 8
+        self.used += len(entry)
+        # Publish the entry only once it is fully written
+        struct.pack_into('i', self.mmap, 0, self.used)
+        self.positions[key] = position
+        return position
+
+
+def read_entries(data, used=None):
+    """Yield (key, value position, value) for the entries in `data`."""
+    if used is None:
+        used = struct.unpack_from('i', data, 0)[0] or 8
+    position = 8
+    while position < used:
+        length = struct.unpack_from('i', data, position)[0]
+        key = bytes(data[position + 4:position + 4 + length]).decode()
+        position += 4 + length + (8 - (4 + length) % 8) % 8
+        yield key, position, struct.unpack_from('d', data, position)[0]
+        position += 8
+
+
+_values = None
+_values_lock = threading.Lock()
+
+
+def process_values():
+    """This process's value file, reopened after a fork or a change of
+        METRICS_DIR.
+    """
+    global _values
+    directory = metrics_dir()
+    values = _values
+    if current(values, directory):
+        return values
+    with _values_lock:
+        # Another thread may have opened it while this one waited
+        values = _values
+        if not current(values, directory):
+            os.makedirs(directory, exist_ok=True)
+            values = MmapValues(os.path.join(directory, f'{os.getpid()}.db'))
+            reset_gauges(values)
+            _values = values
+    return values
+
+
+def current(values, directory):
+    return values is not None and values.pid == os.getpid() \
+        and os.path.dirname(values.path) == directory
+
+
+def reset_gauges(values):
+    """Zero the gauges in a file left by a dead process whose pid this one
+        reused; its counters still count, but its gauges were its own.
+    """
+    for key, _, value in read_entries(values.mmap, values.used):
+        metric = REGISTRY.get(json.loads(key)[0])
+        if value and metric is not None and metric.type == 'gauge':
+            values.set(key, 0)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY[name] = self
+
+    def key(self, sample, labels):
+        return json.dumps([self.name, sample, labels])
+
+    def check_labels(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}')
+        return {name: str(labels[name]) for name in self.labelnames}
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        process_values().inc(self.key('_total', self.check_labels(labels)), amount)
+
+
+class Gauge(Metric):
+    """Gauge summed over live processes."""
+    type = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        process_values().inc(self.key('', self.check_labels(labels)), amount)
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        labels = self.check_labels(labels)
+        values = process_values()
+        # Buckets are stored per bucket and made cumulative on export
+        for bound in self.buckets:
+            if value <= bound:
+                values.inc(self.key('_bucket', dict(labels, le=format_bound(bound))))
+                break
+        values.inc(self.key('_sum', labels), value)
+        values.inc(self.key('_count', labels))
+
+
+def format_bound(bound):
+    return '+Inf' if bound == math.inf else repr(float(bound))
+
+
+REGISTRY = {}
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds',
+                            'Request latency by URL name.', ['view'])
+REQUEST_QUERIES = Histogram('http_request_db_queries',
+                            'Database queries per request by URL name.', ['view'],
+                            buckets=QUERY_BUCKETS)
+ACTIVE_REQUESTS = Gauge('http_requests_active', 'Requests being processed.')
+CACHE_LOOKUPS = Counter('cache_lookups', 'Cache lookups by cache and result.',
+                        ['cache', 'result'])
+SESSION_WRITES = Counter('session_writes', 'Requests that saved their session.')
+SESSION_DB_WRITES = Counter('session_db_writes',
+                            'Sessions written through to the database.')
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect():
+    """Merge the value files of every process: {(name, sample, labels): value}."""
+    directory = metrics_dir()
+    merged = defaultdict(float)
+    if not os.path.isdir(directory):
+        return merged
+    for filename in os.listdir(directory):
+        if not filename.endswith('.db'):
+            continue
+        pid = int(filename[:-3])
+        with open(os.path.join(directory, filename), 'rb') as f:
+            data = f.read()
+        if len(data) < 8:
+            continue
+        live = pid_alive(pid)
+        for key, _, value in read_entries(data):
+            name, sample, labels = json.loads(key)
+            metric = REGISTRY.get(name)
+            if metric is None or (metric.type == 'gauge' and not live):
+                continue
+            merged[(name, sample, tuple(sorted(labels.items())))] += value
+    return merged
+
+
+def escape(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def format_sample(name, labels, value):
+    if labels:
+        name += '{' + ','.join(f'{k}="{escape(v)}"' for k, v in labels) + '}'
+    if value == int(value):
+        value = int(value)
+    return f'{name} {value}'
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    samples = defaultdict(list)
+    for (name, sample, labels), value in collect().items():
+        samples[name].append((sample, labels, value))
+
+    lines = []
+    for name, metric in sorted(REGISTRY.items()):
+        exposed = name + '_total' if metric.type == 'counter' else name
+        lines.append(f'# HELP {exposed} {metric.documentation}')
+        lines.append(f'# TYPE {exposed} {metric.type}')
+        if metric.type != 'histogram':
+            for sample, labels, value in sorted(samples[name]):
+                lines.append(format_sample(name + sample, labels, value))
+            continue
+
+        # Group by label set and make buckets cumulative
+        series = defaultdict(dict)
+        for sample, labels, value in samples[name]:
+            le = dict(labels).get('le')
+            base = tuple(item for item in labels if item[0] != 'le')
+            series[base][le if sample == '_bucket' else sample] = value
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound in metric.buckets:
+                le = format_bound(bound)
+                cumulative += values.get(le, 0)
+                lines.append(format_sample(name + '_bucket', labels + (('le', le),), cumulative))
+            lines.append(format_sample(name + '_sum', labels, values.get('_sum', 0)))
+            lines.append(format_sample(name + '_count', labels, values.get('_count', 0)))
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, limited to METRICS_ALLOWED_IPS."""
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+    if allowed is not None and request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,411 @@
+import hashlib
+import math
+import re
+import time
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.translation import gettext as _
+
+from catalog import metrics, traffic
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Catalog pages that render the same for every anonymous visitor
+PAGE_CACHE_URL_NAMES = ['books', 'book-detail', 'authors', 'author-detail']
+
+PAGE_CACHE_GENERATION_KEY = 'catalog:pagecache:generation'
+
+# Longest a request holds a concurrency slot
+CONCURRENCY_LEASE_SECONDS = 60
+
+
+def url_name(request):
+    """Name of the URL pattern `request` resolves to, or None."""
+    if not hasattr(request, '_catalog_url_name'):
+        try:
+            request._catalog_url_name = resolve(request.path_info).url_name
+        except Resolver404:
+            request._catalog_url_name = None
+    return request._catalog_url_name
+
+
+def page_cache():
+    return caches[getattr(settings, 'PAGE_CACHE_ALIAS', 'default')]
+
+
+def invalidate_page_cache():
+    """Drop every cached page by moving on to a new key generation."""
+    cache = page_cache()
+    try:
+        cache.incr(PAGE_CACHE_GENERATION_KEY)
+    except ValueError:
+        cache.set(PAGE_CACHE_GENERATION_KEY, 1, None)
+
+
+class AnonymousPageCacheMiddleware:
+    """Full-page cache for anonymous GETs of the catalog list/detail pages.
+
+        Entries are kept for `PAGE_CACHE_TIMEOUT` seconds and then served
+        stale for up to `PAGE_CACHE_STALE_TIMEOUT` more while a single request
+        (the one that wins the lock) regenerates them. Logged-in users always
+        get a dynamic render since the sidebar is personalised.
+
+        Must come after AuthenticationMiddleware.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.url_names = getattr(settings, 'PAGE_CACHE_URL_NAMES',
+                                 PAGE_CACHE_URL_NAMES)
+        self.timeout = getattr(settings, 'PAGE_CACHE_TIMEOUT', 60)
+        self.stale_timeout = getattr(settings, 'PAGE_CACHE_STALE_TIMEOUT', 300)
+        self.lock_timeout = getattr(settings, 'PAGE_CACHE_LOCK_TIMEOUT', 10)
+        self.lock_wait = getattr(settings, 'PAGE_CACHE_LOCK_WAIT', 2)
+
+    def __call__(self, request):
+        if not self.is_cacheable_request(request):
+            return self.get_response(request)
+
+        cache = page_cache()
+        key = self.cache_key(request)
+        lock_key = key + ':lock'
+        entry = cache.get(key)
+
+        metrics.CACHE_LOOKUPS.inc(cache='page',
+                                  result='miss' if entry is None else 'hit')
+        if entry is not None:
+            if entry['expires'] > time.time():
+                return self.build_response(entry, 'hit')
+            # Expired: one request rebuilds, the rest keep getting stale content
+            if not cache.add(lock_key, 1, self.lock_timeout):
+                return self.build_response(entry, 'stale')
+        elif not cache.add(lock_key, 1, self.lock_timeout):
+            # Someone else is rendering this page; wait for them briefly.
+            entry = self.wait_for_entry(cache, key)
+            if entry is not None:
+                return self.build_response(entry, 'hit')
+            return self.get_response(request)
+
+        try:
+            response = self.get_response(request)
+            if self.is_cacheable_response(response):
+                cache.set(key, self.build_entry(response),
+                          self.timeout + self.stale_timeout)
+                response['X-Page-Cache'] = 'miss'
+        finally:
+            cache.delete(lock_key)
+        return response
+
+    def is_cacheable_request(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        if request.user.is_authenticated:
+            return False
+        return url_name(request) in self.url_names
+
+    def is_cacheable_response(self, response):
+        return (response.status_code == 200
+                and not response.streaming
+                and not response.cookies
+                and 'private' not in response.get('Cache-Control', ''))
+
+    def cache_key(self, request):
+        """Key on the path and the sorted query string (e.g. `?page=2`),
+            under the current invalidation generation.
+        """
+        generation = page_cache().get_or_set(PAGE_CACHE_GENERATION_KEY, 1, None)
+        query = sorted(request.GET.lists())
+        raw = f'{request.path}?{query}'.encode()
+        return f'catalog:pagecache:{generation}:{hashlib.md5(raw).hexdigest()}'
+
+    def build_entry(self, response):
+        return {
+            'expires': time.time() + self.timeout,
+            'status': response.status_code,
+            'content': response.content,
+            'headers': dict(response.items()),
+        }
+
+    def build_response(self, entry, state):
+        response = HttpResponse(entry['content'], status=entry['status'])
+        for header, value in entry['headers'].items():
+            response[header] = value
+        response['X-Page-Cache'] = state
+        return response
+
+    def wait_for_entry(self, cache, key):
+        deadline = time.time() + self.lock_wait
+        while time.time() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry
+        return None
+
+
+# Content types worth compressing; images, fonts and archives already are.
+COMPRESSION_CONTENT_TYPES = [
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'image/svg+xml',
+]
+
+accept_encoding_re = re.compile(r'(?:^|,)\s*([a-z*]+)\s*(?:;\s*q=([0-9.]+))?')
+
+
+def accepted_encodings(header):
+    """Encodings from an Accept-Encoding header, ignoring those with q=0."""
+    return {
+        encoding for encoding, quality in accept_encoding_re.findall(header.lower())
+        if quality == '' or float(quality or 0) > 0
+    }
+
+
+class CompressionMiddleware:
+    """Compress responses with brotli, when the library is installed and the
+        client accepts it, or else gzip.
+
+        Only responses of at least `COMPRESSION_MIN_SIZE` bytes with a
+        content type in `COMPRESSION_CONTENT_TYPES` are compressed; small
+        bodies don't gain enough to pay for the CPU. Should be placed near
+        the top of MIDDLEWARE, like django.middleware.gzip.GZipMiddleware.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 500)
+        self.content_types = getattr(settings, 'COMPRESSION_CONTENT_TYPES',
+                                     COMPRESSION_CONTENT_TYPES)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.compress(request, response)
+
+    def compress(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip()
+        if content_type not in self.content_types:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < self.min_size:
+            return response
+
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and 'br' in accepted:
+            encoding, compressed = 'br', brotli.compress(response.content)
+        elif 'gzip' in accepted:
+            encoding, compressed = 'gzip', compress_string(response.content)
+        else:
+            return response
+
+        # Return the original if compression doesn't help
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # The compressed body is no longer byte-identical to the original
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+
+def take_token(cache, key, rate, burst, now=None):
+    """Token bucket holding up to `burst` tokens, refilled at `rate` tokens
+        per second. Takes one token and returns (allowed, retry_after), where
+        retry_after is the number of seconds until a token is available.
+
+        The read-modify-write isn't atomic across workers; concurrent
+        requests may occasionally both get the last token, which is fine for
+        shedding load.
+    """
+    now = time.time() if now is None else now
+    tokens, updated = cache.get(key, (burst, now))
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens < 1:
+        cache.set(key, (tokens, now), math.ceil(burst / rate))
+        return False, (1 - tokens) / rate
+    cache.set(key, (tokens - 1, now), math.ceil(burst / rate))
+    return True, 0
+
+
+def take_slot(cache, key, slots, timeout):
+    """Lease one of `slots` slots, each a cache key under `key` held for
+        `timeout` seconds at most. Returns (slot, lease) for release_slot(),
+        or None if all are taken.
+
+        A lease of a worker that died mid-request expires with its key, and
+        one outlived by its request is never released on behalf of another,
+        so the slots in use can't drift the way a shared counter's can.
+    """
+    names = [f'{key}:{i}' for i in range(slots)]
+    taken = cache.get_many(names)
+    lease = uuid.uuid4().hex
+    for name in names:
+        if name not in taken and cache.add(name, lease, timeout):
+            return name, lease
+    return None
+
+
+def release_slot(cache, slot, lease):
+    if cache.get(slot) == lease:
+        cache.delete(slot)
+
+
+class RateLimitMiddleware:
+    """Admission control for expensive endpoints.
+
+        `RATE_LIMITS` maps URL names to a token bucket, e.g.
+        {'books': {'rate': 5, 'burst': 20}}: each client IP, and each
+        logged-in user, may make `burst` requests at once and `rate` per
+        second after that. Over the limit the request gets a 429.
+
+        `CONCURRENCY_LIMITS` maps URL names to the number of requests that
+        may run at once across all workers; beyond that the request gets a
+        503. Both carry a Retry-After header and are answered before the view
+        does any work. Buckets and slots live in the RATE_LIMIT_CACHE_ALIAS
+        cache, which must be shared by all workers (see catalog.checks).
+
+        Must come after AuthenticationMiddleware.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'RATE_LIMIT_ENABLED', True)
+        self.rate_limits = getattr(settings, 'RATE_LIMITS', {})
+        self.concurrency_limits = getattr(settings, 'CONCURRENCY_LIMITS', {})
+        self.cache = caches[getattr(settings, 'RATE_LIMIT_CACHE_ALIAS', 'default')]
+
+    def __call__(self, request):
+        name = url_name(request) if self.enabled else None
+        if name is None:
+            return self.get_response(request)
+
+        limit = self.rate_limits.get(name)
+        if limit is not None:
+            for client in self.clients(request):
+                allowed, retry_after = take_token(
+                    self.cache, f'catalog:ratelimit:{name}:{client}',
+                    limit['rate'], limit['burst'])
+                if not allowed:
+                    return self.reject(429, _('Too many requests.'), retry_after)
+
+        cap = self.concurrency_limits.get(name)
+        if cap is None:
+            return self.get_response(request)
+
+        taken = take_slot(self.cache, f'catalog:concurrency:{name}', cap,
+                          CONCURRENCY_LEASE_SECONDS)
+        if taken is None:
+            return self.reject(503, _('The server is busy.'), 1)
+        try:
+            return self.get_response(request)
+        finally:
+            release_slot(self.cache, *taken)
+
+    def clients(self, request):
+        yield 'ip:' + request.META.get('REMOTE_ADDR', '')
+        if request.user.is_authenticated:
+            yield f'user:{request.user.pk}'
+
+    def reject(self, status, message, retry_after):
+        response = HttpResponse(message, status=status, content_type='text/plain')
+        response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+
+class QueryCounter:
+    """Counts the queries run on this thread's database connections while
+        active: `with QueryCounter() as queries: ...`, then `queries.count`.
+    """
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self.stack = ExitStack()
+        for connection in connections.all():
+            self.stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        return self.stack.__exit__(*exc_info)
+
+
+class MetricsMiddleware:
+    """Record request latency, query count, session writes and in-flight
+        requests for the /metrics endpoint (see catalog.metrics), labelled
+        with the URL name. Should be first in MIDDLEWARE so it times the
+        whole stack.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics.ACTIVE_REQUESTS.inc()
+        start = time.perf_counter()
+        try:
+            with QueryCounter() as queries:
+                response = self.get_response(request)
+        finally:
+            metrics.ACTIVE_REQUESTS.dec()
+
+        view = self.view_label(request)
+        metrics.REQUEST_LATENCY.observe(time.perf_counter() - start, view=view)
+        metrics.REQUEST_QUERIES.observe(queries.count, view=view)
+        session = getattr(request, 'session', None)
+        if session is not None and session.modified:
+            metrics.SESSION_WRITES.inc()
+        return response
+
+    def view_label(self, request):
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            return match.view_name or match.route
+        return url_name(request) or 'unresolved'
+
+
+class TrafficCaptureMiddleware:
+    """Log a sample of TRAFFIC_SAMPLE_RATE of requests to the TRAFFIC_LOG
+        file for the `replay_traffic` command (see catalog.traffic). Not
+        used unless TRAFFIC_LOG is set. Should come right after
+        MetricsMiddleware so it times the rest of the stack.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.path = getattr(settings, 'TRAFFIC_LOG', None)
+        if not self.path:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if not traffic.sampled():
+            return self.get_response(request)
+        started = time.time()
+        start = time.perf_counter()
+        with QueryCounter() as queries:
+            response = self.get_response(request)
+        record = traffic.entry(request, response, started,
+                               time.perf_counter() - start, queries.count)
+        if record is not None:
+            traffic.write(self.path, record)
+        return response
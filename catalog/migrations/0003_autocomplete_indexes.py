@@ -0,0 +1,31 @@
+# Generated by Django 4.1.13 on 2026-10-19 09:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_borrower_and_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='genre',
+            name='name',
+            field=models.CharField(db_index=True, help_text='Enter a book genre (e.g. Sience Fiction)', max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='language',
+            name='name',
+            field=models.CharField(db_index=True, help_text="Enter the book's natural language (e.g. English, French, Japanese, etc.)", max_length=200),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['last_name', 'first_name'], name='catalog_aut_last_na_73102a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['first_name'], name='catalog_aut_first_n_447838_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.1.13 on 2026-10-19 09:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_existing_copies(apps, schema_editor):
+    BookInstance = apps.get_model('catalog', 'BookInstance')
+    BookAvailability = apps.get_model('catalog', 'BookAvailability')
+    counts = BookInstance.objects\
+            .exclude(book__isnull=True)\
+            .values('book_id', 'branch_id', 'status')\
+            .annotate(count=models.Count('pk'))\
+            .order_by()
+    BookAvailability.objects.bulk_create(
+        [BookAvailability(**row) for row in counts], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_book_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Branch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+                ('address', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name_plural': 'branches',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='bookinstance',
+            name='branch',
+            field=models.ForeignKey(blank=True, help_text='Branch holding this copy', null=True, on_delete=django.db.models.deletion.SET_NULL, to='catalog.branch'),
+        ),
+        migrations.CreateModel(
+            name='BookAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('m', 'Maintenance'), ('o', 'On loan'), ('a', 'Available'), ('r', 'Reserved')], max_length=1)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability', to='catalog.book')),
+                ('branch', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='catalog.branch')),
+            ],
+            options={
+                'verbose_name_plural': 'book availability',
+                'unique_together': {('book', 'status', 'branch')},
+            },
+        ),
+        migrations.RunPython(count_existing_copies, migrations.RunPython.noop),
+    ]
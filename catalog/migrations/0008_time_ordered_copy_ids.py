@@ -0,0 +1,24 @@
+# Generated by Django 4.1.13 on 2026-10-19 09:42
+
+import catalog.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_branches_and_availability'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookinstance',
+            name='legacy_id',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='bookinstance',
+            name='id',
+            field=models.UUIDField(default=catalog.models.uuid7, help_text='Unique ID for this particular book across the library', primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.1.13 on 2026-10-19 09:47
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def fill_genre_names(apps, schema_editor):
+    Book = apps.get_model('catalog', 'Book')
+    names = defaultdict(list)
+    rows = Book.genre.through.objects\
+            .order_by('genre__name')\
+            .values_list('book_id', 'genre__name')
+    for book_id, name in rows:
+        names[book_id].append(name)
+    books = [Book(pk=book_id, genre_names=book_names)
+             for book_id, book_names in names.items()]
+    Book.objects.bulk_update(books, ['genre_names'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_time_ordered_copy_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='genre_names',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.RunPython(fill_genre_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.1.13 on 2026-10-19 09:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0009_book_genre_names'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedLoanEvent',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('book_instance_id', models.UUIDField(db_index=True, null=True)),
+                ('kind', models.CharField(choices=[('c', 'Checkout'), ('r', 'Return'), ('n', 'Renewal')], max_length=1)),
+                ('due_back', models.DateField(blank=True, null=True)),
+                ('created', models.DateTimeField()),
+                ('archived', models.DateTimeField(default=django.utils.timezone.now)),
+                ('book', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='catalog.book')),
+                ('borrower', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedBookInstance',
+            fields=[
+                ('id', models.UUIDField(primary_key=True, serialize=False)),
+                ('legacy_id', models.UUIDField(blank=True, null=True, unique=True)),
+                ('imprint', models.CharField(max_length=200)),
+                ('due_back', models.DateField(blank=True, null=True)),
+                ('status', models.CharField(blank=True, choices=[('m', 'Maintenance'), ('o', 'On loan'), ('a', 'Available'), ('r', 'Reserved')], max_length=1)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('archived', models.DateTimeField(default=django.utils.timezone.now)),
+                ('book', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='catalog.book')),
+                ('borrower', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('branch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='catalog.branch')),
+            ],
+            options={
+                'ordering': ['-archived'],
+            },
+        ),
+    ]
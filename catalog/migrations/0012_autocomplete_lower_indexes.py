@@ -0,0 +1,30 @@
+# Generated by Django 4.1.13 on 2026-10-19 10:14
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_change_log'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(django.db.models.functions.text.Lower('last_name'), django.db.models.functions.text.Lower('first_name'), name='catalog_author_last_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(django.db.models.functions.text.Lower('first_name'), name='catalog_author_first_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='genre',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='catalog_genre_name_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='language',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='catalog_lang_name_lower_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.1.13 on 2026-10-19 10:19
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def position_existing_entries(apps, schema_editor):
+    # Mirrors' cursors are sequence numbers, so existing entries keep theirs
+    ChangeLogEntry = apps.get_model('catalog', 'ChangeLogEntry')
+    ChangeFeedPosition = apps.get_model('catalog', 'ChangeFeedPosition')
+    ChangeLogEntry.objects.update(position=F('seq'))
+    last = ChangeLogEntry.objects.aggregate(last=Max('seq'))['last'] or 0
+    ChangeFeedPosition.objects.create(pk=1, last=last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_autocomplete_lower_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeFeedPosition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='changelogentry',
+            name='position',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.RunPython(position_existing_entries, migrations.RunPython.noop),
+    ]
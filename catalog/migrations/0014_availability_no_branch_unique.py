@@ -0,0 +1,37 @@
+# Generated by Django 4.1.13 on 2026-10-19 10:26
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_counters(apps, schema_editor):
+    # Writers racing to create a counter for a copy without a branch could
+    # both succeed; fold the duplicates into one
+    BookAvailability = apps.get_model('catalog', 'BookAvailability')
+    duplicates = BookAvailability.objects\
+            .filter(branch__isnull=True)\
+            .values('book_id', 'status')\
+            .annotate(rows=Count('id'), total=Sum('count'))\
+            .filter(rows__gt=1)
+    for row in duplicates:
+        counters = BookAvailability.objects.filter(
+            book_id=row['book_id'], status=row['status'], branch__isnull=True)\
+            .order_by('id')
+        keep = counters.first()
+        counters.exclude(pk=keep.pk).delete()
+        BookAvailability.objects.filter(pk=keep.pk).update(count=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0013_change_feed_positions'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_counters, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='bookavailability',
+            constraint=models.UniqueConstraint(condition=models.Q(('branch__isnull', True)), fields=('book', 'status'), name='catalog_availability_no_branch_uniq'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-19 10:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0014_availability_no_branch_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='locked_by',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -1,19 +1,124 @@
+import os
+import threading
+import time
 import uuid
 
 from datetime import date
 from django.contrib.auth.models import User
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models.functions import Lower
+from django.dispatch import Signal
 from django.urls import reverse
+from django.utils import timezone
+
+from catalog.objectcache import CachingManager, invalidate_on_commit
+
+_uuid7_lock = threading.Lock()
+_uuid7_last = (0, 0)
+
+def uuid7():
+    """Time-ordered UUID (RFC 9562 version 7): a millisecond timestamp,
+       a 12 bit counter keeping ids from the same millisecond in order, then
+       62 random bits. New rows land at the right-hand end of the primary key
+       index instead of at a random page.
+    """
+    global _uuid7_last
+    with _uuid7_lock:
+        ms = time.time_ns() // 1_000_000
+        last_ms, counter = _uuid7_last
+        if ms <= last_ms:
+            ms, counter = last_ms, counter + 1
+            if counter > 0xfff:
+                # Counter exhausted; borrow the next millisecond
+                ms, counter = ms + 1, 0
+        else:
+            # Start low in the range so there is room to count up
+            counter = int.from_bytes(os.urandom(2), 'big') & 0x7ff
+        _uuid7_last = (ms, counter)
+    rand_b = int.from_bytes(os.urandom(8), 'big') & ((1 << 62) - 1)
+    return uuid.UUID(int=(ms & ((1 << 48) - 1)) << 80 | 0x7 << 76
+                     | counter << 64 | 0b10 << 62 | rand_b)
+
+# Sent with `pks` after rows of the sender model were changed by a queryset
+# update, which sends no post_save.
+rows_updated = Signal()
+
+class ConcurrentUpdateError(Exception):
+    """Raised when a row changed since it was read by the writer."""
+
+
+class AtomicSaveMixin:
+    """Saves and deletes in a transaction. post_save and post_delete
+       receivers write rows that must commit or roll back with the change,
+       e.g. the change log entry (catalog.changefeed).
+    """
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
+
+class VersionedModel(AtomicSaveMixin, models.Model):
+    """Abstract base adding a version column for optimistic concurrency.
+
+       Writers remember the version they read and call `save_changed()`,
+       which issues `UPDATE ... WHERE id = pk AND version = n` for only the
+       fields that changed. A plain `save()` still bumps the version so that
+       admin edits are seen as conflicts by in-flight forms.
+    """
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version += 1
+        super().save(*args, **kwargs)
+
+    def save_changed(self, fields):
+        """Conditionally write `fields` if the row is still at `self.version`.
+           Raises ConcurrentUpdateError if another writer got there first.
+        """
+        values = {}
+        for name in fields:
+            if name == 'version':
+                continue
+            field = self._meta.get_field(name)
+            if field.concrete and not field.many_to_many and not field.primary_key:
+                values[field.attname] = getattr(self, field.attname)
+
+        with transaction.atomic():
+            updated = type(self)._default_manager\
+                    .filter(pk=self.pk, version=self.version)\
+                    .update(version=models.F('version') + 1, **values)
+            if not updated:
+                raise ConcurrentUpdateError(
+                    f'{self._meta.object_name} {self.pk} was changed by someone else')
+            # A queryset update sends no post_save
+            invalidate_on_commit(type(self), [self.pk])
+            rows_updated.send(sender=type(self), pks=[self.pk])
+        self.version += 1
 
 # Create your models here.
-class Genre(models.Model):
+class Genre(AtomicSaveMixin, models.Model):
     name = models.CharField(max_length=200,
                 help_text='Enter a book genre (e.g. Sience Fiction)')
 
+    objects = CachingManager()
+
+    class Meta:
+        # Case-insensitive prefix search for the autocomplete
+        indexes = [models.Index(Lower('name'), name='catalog_genre_name_lower_idx')]
+
     def __str__(self):
         return self.name
 
-class Book(models.Model):
+class Book(VersionedModel):
     title = models.CharField(max_length=200)
 
     # Author is a string becuase it hasn't been declared in the file yet
@@ -26,6 +131,11 @@ class Book(models.Model):
     genre = models.ManyToManyField(Genre,
                 help_text='Select a genre for this book')
     language = models.ForeignKey('Language', on_delete=models.SET_NULL, null=True)
+    # Names of `genre` in alphabetical order, kept in sync by catalog.genres
+    # so that lists can show them without a join
+    genre_names = models.JSONField(default=list, blank=True, editable=False)
+
+    objects = CachingManager()
 
     def __str__(self):
         return self.title
@@ -38,13 +148,17 @@ class Book(models.Model):
         """Create a string for the genre. This is required to display genre
            since genre is a ManyToManyField
         """
-        return ', '.join(genre.name for genre in self.genre.all()[:3])
+        return ', '.join(self.genre_names[:3])
 
     display_genre.short_description = "Genre"
 
-class BookInstance(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4,
+class BookInstance(VersionedModel):
+    id = models.UUIDField(primary_key=True, default=uuid7,
                 help_text='Unique ID for this particular book across the library')
+    # Random (version 4) id the copy had before `rekey_copies` gave it a
+    # time-ordered one; old links keep resolving through it.
+    legacy_id = models.UUIDField(null=True, blank=True, unique=True,
+                editable=False)
     book = models.ForeignKey(Book, on_delete=models.RESTRICT, null=True)
     imprint = models.CharField(max_length=200)
     due_back = models.DateField(null=True, blank=True)
@@ -61,6 +175,9 @@ class BookInstance(models.Model):
     borrower = models.ForeignKey(User,
                 on_delete=models.SET_NULL, null=True, blank=True)
 
+    branch = models.ForeignKey('Branch', on_delete=models.SET_NULL,
+                null=True, blank=True, help_text='Branch holding this copy')
+
     class Meta:
         ordering = ['due_back']
         permissions = (
@@ -80,14 +197,39 @@ class BookInstance(models.Model):
         """Determine whether a book is overdue"""
         return bool(self.due_back and date.today() > self.due_back)
 
-class Author(models.Model):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_loaded_state()
+        return instance
+
+    def remember_loaded_state(self):
+        """Snapshot the stored state so a save can tell what changed: which
+           loan event, if any, it represents (see catalog.loans) and which
+           availability counters to move (see catalog.inventory).
+        """
+        fields = self.__dict__
+        self._loaded_loan_state = (fields.get('status'), fields.get('due_back'))
+        self._loaded_inventory_state = (fields.get('book_id'),
+                                        fields.get('branch_id'),
+                                        fields.get('status'))
+
+class Author(VersionedModel):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     date_of_birth = models.DateField(null=True, blank=True)
     date_of_death = models.DateField(null=True, blank=True)
 
+    objects = CachingManager()
+
     class Meta:
         ordering = ['last_name', 'first_name']
+        # Case-insensitive prefix search for the author autocomplete
+        indexes = [
+            models.Index(Lower('last_name'), Lower('first_name'),
+                         name='catalog_author_last_lower_idx'),
+            models.Index(Lower('first_name'), name='catalog_author_first_lower_idx'),
+        ]
 
     def get_absolute_url(self):
         """Returns URL to access particualar author instance"""
@@ -96,9 +238,244 @@ class Author(models.Model):
     def __str__(self):
         return f'{self.last_name}, {self.first_name}'
 
-class Language(models.Model):
+class Branch(models.Model):
+    name = models.CharField(max_length=200, unique=True)
+    address = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name_plural = 'branches'
+
+    def __str__(self):
+        return self.name
+
+class BookAvailability(models.Model):
+    """Denormalized count of copies of a book per branch and status,
+       maintained with every BookInstance change (see catalog.inventory).
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE,
+                related_name='availability')
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, null=True)
+    status = models.CharField(max_length=1, choices=BookInstance.LOAN_STATUS)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'book availability'
+        # (book, status) prefix answers "where is this book available"
+        unique_together = ['book', 'status', 'branch']
+        constraints = [
+            # NULLs are distinct in the unique index above, so copies without
+            # a branch need their own to keep a single counter
+            models.UniqueConstraint(fields=['book', 'status'],
+                                    condition=models.Q(branch__isnull=True),
+                                    name='catalog_availability_no_branch_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.book_id} at {self.branch}: {self.count} {self.get_status_display()}'
+
+class Language(AtomicSaveMixin, models.Model):
     name = models.CharField(max_length=200,
                 help_text="Enter the book's natural language (e.g. English, French, Japanese, etc.)")
 
+    objects = CachingManager()
+
+    class Meta:
+        # Case-insensitive prefix search for the autocomplete
+        indexes = [models.Index(Lower('name'), name='catalog_lang_name_lower_idx')]
+
     def __str__(self):
         return self.name
+
+class Task(models.Model):
+    """A unit of background work, queued by `catalog.tasks.enqueue()` and run
+       by the `run_workers` management command.
+    """
+    name = models.CharField(max_length=200,
+                help_text='Dotted path of the function to call')
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+
+    TASK_STATUS = (
+        ('q', 'Queued'),
+        ('r', 'Running'),
+        ('d', 'Done'),
+        ('f', 'Failed'),
+    )
+    status = models.CharField(max_length=1, choices=TASK_STATUS, default='q')
+
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    # Not run before this time; pushed back on each retry
+    run_at = models.DateTimeField(default=timezone.now)
+    # A running task whose worker died becomes claimable again after this
+    locked_until = models.DateTimeField(null=True, blank=True)
+    # The claim holding a running task; only it may record the outcome
+    locked_by = models.CharField(max_length=64, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['run_at']
+        indexes = [
+            models.Index(fields=['status', 'run_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.get_status_display()})'
+
+class LoanEvent(models.Model):
+    """Append-only history of checkouts, returns and renewals."""
+    book_instance = models.ForeignKey(BookInstance, on_delete=models.SET_NULL,
+                null=True)
+    # Denormalized from book_instance so history survives copy deletion
+    book = models.ForeignKey(Book, on_delete=models.SET_NULL, null=True)
+    borrower = models.ForeignKey(User, on_delete=models.SET_NULL, null=True,
+                blank=True)
+
+    EVENT_KIND = (
+        ('c', 'Checkout'),
+        ('r', 'Return'),
+        ('n', 'Renewal'),
+    )
+    kind = models.CharField(max_length=1, choices=EVENT_KIND)
+    due_back = models.DateField(null=True, blank=True)
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['created']
+
+    def __str__(self):
+        return f'{self.get_kind_display()} of {self.book_instance_id} at {self.created}'
+
+class ArchivedBookInstance(models.Model):
+    """A cold copy moved out of BookInstance by catalog.archive, with the
+       same id and values; `restore_archived` moves it back.
+    """
+    id = models.UUIDField(primary_key=True)
+    legacy_id = models.UUIDField(null=True, blank=True, unique=True)
+    book = models.ForeignKey(Book, on_delete=models.SET_NULL, null=True,
+                related_name='+')
+    imprint = models.CharField(max_length=200)
+    due_back = models.DateField(null=True, blank=True)
+    status = models.CharField(max_length=1, choices=BookInstance.LOAN_STATUS,
+                blank=True)
+    borrower = models.ForeignKey(User, on_delete=models.SET_NULL, null=True,
+                blank=True, related_name='+')
+    branch = models.ForeignKey(Branch, on_delete=models.SET_NULL, null=True,
+                blank=True, related_name='+')
+    version = models.PositiveIntegerField(default=0)
+    archived = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-archived']
+
+    def __str__(self):
+        return f'{self.id} (archived {self.archived:%Y-%m-%d})'
+
+class ArchivedLoanEvent(models.Model):
+    """A LoanEvent moved out by catalog.archive, keeping its id."""
+    id = models.BigIntegerField(primary_key=True)
+    # The copy may itself be archived, so no foreign key
+    book_instance_id = models.UUIDField(null=True, db_index=True)
+    book = models.ForeignKey(Book, on_delete=models.SET_NULL, null=True,
+                related_name='+')
+    borrower = models.ForeignKey(User, on_delete=models.SET_NULL, null=True,
+                blank=True, related_name='+')
+    kind = models.CharField(max_length=1, choices=LoanEvent.EVENT_KIND)
+    due_back = models.DateField(null=True, blank=True)
+    created = models.DateTimeField()
+    archived = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['created']
+
+    def __str__(self):
+        return f'{self.get_kind_display()} of {self.book_instance_id} at {self.created}'
+
+class ChangeLogEntry(models.Model):
+    """One created, updated or deleted catalog row; see catalog.changefeed."""
+    # Insert order; writers commit in any order
+    seq = models.BigAutoField(primary_key=True)
+    # Commit order, the feed cursor: given once the entry is committed
+    position = models.BigIntegerField(null=True, blank=True, unique=True,
+                editable=False)
+    model = models.CharField(max_length=100)
+    object_id = models.CharField(max_length=64)
+
+    CHANGE_ACTION = (
+        ('c', 'Create'),
+        ('u', 'Update'),
+        ('d', 'Delete'),
+    )
+    action = models.CharField(max_length=1, choices=CHANGE_ACTION)
+    # The row after the change; empty for a delete
+    data = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['seq']
+        verbose_name_plural = 'change log entries'
+        # Finds the entries a newer one supersedes, for compaction
+        indexes = [
+            models.Index(fields=['model', 'object_id', 'seq']),
+        ]
+
+    def __str__(self):
+        return f'{self.seq}: {self.get_action_display()} {self.model} {self.object_id}'
+
+class ChangeFeedPosition(models.Model):
+    """Single row holding the last ChangeLogEntry.position given; updating it
+       serializes catalog.changefeed.sequence().
+    """
+    last = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.last)
+
+class LoanRollup(models.Model):
+    """Per-day loan counters, maintained incrementally with every LoanEvent."""
+    day = models.DateField()
+    checkouts = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    renewals = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+class BookLoanRollup(LoanRollup):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ['day', 'book']
+
+class GenreLoanRollup(LoanRollup):
+    genre = models.ForeignKey(Genre, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ['day', 'genre']
+
+class LanguageLoanRollup(LoanRollup):
+    language = models.ForeignKey(Language, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ['day', 'language']
+
+class BookRecommendation(models.Model):
+    """Precomputed "readers also borrowed" list for a book, written by the
+       `build_recommendations` management command.
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE,
+                related_name='recommendations')
+    recommended = models.ForeignKey(Book, on_delete=models.CASCADE,
+                related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    computed = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['book', 'rank']
+        unique_together = ['book', 'rank']
+
+    def __str__(self):
+        return f'{self.book_id} -> {self.recommended_id} ({self.score:.3f})'
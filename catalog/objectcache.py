@@ -0,0 +1,194 @@
+"""
+Read-through cache for hot catalog rows.
+
+Models whose default manager is a CachingManager serve primary key lookups
+(`get_cached()`) and whole-table reads of small tables (`all_cached()`) from
+two levels: an LRU in this process, then the shared cache
+(OBJECT_CACHE_ALIAS), before falling back to the database. The book and
+author detail pages and the selected options of autocomplete widgets use
+the former; the genre and language facet labels the latter.
+
+Saves, deletes and many-to-many changes drop the affected entries from the
+shared cache and from this process's LRU, straight away and again when the
+transaction commits (see catalog.signals). Other processes may keep serving
+an entry from their LRU for up to OBJECT_CACHE_LOCAL_TIMEOUT seconds.
+
+Hit rates are kept per model (`stats()`) and exported as the
+cache_lookups_total{cache="object"} metric.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.http import Http404
+
+from catalog import metrics
+
+
+def setting(name, default):
+    return getattr(settings, name, default)
+
+
+def shared_cache():
+    return caches[setting('OBJECT_CACHE_ALIAS', 'default')]
+
+
+class LocalCache:
+    """Thread-safe LRU of pickled values with a timeout per entry."""
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            payload, expires = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return payload
+
+    def set(self, key, payload, timeout):
+        with self.lock:
+            self.entries[key] = (payload, time.monotonic() + timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > setting('OBJECT_CACHE_LOCAL_SIZE', 1000):
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_cache = LocalCache()
+
+_stats = defaultdict(lambda: {'local': 0, 'shared': 0, 'miss': 0})
+_stats_lock = threading.Lock()
+
+
+def record(label, result):
+    with _stats_lock:
+        _stats[label][result] += 1
+    metrics.CACHE_LOOKUPS.inc(cache='object', result=result)
+
+
+def stats():
+    """Lookups in this process by model label: hits in the local and shared
+        levels, misses and the overall hit rate.
+    """
+    with _stats_lock:
+        counts = {label: dict(values) for label, values in _stats.items()}
+    for values in counts.values():
+        total = values['local'] + values['shared'] + values['miss']
+        values['hit_rate'] = (values['local'] + values['shared']) / total if total else 0
+    return counts
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+class CachingManager(models.Manager):
+    """Manager adding cached reads; all other queries go to the database."""
+
+    def cache_key(self, suffix):
+        return f'catalog:objects:{self.model._meta.label_lower}:{suffix}'
+
+    def read_through(self, key, load):
+        """Value for `key` from the local then the shared cache, or from
+            `load()`, which returns (value, whether to cache it).
+        """
+        label = self.model._meta.label
+        payload = local_cache.get(key)
+        if payload is not None:
+            record(label, 'local')
+            return pickle.loads(payload)
+
+        cache = shared_cache()
+        payload = cache.get(key)
+        if payload is not None:
+            record(label, 'shared')
+        else:
+            record(label, 'miss')
+            value, cacheable = load()
+            if not cacheable:
+                return value
+            payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            cache.set(key, payload, setting('OBJECT_CACHE_TIMEOUT', 300))
+        local_cache.set(key, payload, setting('OBJECT_CACHE_LOCAL_TIMEOUT', 5))
+        # Every caller gets its own copy to modify
+        return pickle.loads(payload)
+
+    def get_cached(self, pk):
+        """The object with primary key `pk`. Raises DoesNotExist like get()."""
+        pk = self.model._meta.pk.to_python(pk)
+        return self.read_through(self.cache_key(pk),
+                                 lambda: (self.get(pk=pk), True))
+
+    def all_cached(self):
+        """Every row as a list; only cached while the table has at most
+            OBJECT_CACHE_MAX_ROWS rows.
+        """
+        limit = setting('OBJECT_CACHE_MAX_ROWS', 500)
+
+        def load():
+            rows = list(self.all()[:limit + 1])
+            if len(rows) > limit:
+                return list(self.all()), False
+            return rows, True
+
+        return self.read_through(self.cache_key('all'), load)
+
+
+def invalidate(model, pks=()):
+    """Drop the cached rows `pks` of `model` and its cached table."""
+    manager = model._default_manager
+    if not isinstance(manager, CachingManager):
+        return
+    keys = [manager.cache_key(model._meta.pk.to_python(pk)) for pk in pks]
+    keys.append(manager.cache_key('all'))
+    for key in keys:
+        local_cache.delete(key)
+    shared_cache().delete_many(keys)
+
+
+def invalidate_on_commit(model, pks=()):
+    """Invalidate now, and again on commit in case a concurrent reader cached
+        the old row while the transaction was open.
+    """
+    if not isinstance(model._default_manager, CachingManager):
+        return
+    pks = list(pks)
+    invalidate(model, pks)
+    transaction.on_commit(partial(invalidate, model, pks))
+
+
+def get_cached_or_404(model, pk):
+    try:
+        return model._default_manager.get_cached(pk)
+    except (model.DoesNotExist, ValidationError):
+        raise Http404(f'No {model._meta.verbose_name} found matching the query')
+
+
+def fill_related(instance, *names):
+    """Load the foreign keys `names` of `instance` from the object cache."""
+    for name in names:
+        field = instance._meta.get_field(name)
+        related_id = getattr(instance, field.attname)
+        if related_id is not None:
+            setattr(instance, name,
+                    field.related_model._default_manager.get_cached(related_id))
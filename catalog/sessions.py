@@ -0,0 +1,121 @@
+"""
+Session engine that serves sessions from the shared cache and writes them to
+the database sparingly (SESSION_ENGINE = 'catalog.sessions').
+
+Like django.contrib.sessions.backends.cached_db, but a modified session is
+only written through to django_session when it is new, when the logged-in
+user or expiry changes, or when SESSION_DB_WRITE_INTERVAL seconds have passed
+since its last write. In between, changes such as the `num_visits` counter
+live in the cache only; a cache eviction loses at most that interval's worth
+of them. Requires a cache shared by all workers (see catalog.checks).
+
+Expired rows are removed in small batches by purge_expired(), which both the
+`purge_sessions` and `clearsessions` commands run.
+"""
+import datetime
+import time
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.contrib.sessions.models import Session
+from django.db import transaction
+from django.utils import timezone
+
+from catalog import metrics
+
+KEY_PREFIX = 'catalog.sessions.'
+
+# Changes to these are written through at once: losing them would log the
+# user back in or out, or let the database row expire early.
+WRITE_THROUGH_KEYS = (SESSION_KEY, BACKEND_SESSION_KEY, HASH_SESSION_KEY,
+                      '_session_expiry')
+
+
+def write_interval():
+    return getattr(settings, 'SESSION_DB_WRITE_INTERVAL', 60)
+
+
+class SessionStore(CachedDBStore):
+    """Cache entries are {'data': session dict, 'written': time of the last
+        database write, 'pending': whether the cache is ahead of it}.
+    """
+    cache_key_prefix = KEY_PREFIX
+
+    def load(self):
+        try:
+            entry = self._cache.get(self.cache_key)
+        except Exception:
+            # Don't fail if there is no data in the cache or it is unreachable
+            entry = None
+        if entry is None:
+            session = self._get_session_from_db()
+            if session is None:
+                self._entry = None
+                return {}
+            entry = {'data': self.decode(session.session_data),
+                     'written': time.time(), 'pending': False}
+            self._cache.set(self.cache_key, entry,
+                            self.get_expiry_age(expiry=session.expire_date))
+        self._entry = entry
+        if entry['pending'] and time.time() - entry['written'] >= write_interval():
+            # Have the middleware save, and so write through, what's pending
+            self.modified = True
+        # A copy, so that needs_write() sees what changed since
+        return dict(entry['data'])
+
+    def needs_write(self, data, now):
+        entry = getattr(self, '_entry', None)
+        if entry is None or now - entry['written'] >= write_interval():
+            return True
+        return any(entry['data'].get(key) != data.get(key)
+                   for key in WRITE_THROUGH_KEYS)
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        now = time.time()
+        if must_create or self.needs_write(data, now):
+            DBStore.save(self, must_create)
+            metrics.SESSION_DB_WRITES.inc()
+            self._entry = {'data': data, 'written': now, 'pending': False}
+        else:
+            self._entry = dict(self._entry, data=data, pending=True)
+        self._cache.set(self.cache_key, self._entry, self.get_expiry_age())
+
+    @classmethod
+    def clear_expired(cls):
+        # So that `clearsessions` doesn't delete them in one transaction
+        purge_expired()
+
+    def delete(self, session_key=None):
+        super().delete(session_key)
+        if session_key is None or session_key == self.session_key:
+            self._entry = None
+
+
+def purge_expired(batch_size=500, pause=0.1, now=None):
+    """Delete expired sessions `batch_size` at a time, each batch in its own
+        short transaction and `pause` seconds apart, so that other writers
+        (and SQLite's single write lock) are never held up for long. Rows are
+        kept SESSION_DB_WRITE_INTERVAL seconds past their expiry, since the
+        cache may hold a pending, later expiry. Returns the number deleted.
+    """
+    now = now or timezone.now()
+    cutoff = now - datetime.timedelta(seconds=write_interval())
+    deleted = 0
+    while True:
+        keys = list(Session.objects.filter(expire_date__lt=cutoff)
+                    .values_list('session_key', flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        with transaction.atomic():
+            count, _ = Session.objects\
+                .filter(session_key__in=keys, expire_date__lt=cutoff)\
+                .only('session_key').delete()
+        deleted += count
+        if len(keys) < batch_size:
+            return deleted
+        time.sleep(pause)
@@ -0,0 +1,123 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from catalog import changefeed, facets, genres, inventory, objectcache
+from catalog.loans import detect_loan_event, record_loan_event
+from catalog.middleware import invalidate_page_cache
+from catalog.models import (Author, Book, BookInstance, Branch, Genre, Language,
+                            rows_updated)
+
+CATALOG_MODELS = (Author, Book, BookInstance, Genre, Language)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+@receiver(rows_updated)
+def catalog_changed(sender, **kwargs):
+    """Anonymous catalog pages are stale as soon as any catalog row changes,
+        including through save_changed(), which sends no post_save.
+    """
+    if sender in CATALOG_MODELS:
+        invalidate_page_cache()
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def cached_object_changed(sender, instance, **kwargs):
+    objectcache.invalidate_on_commit(sender, [instance.pk])
+
+
+@receiver(post_save)
+def feed_saved(sender, instance, created, **kwargs):
+    changefeed.record(instance, 'c' if created else 'u')
+
+
+@receiver(post_delete)
+def feed_deleted(sender, instance, **kwargs):
+    changefeed.record(instance, 'd')
+
+
+@receiver(rows_updated)
+def feed_rows_updated(sender, pks, **kwargs):
+    changefeed.record_rows(sender, pks)
+
+
+FACET_MODELS = (Author, Book, Genre, Language)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+@receiver(rows_updated)
+def facet_values_changed(sender, **kwargs):
+    """Books, their authors, languages and genres make up the facet index."""
+    if sender in FACET_MODELS:
+        facets.invalidate_index()
+
+
+@receiver(m2m_changed)
+def cached_relation_changed(sender, instance, action, model, pk_set, **kwargs):
+    """Both ends of a many-to-many change, e.g. a book and its genres."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        objectcache.invalidate_on_commit(type(instance), [instance.pk])
+        objectcache.invalidate_on_commit(model, pk_set or ())
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def book_genre_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep Book.genre_names in step with genres added or removed from
+        either side of the relation.
+    """
+    if action == 'pre_clear' and reverse:
+        # Only the genre is known after the clear, so note its books now
+        instance._cleared_books = genres.books_with_genre(instance)
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    invalidate_page_cache()
+    facets.invalidate_index()
+    if not reverse:
+        instance.genre_names = genres.refresh([instance.pk])[instance.pk]
+    elif action == 'post_clear':
+        genres.refresh(instance.__dict__.pop('_cleared_books', []))
+    else:
+        genres.refresh(pk_set)
+
+
+@receiver(post_save, sender=Genre)
+def genre_saved(sender, instance, created, raw=False, **kwargs):
+    """A renamed genre changes the names shown for all its books."""
+    if not created and not raw:
+        genres.refresh(genres.books_with_genre(instance))
+
+
+@receiver(pre_delete, sender=Genre)
+def genre_deleting(sender, instance, **kwargs):
+    instance._deleted_books = genres.books_with_genre(instance)
+
+
+@receiver(post_delete, sender=Genre)
+def genre_deleted(sender, instance, **kwargs):
+    genres.refresh(instance.__dict__.pop('_deleted_books', []))
+
+
+@receiver(post_save, sender=BookInstance)
+def book_instance_saved(sender, instance, created, raw=False, **kwargs):
+    """Log checkouts and returns made through a plain save, e.g. the admin,
+        and move the copy between availability counters.
+    """
+    if raw:
+        return
+    kind = detect_loan_event(instance, created)
+    if kind is not None:
+        record_loan_event(instance, kind)
+    inventory.copy_saved(instance, created)
+    instance.remember_loaded_state()
+
+
+@receiver(post_delete, sender=BookInstance)
+def book_instance_deleted(sender, instance, **kwargs):
+    inventory.copy_deleted(instance)
+
+
+@receiver(pre_delete, sender=Branch)
+def branch_deleted(sender, instance, **kwargs):
+    inventory.branch_deleted(instance)
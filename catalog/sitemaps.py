@@ -0,0 +1,171 @@
+"""
+Sitemaps for the book and author pages.
+
+`build()` (the `build_sitemaps` command) writes the detail page URL of every
+Book and Author into sitemap files under SITEMAP_ROOT, served as
+/sitemap.xml (the index) and /sitemap-<section>-<n>.xml:
+
+* Shard n of a section holds the objects with primary keys
+  n * SHARD_SIZE + 1 to (n + 1) * SHARD_SIZE, so it never exceeds the
+  protocol's 50,000 URLs and an object always lands in the same shard.
+* Tables are read in keyset chunks and shards are streamed to disk, so
+  memory use doesn't grow with the catalog.
+* A manifest keeps a fingerprint of the (id, version) pairs behind each
+  shard. A rebuild only rewrites the shards whose objects were added,
+  changed or deleted, and gives them a new lastmod in the index.
+"""
+import hashlib
+import json
+import os
+import re
+
+from django.conf import settings
+from django.db.models import Max
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.xmlutils import SimplerXMLGenerator
+from django.views.static import serve
+
+from catalog.models import Author, Book
+
+SHARD_SIZE = 50000
+CHUNK_SIZE = 2000
+
+SECTIONS = {
+    'books': Book,
+    'authors': Author,
+}
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+MANIFEST = 'manifest.json'
+
+shard_name_re = re.compile(r'^sitemap-[a-z]+-[0-9]+\.xml$')
+
+
+def sitemap_root():
+    return str(getattr(settings, 'SITEMAP_ROOT', settings.BASE_DIR / 'sitemaps'))
+
+
+def shard_name(section, number):
+    return f'sitemap-{section}-{number}.xml'
+
+
+def iter_rows(model, low, high):
+    """(pk, version) of the objects with low <= pk < high, in pk order."""
+    after = low - 1
+    while True:
+        rows = list(model.objects.filter(pk__gt=after, pk__lt=high)
+                    .order_by('pk').values_list('pk', 'version')[:CHUNK_SIZE])
+        if not rows:
+            return
+        yield from rows
+        after = rows[-1][0]
+
+
+def fingerprint(model, low, high):
+    """Digest of the objects in the range, or None when there are none."""
+    digest = hashlib.sha1()
+    empty = True
+    for pk, version in iter_rows(model, low, high):
+        digest.update(f'{pk}:{version};'.encode())
+        empty = False
+    return None if empty else digest.hexdigest()
+
+
+def write_atomic(path, write):
+    """Write a file through `write(file)` without exposing a partial file."""
+    temporary = path + '.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        write(f)
+    os.replace(temporary, path)
+
+
+def write_shard(path, model, low, high, base_url):
+    def write(f):
+        xml = SimplerXMLGenerator(f, 'utf-8')
+        xml.startDocument()
+        xml.startElement('urlset', {'xmlns': SITEMAP_NS})
+        for pk, _ in iter_rows(model, low, high):
+            xml.startElement('url', {})
+            xml.addQuickElement('loc', base_url + model(pk=pk).get_absolute_url())
+            xml.endElement('url')
+        xml.endElement('urlset')
+        xml.endDocument()
+
+    write_atomic(path, write)
+
+
+def write_index(path, shards, base_url):
+    def write(f):
+        xml = SimplerXMLGenerator(f, 'utf-8')
+        xml.startDocument()
+        xml.startElement('sitemapindex', {'xmlns': SITEMAP_NS})
+        for name, shard in sorted(shards.items()):
+            xml.startElement('sitemap', {})
+            xml.addQuickElement('loc', base_url + reverse('sitemap-shard', args=[name]))
+            xml.addQuickElement('lastmod', shard['lastmod'])
+            xml.endElement('sitemap')
+        xml.endElement('sitemapindex')
+        xml.endDocument()
+
+    write_atomic(path, write)
+
+
+def load_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def build(base_url=None, full=False, shard_size=SHARD_SIZE):
+    """Write the sitemaps, only rewriting changed shards unless `full`.
+        Returns (shards written, shards in total).
+    """
+    root = sitemap_root()
+    base_url = (base_url or getattr(settings, 'SITEMAP_BASE_URL', '')).rstrip('/')
+    os.makedirs(root, exist_ok=True)
+
+    manifest = load_manifest(root)
+    previous = manifest.get('shards', {})
+    if full or manifest.get('shard_size') != shard_size \
+            or manifest.get('base_url') != base_url:
+        previous = {}
+
+    shards = {}
+    written = 0
+    for section, model in SECTIONS.items():
+        max_pk = model.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0
+        for number in range((max_pk + shard_size - 1) // shard_size):
+            low = number * shard_size + 1
+            high = low + shard_size
+            digest = fingerprint(model, low, high)
+            if digest is None:
+                continue
+            name = shard_name(section, number)
+            path = os.path.join(root, name)
+            shard = previous.get(name)
+            if shard is None or shard['fingerprint'] != digest \
+                    or not os.path.exists(path):
+                write_shard(path, model, low, high, base_url)
+                shard = {'fingerprint': digest,
+                         'lastmod': timezone.now().isoformat(timespec='seconds')}
+                written += 1
+            shards[name] = shard
+
+    for name in os.listdir(root):
+        if shard_name_re.match(name) and name not in shards:
+            os.remove(os.path.join(root, name))
+
+    write_index(os.path.join(root, 'sitemap.xml'), shards, base_url)
+    write_atomic(os.path.join(root, MANIFEST), lambda f: json.dump(
+        {'shard_size': shard_size, 'base_url': base_url, 'shards': shards}, f))
+    return written, len(shards)
+
+
+def sitemap_view(request, name='sitemap.xml'):
+    """Serve the sitemap index or a shard written by `build()`."""
+    response = serve(request, name, document_root=sitemap_root())
+    response['Content-Type'] = 'application/xml'
+    return response
@@ -0,0 +1,149 @@
+"""
+Startup profiling for the WSGI/ASGI entry points.
+
+Each run starts a fresh interpreter under `python -X importtime`, the way a
+new worker would, and times the phases of getting to the first request:
+django.setup() (app and model imports plus every AppConfig.ready), loading
+the URLconf and importing the entry point module, which builds the
+middleware chain. Used by the `startup_profile` command.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+
+# Run in the child interpreter; prints the timings as JSON on stdout while
+# -X importtime writes one line per module to stderr.
+PROFILE_SCRIPT = '''
+import importlib, json, sys, time
+start = time.perf_counter()
+import django
+from django.apps.config import AppConfig
+
+ready = {}
+import_models = AppConfig.import_models
+
+def timed_import_models(self):
+    # populate() calls ready() on every app after importing its models
+    import_models(self)
+    app_ready = self.ready
+    def timed_ready():
+        began = time.perf_counter()
+        app_ready()
+        ready[self.label] = time.perf_counter() - began
+    self.ready = timed_ready
+
+AppConfig.import_models = timed_import_models
+phases = {}
+began = time.perf_counter()
+django.setup()
+phases['setup'] = time.perf_counter() - began
+
+from django.urls import get_resolver
+began = time.perf_counter()
+get_resolver().url_patterns
+phases['urlconf'] = time.perf_counter() - began
+
+began = time.perf_counter()
+importlib.import_module(sys.argv[1])
+phases['entry_point'] = time.perf_counter() - began
+
+if sys.argv[2] == '1':
+    from catalog import warmup
+    began = time.perf_counter()
+    warmup.warm_up()
+    phases['warm_up'] = time.perf_counter() - began
+
+phases['total'] = time.perf_counter() - start
+json.dump({'phases': phases, 'ready': ready, 'modules': sorted(sys.modules)},
+          sys.stdout)
+'''
+
+
+def entry_point_module(kind='wsgi'):
+    """Module holding the WSGI or ASGI application, e.g. 'locallibrary.wsgi'."""
+    setting = settings.WSGI_APPLICATION if kind == 'wsgi' else \
+        getattr(settings, 'ASGI_APPLICATION', None) or \
+        settings.WSGI_APPLICATION.replace('.wsgi.', '.asgi.')
+    return setting.rsplit('.', 1)[0]
+
+
+def parse_importtime(output):
+    """(module, self µs, cumulative µs) per line of -X importtime output."""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # the header
+        imports.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+    return imports
+
+
+def package(module):
+    """What an import is attributed to: the app for django.contrib modules,
+        e.g. 'django.contrib.admin', the subpackage for the rest of Django and
+        the top-level package for everything else.
+    """
+    parts = module.split('.')
+    if parts[0] == 'django':
+        return '.'.join(parts[:3] if parts[1:2] == ['contrib'] else parts[:2])
+    return parts[0]
+
+
+def by_package(imports):
+    """Total self import time per package, slowest first."""
+    totals = defaultdict(int)
+    for module, self_us, _ in imports:
+        totals[package(module)] += self_us
+    return sorted(totals.items(), key=lambda item: -item[1])
+
+
+def profile(entry_point, warm_up=False):
+    """Start a worker interpreter once and return its timings: `phases` and
+        `ready` (per app label) in seconds, `imports` as parsed by
+        parse_importtime() and the names of all loaded `modules`.
+    """
+    env = dict(os.environ,
+               DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE',
+                                                     'locallibrary.settings'))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROFILE_SCRIPT,
+         entry_point, '1' if warm_up else '0'],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f'Startup failed:\n{result.stderr[-2000:]}')
+    timings = json.loads(result.stdout)
+    timings['imports'] = parse_importtime(result.stderr)
+    return timings
+
+
+def summarize(runs):
+    """Median of each phase over several profile() runs, plus the total self
+        import time, as saved for a benchmark baseline.
+    """
+    summary = {}
+    for phase in runs[0]['phases']:
+        summary[phase] = statistics.median(run['phases'][phase] for run in runs)
+    summary['imports'] = statistics.median(
+        sum(self_us for _, self_us, _ in run['imports']) / 1e6 for run in runs)
+    return summary
+
+
+def regressions(summary, baseline, threshold, min_seconds=0.01):
+    """Phases more than `threshold` (e.g. 0.2 for 20%) slower than in
+        `baseline`, as {phase: (baseline seconds, current seconds)}. Phases
+        that got less than `min_seconds` slower are within the noise.
+    """
+    return {
+        phase: (baseline[phase], seconds)
+        for phase, seconds in summary.items()
+        if phase in baseline
+        and seconds > baseline[phase] * (1 + threshold)
+        and seconds - baseline[phase] >= min_seconds
+    }
@@ -0,0 +1,34 @@
+// Type-ahead for <select data-autocomplete-url="..."> pickers.
+// Only the selected options are rendered by the server; matches for the
+// typed prefix are fetched from the autocomplete endpoint.
+document.addEventListener('DOMContentLoaded', function () {
+  document.querySelectorAll('select[data-autocomplete-url]').forEach(function (select) {
+    var search = document.createElement('input');
+    var timer = null;
+    search.type = 'search';
+    search.placeholder = 'Type to search...';
+    search.className = 'form-control form-control-sm';
+    select.parentNode.insertBefore(search, select);
+
+    search.addEventListener('input', function () {
+      clearTimeout(timer);
+      timer = setTimeout(function () {
+        var url = select.dataset.autocompleteUrl + '?q=' + encodeURIComponent(search.value);
+        fetch(url, {credentials: 'same-origin'})
+          .then(function (response) { return response.json(); })
+          .then(function (data) {
+            // Keep what is already selected, replace the rest with the matches
+            Array.from(select.options).forEach(function (option) {
+              if (!option.selected) { option.remove(); }
+            });
+            data.results.forEach(function (result) {
+              var value = String(result.id);
+              if (!select.querySelector('option[value="' + value + '"]')) {
+                select.add(new Option(result.text, value));
+              }
+            });
+          });
+      }, 200);
+    });
+  });
+});
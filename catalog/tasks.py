@@ -0,0 +1,132 @@
+"""
+A small database-backed task queue.
+
+Work is queued with `enqueue()` and executed out of the request by
+`python manage.py run_workers`. Workers claim due tasks in batches, run them
+in a pool and retry failures with exponential backoff. A claimed task is
+hidden from other workers for `visibility_timeout` seconds; if its worker dies
+it becomes claimable again afterwards, or fails if that was its last attempt.
+Only the claim that holds a task records its outcome, so a worker that
+outlived its claim can't overwrite the result of the one that took over.
+"""
+import datetime
+import logging
+import traceback
+import uuid
+
+from django.core.mail import EmailMultiAlternatives
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from catalog.models import Task
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_DELAY = 10           # seconds, doubled on every attempt
+RETRY_MAX_DELAY = 60 * 60
+VISIBILITY_TIMEOUT = 5 * 60
+
+
+def task_name(func):
+    if isinstance(func, str):
+        return func
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def enqueue(func, *args, delay=0, max_attempts=3, **kwargs):
+    """Queue `func(*args, **kwargs)` to run in a worker. `func` is a module
+       level function or its dotted path; arguments must be JSON serializable.
+       The task is only visible to workers once the current transaction
+       commits.
+    """
+    return Task.objects.create(
+        name=task_name(func),
+        args=list(args),
+        kwargs=kwargs,
+        max_attempts=max_attempts,
+        run_at=timezone.now() + datetime.timedelta(seconds=delay),
+    )
+
+
+def retry_delay(attempts):
+    return min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+
+
+def claim_tasks(batch_size=10, visibility_timeout=VISIBILITY_TIMEOUT):
+    """Claim up to `batch_size` due tasks for this worker.
+
+       Candidates are locked with SELECT ... FOR UPDATE SKIP LOCKED where the
+       backend supports it. Each claim is also a conditional UPDATE on the
+       status/lock seen when reading, so on SQLite (no row locks) two workers
+       can never claim the same task.
+    """
+    now = timezone.now()
+    expired = Q(status='r', locked_until__lt=now)
+    exhausted = Q(attempts__gte=F('max_attempts'))
+    due = Q(status='q', run_at__lte=now) | (expired & ~exhausted)
+    locked_until = now + datetime.timedelta(seconds=visibility_timeout)
+    worker = uuid.uuid4().hex
+
+    with transaction.atomic():
+        Task.objects.filter(expired & exhausted).update(
+            status='f', locked_until=None, locked_by='',
+            last_error='The worker running the last attempt stopped')
+        candidates = Task.objects.filter(due).order_by('run_at')
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        candidates = list(candidates.values('pk', 'status', 'locked_until')[:batch_size])
+
+        claimed = []
+        for candidate in candidates:
+            updated = Task.objects.filter(**candidate).update(
+                status='r',
+                locked_until=locked_until,
+                locked_by=worker,
+                attempts=F('attempts') + 1,
+            )
+            if updated:
+                claimed.append(candidate['pk'])
+
+    return list(Task.objects.filter(pk__in=claimed))
+
+
+def run_task(task):
+    """Run a claimed task and record the outcome; returns True on success."""
+    try:
+        func = import_string(task.name)
+        func(*task.args, **task.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Task %s failed (attempt %d)', task.pk, task.attempts)
+        if task.attempts >= task.max_attempts:
+            finish(task, status='f', last_error=error)
+        else:
+            finish(task,
+                   status='q',
+                   last_error=error,
+                   run_at=timezone.now() + datetime.timedelta(
+                       seconds=retry_delay(task.attempts)))
+        return False
+
+    finish(task, status='d')
+    return True
+
+
+def finish(task, **values):
+    """Release `task` with `values` if this worker's claim still holds it."""
+    released = Task.objects\
+            .filter(pk=task.pk, status='r', locked_by=task.locked_by)\
+            .update(locked_until=None, locked_by='', **values)
+    if not released:
+        logger.warning('Task %s was reclaimed before attempt %d finished',
+                       task.pk, task.attempts)
+
+
+def send_email(subject, body, from_email, to, html_body=None):
+    """Task sending a single email, e.g. a password reset link."""
+    message = EmailMultiAlternatives(subject, body, from_email, to)
+    if html_body is not None:
+        message.attach_alternative(html_body, 'text/html')
+    message.send()
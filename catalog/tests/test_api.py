@@ -0,0 +1,93 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+class CatalogApiTest(TestCase):
+    def setUp(self):
+        self.authors = [
+            Author.objects.create(first_name=f'John {i}', last_name='Smith')
+            for i in range(3)
+        ]
+        self.fantasy = Genre.objects.create(name='Fantasy')
+        self.horror = Genre.objects.create(name='Horror')
+        self.english = Language.objects.create(name='English')
+        self.books = []
+        for i in range(7):
+            book = Book.objects.create(title=f'Book {i}', summary='Summary.',
+                    isbn=str(i), author=self.authors[i % 3], language=self.english)
+            book.genre.set([self.fantasy] if i % 2 else [self.fantasy, self.horror])
+            self.books.append(book)
+        self.copy = BookInstance.objects.create(book=self.books[0],
+                imprint='Imprint', status='a')
+
+    def get(self, resource, **params):
+        return self.client.get(reverse('api-list', args=[resource]), params)
+
+    def test_lists_all_fields(self):
+        response = self.get('books')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual(len(data), 7)
+        self.assertEqual(data[0], {
+            'id': self.books[0].pk, 'title': 'Book 0', 'author': self.authors[0].pk,
+            'summary': 'Summary.', 'isbn': '0',
+            'genre': [self.fantasy.pk, self.horror.pk], 'language': self.english.pk,
+        })
+
+    def test_sparse_fieldset(self):
+        with self.assertNumQueries(1):
+            response = self.get('books', fields='title')
+        self.assertEqual(response.json()['data'][0], {'id': self.books[0].pk, 'title': 'Book 0'})
+
+    def test_unknown_field_is_400(self):
+        response = self.get('books', fields='title,secret')
+        self.assertEqual(response.status_code, 400)
+
+    def test_ids_fetch(self):
+        ids = f'{self.books[1].pk},{self.books[4].pk}'
+        response = self.get('books', ids=ids, fields='title')
+        self.assertEqual([row['title'] for row in response.json()['data']],
+                         ['Book 1', 'Book 4'])
+
+    def test_include_uses_fixed_number_of_queries(self):
+        # books + genre links + authors + genres + languages
+        with self.assertNumQueries(5):
+            response = self.get('books', include='author,genre,language')
+        body = response.json()
+        self.assertEqual(len(body['included']['authors']), 3)
+        self.assertEqual(len(body['included']['genres']), 2)
+        self.assertEqual(body['included']['languages'], [{'id': self.english.pk, 'name': 'English'}])
+
+    def test_included_key_not_in_fields_is_dropped(self):
+        response = self.get('books', fields='title', include='author')
+        body = response.json()
+        self.assertNotIn('author', body['data'][0])
+        self.assertEqual(len(body['included']['authors']), 3)
+
+    def test_keyset_pagination(self):
+        response = self.get('books', fields='title', limit=3)
+        body = response.json()
+        self.assertEqual([row['title'] for row in body['data']], ['Book 0', 'Book 1', 'Book 2'])
+
+        titles = []
+        next_url = body['next']
+        while next_url:
+            body = self.client.get(next_url).json()
+            titles += [row['title'] for row in body['data']]
+            next_url = body.get('next')
+        self.assertEqual(titles, [f'Book {i}' for i in range(3, 7)])
+
+    def test_copies_uuid_ids(self):
+        response = self.get('copies', ids=str(self.copy.pk), include='book')
+        body = response.json()
+        self.assertEqual(body['data'][0]['id'], str(self.copy.pk))
+        self.assertEqual(body['included']['books'][0]['title'], 'Book 0')
+
+    def test_invalid_id_is_400(self):
+        response = self.get('copies', ids='not-a-uuid')
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_resource_is_404(self):
+        response = self.get('users')
+        self.assertEqual(response.status_code, 404)
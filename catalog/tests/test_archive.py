@@ -0,0 +1,86 @@
+import datetime
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog import archive
+from catalog.models import (ArchivedBookInstance, ArchivedLoanEvent, Book,
+                            BookAvailability, BookInstance, LoanEvent)
+
+class ArchiveTest(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title='Book Title', summary='Summary',
+                                        isbn='ABCDEFG')
+        self.cold = BookInstance.objects.create(book=self.book, imprint='Cold',
+                                                status='m')
+        self.hot = BookInstance.objects.create(book=self.book, imprint='Hot',
+                                               status='a')
+        self.long_ago = timezone.now() - datetime.timedelta(days=1000)
+        self.event = LoanEvent.objects.create(book_instance=self.cold, book=self.book,
+                                              kind='r', created=self.long_ago)
+        self.old_event = LoanEvent.objects.create(book_instance=self.hot, book=self.book,
+                                                  kind='r', created=self.long_ago)
+        self.recent_event = LoanEvent.objects.create(book_instance=self.hot,
+                                                     book=self.book, kind='r')
+
+    def counts(self):
+        return dict(BookAvailability.objects.filter(book=self.book)
+                    .values_list('status', 'count'))
+
+    def test_cold_copies_follow_policy(self):
+        self.assertEqual(list(archive.cold_copies()), [self.cold])
+        LoanEvent.objects.create(book_instance=self.cold, book=self.book, kind='c')
+        self.assertEqual(list(archive.cold_copies()), [])
+        with self.settings(ARCHIVE_COPY_STATUSES=['a', 'm']):
+            self.assertEqual(set(archive.cold_copies()), set())
+        with self.settings(ARCHIVE_COPY_IDLE_DAYS=0):
+            self.assertEqual(set(archive.cold_copies()), {self.cold})
+
+    def test_archive_copies_with_history(self):
+        self.assertEqual(archive.archive_copies(batch_size=1), 1)
+        self.assertEqual(list(BookInstance.objects.all()), [self.hot])
+        archived = ArchivedBookInstance.objects.get()
+        self.assertEqual((archived.pk, archived.imprint, archived.status),
+                         (self.cold.pk, 'Cold', 'm'))
+        self.assertEqual(ArchivedLoanEvent.objects.get().id, self.event.id)
+        self.assertEqual(self.counts(), {'m': 0, 'a': 1})
+
+    def test_archive_old_loan_events(self):
+        self.assertEqual(archive.archive_loan_events(), 2)
+        self.assertEqual(list(LoanEvent.objects.all()), [self.recent_event])
+
+    def test_restore(self):
+        archive.archive_copies()
+        archive.archive_loan_events()
+        self.assertEqual(archive.restore([self.cold.pk, self.hot.pk]), (1, 2))
+        restored = BookInstance.objects.get(pk=self.cold.pk)
+        self.assertEqual(restored.imprint, 'Cold')
+        self.assertEqual(LoanEvent.objects.count(), 3)
+        self.assertFalse(ArchivedBookInstance.objects.exists())
+        self.assertFalse(ArchivedLoanEvent.objects.exists())
+        self.assertEqual(self.counts(), {'m': 1, 'a': 1})
+
+    def test_commands(self):
+        out = StringIO()
+        call_command('archive_cold_rows', stdout=out)
+        self.assertIn('Archived 1 copies and 1 older loan events', out.getvalue())
+        call_command('restore_archived', book=self.book.pk, stdout=out)
+        self.assertIn('Restored 1 copies and 2 loan events', out.getvalue())
+        self.assertEqual(BookInstance.objects.count(), 2)
+
+    def test_admin_search_lists_archived_matches(self):
+        User.objects.create_superuser('admin', 'admin@example.com', '2HJ1vRV0Z&3iD')
+        self.client.login(username='admin', password='2HJ1vRV0Z&3iD')
+        archive.archive_copies()
+        response = self.client.get(
+            reverse('admin:catalog_bookinstance_changelist'), {'q': 'Book'})
+        self.assertContains(response, 'Archived copies (1)')
+        self.assertContains(response, reverse(
+            'admin:catalog_archivedbookinstance_change', args=[self.cold.pk]))
+        response = self.client.get(
+            reverse('admin:catalog_archivedbookinstance_changelist'), {'q': 'Cold'})
+        self.assertContains(response, str(self.cold.pk))
@@ -0,0 +1,128 @@
+import datetime
+import json
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog import changefeed
+from catalog.checkout import check_out
+from catalog.models import Author, Book, BookInstance, ChangeLogEntry, Genre
+
+class ChangeFeedTest(TestCase):
+    def setUp(self):
+        self.author = Author.objects.create(first_name='Big', last_name='Bob')
+        self.book = Book.objects.create(title='Book Title', summary='Summary',
+                                        isbn='ABCDEFG', author=self.author)
+
+    def entries(self, since=0):
+        return [(entry.model, entry.object_id, entry.action)
+                for entry in changefeed.changes_since(since)]
+
+    def test_create_update_delete(self):
+        self.author.last_name = 'Smith'
+        self.author.save()
+        pk, book_pk = self.author.pk, self.book.pk
+        self.book.delete()
+        self.author.delete()
+        self.assertEqual(self.entries(), [
+            ('catalog.author', str(pk), 'c'),
+            ('catalog.book', str(book_pk), 'c'),
+            ('catalog.author', str(pk), 'u'),
+            ('catalog.book', str(book_pk), 'd'),
+            ('catalog.author', str(pk), 'd'),
+        ])
+        update = changefeed.changes_since(0)[2]
+        self.assertEqual(update.data['last_name'], 'Smith')
+        self.assertIsNone(changefeed.changes_since(0)[-1].data)
+
+    def test_queryset_updates_are_recorded(self):
+        since = changefeed.changes_since(0)[-1].position
+        self.author.last_name = 'Smith'
+        self.author.save_changed(['last_name'])
+        genre = Genre.objects.create(name='Fantasy')
+        self.book.genre.add(genre)
+        changes = changefeed.changes_since(since)
+        self.assertEqual([(entry.model, entry.action) for entry in changes],
+                         [('catalog.author', 'u'), ('catalog.genre', 'c'),
+                          ('catalog.book', 'u')])
+        self.assertEqual(changes[2].data['genre'], [genre.pk])
+        self.assertEqual(changes[2].data['genre_names'], ['Fantasy'])
+
+    def test_checkout_recorded_without_borrower(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        since = changefeed.changes_since(0)[-1].position
+        check_out(self.book.pk, User.objects.create_user('reader'))
+        change = changefeed.changes_since(since)[-1]
+        self.assertEqual((change.object_id, change.action), (str(copy.pk), 'u'))
+        self.assertEqual(change.data['status'], 'o')
+        self.assertNotIn('borrower_id', change.data)
+
+    def test_compact_keeps_latest(self):
+        for name in ['One', 'Two', 'Three']:
+            self.author.last_name = name
+            self.author.save()
+        deleted = changefeed.compact()
+        self.assertEqual(deleted, 3)
+        author_entries = [entry for entry in changefeed.changes_since(0)
+                          if entry.model == 'catalog.author']
+        self.assertEqual(len(author_entries), 1)
+        self.assertEqual(author_entries[0].data['last_name'], 'Three')
+
+    def test_compact_drops_old_tombstones(self):
+        self.book.delete()
+        ChangeLogEntry.objects.filter(action='d').update(
+            created=timezone.now() - datetime.timedelta(days=60))
+        changefeed.compact()
+        self.assertEqual(self.entries(), [('catalog.author', str(self.author.pk), 'c')])
+
+    def test_late_commit_lands_after_cursor(self):
+        [first, second] = changefeed.changes_since(0)
+        # The author's entry committed only now, by a long transaction
+        seq = first.seq
+        first.delete()
+        ChangeLogEntry.objects.create(seq=seq, model=first.model,
+                                      object_id=first.object_id, action='u')
+        [late] = changefeed.changes_since(second.position)
+        self.assertEqual(late.seq, seq)
+        self.assertGreater(late.position, second.position)
+
+    def test_saved_atomically_with_entry(self):
+        genre = Genre(name='Fantasy')
+        with mock.patch.object(changefeed, 'snapshot', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                genre.save()
+        self.assertFalse(Genre.objects.filter(name='Fantasy').exists())
+
+    def test_endpoint_pages_with_cursor(self):
+        response = self.client.get(reverse('api-changes'), {'limit': 1})
+        body = response.json()
+        self.assertEqual(len(body['data']), 1)
+        self.assertTrue(body['has_more'])
+        self.assertEqual(body['data'][0]['model'], 'catalog.author')
+
+        body = self.client.get(reverse('api-changes'),
+                               {'since': body['next'], 'limit': 1}).json()
+        self.assertEqual(body['data'][0]['model'], 'catalog.book')
+        self.assertFalse(body['has_more'])
+
+        body = self.client.get(reverse('api-changes'), {'since': body['next']}).json()
+        self.assertEqual(body['data'], [])
+
+    def test_endpoint_bad_cursor(self):
+        response = self.client.get(reverse('api-changes'), {'since': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('changes', batch_size=1, stdout=out)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([line['model'] for line in lines],
+                         ['catalog.author', 'catalog.book'])
+        out = StringIO()
+        call_command('changes', since=lines[0]['seq'], stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 1)
@@ -0,0 +1,102 @@
+import datetime
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import Permission, User
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from catalog.checkout import NoCopyAvailable, check_out
+from catalog.models import Book, BookAvailability, BookInstance, Branch, LoanEvent
+
+class CheckOutTest(TestCase):
+    def setUp(self):
+        self.borrower = User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        self.branch = Branch.objects.create(name='Central')
+        self.book = Book.objects.create(title='Book Title', summary='Summary',
+                                        isbn='ABCDEFG')
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a',
+                                    branch=self.branch)
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='m')
+
+    def available(self, branch=None):
+        return BookAvailability.objects.get(book=self.book, branch=branch,
+                                            status='a').count
+
+    def test_claims_an_available_copy(self):
+        copy = check_out(self.book.pk, self.borrower)
+        self.assertEqual(copy.status, 'o')
+        self.assertEqual(copy.borrower, self.borrower)
+        self.assertEqual(copy.due_back, datetime.date.today() + datetime.timedelta(weeks=3))
+        self.assertEqual(copy.version, 1)
+        self.assertEqual(LoanEvent.objects.get().book_instance, copy)
+        self.assertEqual(self.available() + self.available(self.branch), 1)
+
+    def test_branch(self):
+        copy = check_out(self.book.pk, self.borrower, branch_id=self.branch.pk)
+        self.assertEqual(copy.branch, self.branch)
+        self.assertEqual(self.available(self.branch), 0)
+        with self.assertRaises(NoCopyAvailable):
+            check_out(self.book.pk, self.borrower, branch_id=self.branch.pk)
+
+    def test_none_available(self):
+        first = check_out(self.book.pk, self.borrower)
+        second = check_out(self.book.pk, self.borrower)
+        self.assertNotEqual(first.pk, second.pk)
+        with self.assertRaises(NoCopyAvailable):
+            check_out(self.book.pk, self.borrower)
+
+
+class CheckOutViewTest(TestCase):
+    def setUp(self):
+        librarian = User.objects.create_user(username='librarian', password='2HJ1vRV0Z&3iD')
+        librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        self.book = Book.objects.create(title='Book Title', summary='Summary',
+                                        isbn='ABCDEFG')
+        self.copy = BookInstance.objects.create(book=self.book, imprint='Imprint',
+                                                status='a')
+        self.url = reverse('checkout-book', args=[self.book.pk])
+
+    def test_requires_permission(self):
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+        response = self.client.post(self.url, {'borrower': 'reader'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_checkout_then_none_available(self):
+        self.client.login(username='librarian', password='2HJ1vRV0Z&3iD')
+        response = self.client.post(self.url, {'borrower': 'reader'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['copy'], str(self.copy.pk))
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).borrower.username, 'reader')
+
+        response = self.client.post(self.url, {'borrower': 'reader'})
+        self.assertEqual(response.status_code, 409)
+
+    def test_unknown_borrower(self):
+        self.client.login(username='librarian', password='2HJ1vRV0Z&3iD')
+        response = self.client.post(self.url, {'borrower': 'nobody'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_not_allowed(self):
+        self.client.login(username='librarian', password='2HJ1vRV0Z&3iD')
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+
+class StressCheckoutCommandTest(TransactionTestCase):
+    def test_no_copy_lent_twice(self):
+        out = StringIO()
+        call_command('stress_checkout', copies=30, clients=4, live_database=True,
+                     stdout=out)
+        self.assertIn('30 checkouts by 4 clients', out.getvalue())
+        self.assertFalse(Book.objects.exists())
+
+    def test_runs_in_test_database(self):
+        command = 'catalog.management.commands.stress_checkout'
+        with mock.patch(f'{command}.setup_databases', return_value='config') as setup, \
+                mock.patch(f'{command}.teardown_databases') as teardown:
+            call_command('stress_checkout', copies=2, clients=1, stdout=StringIO())
+        setup.assert_called_once()
+        teardown.assert_called_once_with('config', verbosity=0)
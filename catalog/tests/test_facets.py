@@ -0,0 +1,148 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import QueryDict
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import facets
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+class FacetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.fantasy = Genre.objects.create(name='Fantasy')
+        self.poetry = Genre.objects.create(name='Poetry')
+        self.english = Language.objects.create(name='English')
+        self.french = Language.objects.create(name='French')
+        self.smith = Author.objects.create(first_name='John', last_name='Smith')
+        self.jones = Author.objects.create(first_name='Jane', last_name='Jones')
+        self.books = []
+        for i, (genres, language, author) in enumerate([
+                ([self.fantasy], self.english, self.smith),
+                ([self.fantasy, self.poetry], self.french, self.smith),
+                ([self.poetry], self.english, self.jones),
+                ([], self.english, self.jones)]):
+            book = Book.objects.create(title=f'Title {i}', summary='Summary',
+                                       isbn=f'ISBN{i}', language=language,
+                                       author=author)
+            book.genre.set(genres)
+            self.books.append(book)
+        BookInstance.objects.create(book=self.books[0], imprint='Imprint', status='a')
+        BookInstance.objects.create(book=self.books[2], imprint='Imprint', status='o')
+
+    def browse(self, query=''):
+        return facets.Browse(QueryDict(query))
+
+    def counts(self, browse, facet):
+        for name, title, values in browse.facets:
+            if name == facet:
+                return {value['label']: value['count'] for value in values}
+
+    def test_invalidated_again_on_commit(self):
+        self.browse()
+        with self.captureOnCommitCallbacks() as callbacks:
+            Book.objects.create(title='New', summary='Summary', isbn='ISBN9',
+                                author=self.smith)
+            # A concurrent request still sees the old rows and caches them
+            generation = cache.get(facets.INDEX_KEY + ':generation')
+            stale = facets.build_index()
+            stale['all'] = facets.bitmap([book.pk for book in self.books])
+            cache.set(f'{facets.INDEX_KEY}:{generation}', stale)
+            facets._local.pop(facets.INDEX_KEY, None)
+            self.assertEqual(len(self.browse().book_ids), 4)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(self.browse().book_ids), 5)
+
+    def test_bitmaps(self):
+        ids = [1, 5, 8, 64, 1000]
+        self.assertEqual(facets.members(facets.bitmap(ids)), ids)
+        self.assertEqual(facets.bitmap([]), 0)
+
+    def test_pages_of_bitmap(self):
+        ids = list(range(3, 20000, 7))
+        book_ids = facets.BitmapIds(facets.bitmap(ids))
+        self.assertEqual(len(book_ids), len(ids))
+        self.assertEqual(book_ids[1000:1005], ids[1000:1005])
+        self.assertEqual(book_ids[-3:], ids[-3:])
+        self.assertEqual(book_ids[2000], ids[2000])
+        self.assertEqual(list(book_ids), ids)
+
+    def test_counts_stop_at_values_that_cant_be_shown(self):
+        brown = Author.objects.create(first_name='Jim', last_name='Brown')
+        Book.objects.create(title='Title 4', summary='Summary', isbn='ISBN4',
+                            language=self.english, author=brown)
+        with mock.patch.object(facets, 'FACET_LIMIT', 1):
+            browse = self.browse(f'language={self.english.pk}')
+            index = facets.cached(facets.INDEX_KEY, facets.build_index)
+            counts = browse.top_counts('author', index['bitmaps']['language'][self.english.pk],
+                                       index)
+        self.assertEqual(self.counts(browse, 'author'), {'Jones, Jane': 2})
+        # Brown's single book can't beat Jones's two, so it isn't counted
+        self.assertEqual(counts, {self.smith.pk: 1, self.jones.pk: 2})
+
+    def test_unfiltered(self):
+        browse = self.browse()
+        self.assertEqual(list(browse.book_ids), [book.pk for book in self.books])
+        self.assertEqual(self.counts(browse, 'genre'), {'Fantasy': 2, 'Poetry': 2})
+        self.assertEqual(self.counts(browse, 'language'), {'English': 3, 'French': 1})
+        self.assertEqual(self.counts(browse, 'available'), {'Available now': 1})
+
+    def test_or_within_and_across_facets(self):
+        browse = self.browse(f'genre={self.fantasy.pk}&genre={self.poetry.pk}'
+                             f'&language={self.english.pk}')
+        self.assertEqual(list(browse.book_ids), [self.books[0].pk, self.books[2].pk])
+        # Counts for a facet ignore its own selection
+        self.assertEqual(self.counts(browse, 'genre'), {'Fantasy': 1, 'Poetry': 1})
+        self.assertEqual(self.counts(browse, 'language'), {'English': 2, 'French': 1})
+        self.assertEqual(self.counts(browse, 'author'),
+                         {'Smith, John': 1, 'Jones, Jane': 1})
+
+    def test_availability(self):
+        browse = self.browse(f'available={facets.AVAILABLE}')
+        self.assertEqual(list(browse.book_ids), [self.books[0].pk])
+        copy = BookInstance.objects.get(status='o')
+        copy.status = 'a'
+        copy.save()
+        self.assertEqual(list(self.browse(f'available={facets.AVAILABLE}').book_ids),
+                         [self.books[0].pk, self.books[2].pk])
+
+    def test_counts_from_cached_index(self):
+        self.browse()
+        with self.assertNumQueries(0):
+            self.browse(f'genre={self.fantasy.pk}&author={self.smith.pk}')
+
+    def test_index_follows_changes(self):
+        self.browse()
+        self.books[3].genre.add(self.fantasy)
+        self.assertEqual(self.counts(self.browse(), 'genre'), {'Fantasy': 3, 'Poetry': 2})
+        self.fantasy.name = 'High Fantasy'
+        self.fantasy.save()
+        self.assertIn('High Fantasy', self.counts(self.browse(), 'genre'))
+        self.books[3].language = self.french
+        self.books[3].save_changed(['language'])
+        self.assertEqual(self.counts(self.browse(), 'language'), {'English': 2, 'French': 2})
+
+    def test_toggle_query(self):
+        browse = self.browse(f'genre={self.fantasy.pk}&page=2')
+        values = {value['label']: value for value in browse.facets[0][2]}
+        self.assertTrue(values['Fantasy']['selected'])
+        self.assertEqual(values['Fantasy']['query'], '')
+        self.assertEqual(QueryDict(values['Poetry']['query']).getlist('genre'),
+                         [str(self.fantasy.pk), str(self.poetry.pk)])
+
+    def test_list_view(self):
+        response = self.client.get(reverse('books'), {'genre': self.poetry.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['book_list']),
+                         [self.books[1], self.books[2]])
+        self.assertContains(response, 'Clear filters')
+
+    def test_list_view_pagination_keeps_filters(self):
+        for i in range(6):
+            Book.objects.create(title=f'More {i}', summary='Summary', isbn=f'MORE{i}',
+                                language=self.english, author=self.smith)
+        response = self.client.get(reverse('books'), {'language': self.english.pk})
+        self.assertTrue(response.context['is_paginated'])
+        self.assertContains(response, f'?language={self.english.pk}&page=2')
@@ -3,7 +3,8 @@ import datetime
 from django.test import TestCase
 from django.utils import timezone
 
-from catalog.forms import RenewBookForm
+from catalog.forms import BookForm, RenewBookForm
+from catalog.models import Author, Book, Genre
 
 class RenewBookFormTest(TestCase):
     def test_renew_form_date_field_label(self):
@@ -36,3 +37,36 @@ class RenewBookFormTest(TestCase):
         date = timezone.localtime() + datetime.timedelta(weeks=4)
         form = RenewBookForm(data={'renewal_date': date})
         self.assertTrue(form.is_valid())
+
+class BookFormTest(TestCase):
+    def setUp(self):
+        for author_id in range(20):
+            Author.objects.create(first_name=f'Jane {author_id}', last_name='Smith')
+        self.test_author = Author.objects.create(first_name='John', last_name='Doe')
+        self.test_genre = Genre.objects.create(name='Fantasy')
+        self.test_book = Book.objects.create(
+            title='Book Title',
+            summary='My book summary.',
+            isbn='ABCDEFG',
+            author=self.test_author,
+        )
+        self.test_book.genre.add(self.test_genre)
+
+    def test_empty_form_renders_no_related_options(self):
+        html = BookForm().as_table()
+        self.assertNotIn('Smith', html)
+        self.assertIn('data-autocomplete-url="/catalog/autocomplete/author/"', html)
+
+    def test_invalid_bound_values_render_form_errors(self):
+        form = BookForm(data={'title': 'T', 'summary': 'S', 'isbn': 'I',
+                              'author': 'abc', 'genre': ['abc', self.test_genre.pk]})
+        self.assertFalse(form.is_valid())
+        html = form.as_table()
+        self.assertIn('errorlist', html)
+        self.assertNotIn('Smith', html)
+
+    def test_bound_form_renders_only_selected_options(self):
+        html = BookForm(instance=self.test_book).as_table()
+        self.assertIn('Doe, John', html)
+        self.assertIn('Fantasy', html)
+        self.assertNotIn('Smith', html)
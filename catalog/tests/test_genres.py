@@ -0,0 +1,70 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Author, Book, Genre
+
+class GenreNamesTest(TestCase):
+    def setUp(self):
+        self.fantasy = Genre.objects.create(name='Fantasy')
+        self.poetry = Genre.objects.create(name='Poetry')
+        author = Author.objects.create(first_name='Big', last_name='Bob')
+        self.book = Book.objects.create(title='Book Title', summary='Summary',
+                                        isbn='ABCDEFG', author=author)
+        self.other = Book.objects.create(title='Other Title', summary='Summary',
+                                         isbn='HIJKLMN')
+
+    def names(self, book):
+        return Book.objects.get(pk=book.pk).genre_names
+
+    def test_adding_genres_stores_sorted_names(self):
+        self.book.genre.add(self.poetry, self.fantasy)
+        self.assertEqual(self.names(self.book), ['Fantasy', 'Poetry'])
+        self.assertEqual(self.book.genre_names, ['Fantasy', 'Poetry'])
+
+    def test_removing_and_clearing(self):
+        self.book.genre.set([self.fantasy, self.poetry])
+        self.book.genre.remove(self.fantasy)
+        self.assertEqual(self.names(self.book), ['Poetry'])
+        self.book.genre.clear()
+        self.assertEqual(self.names(self.book), [])
+
+    def test_changes_from_the_genre_side(self):
+        self.fantasy.book_set.add(self.book, self.other)
+        self.assertEqual(self.names(self.other), ['Fantasy'])
+        self.fantasy.book_set.clear()
+        self.assertEqual(self.names(self.book), [])
+        self.assertEqual(self.names(self.other), [])
+
+    def test_rename_updates_books(self):
+        self.book.genre.add(self.fantasy)
+        self.fantasy.name = 'High Fantasy'
+        self.fantasy.save()
+        self.assertEqual(self.names(self.book), ['High Fantasy'])
+
+    def test_delete_updates_books(self):
+        self.book.genre.add(self.fantasy, self.poetry)
+        self.poetry.delete()
+        self.assertEqual(self.names(self.book), ['Fantasy'])
+
+    def test_display_genre_needs_no_query(self):
+        self.book.genre.add(self.fantasy, self.poetry)
+        with self.assertNumQueries(1):
+            genres = [book.display_genre() for book in Book.objects.order_by('pk')]
+        self.assertEqual(genres, ['Fantasy, Poetry', ''])
+
+    def test_detail_page_shows_names(self):
+        self.book.genre.add(self.fantasy)
+        response = self.client.get(reverse('book-detail', args=[self.book.pk]))
+        self.assertContains(response, 'Fantasy')
+
+    def test_sync_command_backfills_and_checks(self):
+        self.book.genre.add(self.fantasy)
+        Book.objects.update(genre_names=[])
+        with self.assertRaisesMessage(CommandError, '1 of 2 books'):
+            call_command('sync_genre_names', check=True, stdout=StringIO())
+        call_command('sync_genre_names', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.names(self.book), ['Fantasy'])
+        call_command('sync_genre_names', check=True, stdout=StringIO())
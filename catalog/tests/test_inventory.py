@@ -0,0 +1,81 @@
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import inventory
+from catalog.models import Author, Book, BookAvailability, BookInstance, Branch
+
+class AvailabilityIndexTest(TestCase):
+    def setUp(self):
+        test_author = Author.objects.create(first_name='John', last_name='Smith')
+        self.book = Book.objects.create(title='Book Title', summary='Summary.',
+                                        isbn='1', author=test_author)
+        self.central = Branch.objects.create(name='Central')
+        self.east = Branch.objects.create(name='East')
+
+    def copy(self, branch, status='a'):
+        return BookInstance.objects.create(book=self.book, imprint='Imprint',
+                                           branch=branch, status=status)
+
+    def counts(self):
+        return {(row.branch.name if row.branch else None, row.status): row.count
+                for row in BookAvailability.objects.filter(count__gt=0)
+                .select_related('branch')}
+
+    def test_created_copies_are_counted(self):
+        self.copy(self.central)
+        self.copy(self.central)
+        self.copy(self.east, status='m')
+        self.assertEqual(self.counts(), {('Central', 'a'): 2, ('East', 'm'): 1})
+
+    def test_status_and_branch_changes_move_counts(self):
+        copy = self.copy(self.central)
+        copy.status = 'o'
+        copy.save()
+        copy = BookInstance.objects.get(pk=copy.pk)
+        copy.branch = self.east
+        copy.save()
+        self.assertEqual(self.counts(), {('East', 'o'): 1})
+
+    def test_delete_decrements(self):
+        copy = self.copy(self.central)
+        BookInstance.objects.get(pk=copy.pk).delete()
+        self.assertEqual(self.counts(), {})
+
+    def test_branch_delete_moves_copies_to_unassigned(self):
+        self.copy(self.central)
+        self.central.delete()
+        self.assertEqual(self.counts(), {(None, 'a'): 1})
+
+    def test_one_counter_without_branch(self):
+        self.copy(None)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            BookAvailability.objects.create(book=self.book, status='a', count=1)
+        # A writer losing the race to create the counter adds to the winner's
+        inventory.adjust(self.book.pk, None, 'a', 1)
+        self.assertEqual(self.counts(), {(None, 'a'): 2})
+
+    def test_rebuild_matches_incremental_counts(self):
+        self.copy(self.central)
+        self.copy(self.east)
+        self.copy(self.east, status='o')
+        before = self.counts()
+        inventory.rebuild()
+        self.assertEqual(self.counts(), before)
+
+    def test_available_at_is_one_query(self):
+        self.copy(self.central)
+        self.copy(self.east)
+        self.copy(self.east)
+        with self.assertNumQueries(1):
+            rows = [(row.branch.name, row.count) for row in inventory.available_at(self.book)]
+        self.assertEqual(rows, [('East', 2), ('Central', 1)])
+
+    def test_detail_page_and_api(self):
+        self.copy(self.east)
+        response = self.client.get(self.book.get_absolute_url())
+        self.assertContains(response, 'East: 1 available')
+
+        response = self.client.get(reverse('api-book-availability', args=[self.book.pk]))
+        self.assertEqual(response.json()['data'],
+                         [{'branch': self.east.pk, 'branch_name': 'East', 'available': 1}])
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.template import Context, Template
+from django.test import TestCase
+
+from catalog.lazyload import LazyLoadError
+from catalog.models import Author, Book, BookInstance, Genre
+
+class LazyLoadDetectionTest(TestCase):
+    def setUp(self):
+        test_author = Author.objects.create(first_name='John', last_name='Smith')
+        test_genre = Genre.objects.create(name='Fantasy')
+        for i in range(3):
+            book = Book.objects.create(title=f'Book {i}', summary='Summary.',
+                                       isbn=str(i), author=test_author)
+            book.genre.add(test_genre)
+            BookInstance.objects.create(book=book, imprint='Imprint')
+
+    def test_enabled_for_tests(self):
+        self.assertEqual(settings.LAZY_LOAD_DETECTION, 'raise')
+
+    def test_lazy_foreign_key_in_loop_raises(self):
+        with self.assertRaisesMessage(LazyLoadError, 'BookInstance.book'):
+            for copy in BookInstance.objects.all():
+                copy.display_title()
+
+    def test_select_related_is_allowed(self):
+        with self.assertNumQueries(1):
+            titles = [copy.display_title() for copy in
+                      BookInstance.objects.select_related('book')]
+        self.assertEqual(len(titles), 3)
+
+    def test_single_object_is_allowed(self):
+        copy = BookInstance.objects.first()
+        self.assertTrue(copy.display_title().startswith('Book'))
+
+    def test_lazy_many_to_many_in_loop_raises(self):
+        with self.assertRaisesMessage(LazyLoadError, 'Book.genre'):
+            for book in Book.objects.all():
+                list(book.genre.all())
+
+    def test_prefetch_related_is_allowed(self):
+        with self.assertNumQueries(2):
+            genres = [[genre.name for genre in book.genre.all()] for book in
+                      Book.objects.prefetch_related('genre')]
+        self.assertEqual(genres, [['Fantasy']] * 3)
+
+    def test_template_line_is_reported(self):
+        template = Template('{% for copy in copies %}\n{{ copy.book.title }}{% endfor %}')
+        with self.assertRaisesMessage(LazyLoadError, 'line 2'):
+            template.render(Context({'copies': BookInstance.objects.all()}))
@@ -0,0 +1,93 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from catalog.loans import (loans_by_genre, loans_by_language,
+                           most_borrowed_books, record_loan_event)
+from catalog.models import (Author, Book, BookInstance, BookLoanRollup, Genre,
+                            GenreLoanRollup, Language, LoanEvent)
+
+class LoanEventTest(TestCase):
+    def setUp(self):
+        self.test_user = User.objects.create_user(
+            username='testuser1',
+            password='1X<ISRUkw+tuK'
+        )
+        test_author = Author.objects.create(first_name='John', last_name='Smith')
+        self.fantasy = Genre.objects.create(name='Fantasy')
+        self.horror = Genre.objects.create(name='Horror')
+        self.english = Language.objects.create(name='English')
+        self.book1 = Book.objects.create(title='Book One', summary='Summary.',
+                isbn='1', author=test_author, language=self.english)
+        self.book1.genre.set([self.fantasy, self.horror])
+        self.book2 = Book.objects.create(title='Book Two', summary='Summary.',
+                isbn='2', author=test_author, language=self.english)
+        self.book2.genre.set([self.fantasy])
+
+        self.copy1 = BookInstance.objects.create(book=self.book1,
+                imprint='Unlikely Imprint, 2022', status='a')
+        self.copy2 = BookInstance.objects.create(book=self.book2,
+                imprint='Unlikely Imprint, 2022', status='a')
+
+    def checkout(self, copy):
+        copy.status = 'o'
+        copy.borrower = self.test_user
+        copy.due_back = datetime.date.today() + datetime.timedelta(weeks=3)
+        copy.save()
+
+    def test_available_copy_has_no_events(self):
+        self.assertEqual(LoanEvent.objects.count(), 0)
+
+    def test_checkout_return_and_renew_are_logged(self):
+        self.checkout(self.copy1)
+        self.copy1.due_back += datetime.timedelta(weeks=1)
+        self.copy1.save()
+        self.copy1.status = 'a'
+        self.copy1.save()
+
+        kinds = list(LoanEvent.objects.values_list('kind', flat=True))
+        self.assertEqual(kinds, ['c', 'n', 'r'])
+        event = LoanEvent.objects.first()
+        self.assertEqual(event.book, self.book1)
+        self.assertEqual(event.borrower, self.test_user)
+
+    def test_loaded_copy_knows_its_loan_state(self):
+        self.checkout(self.copy1)
+        copy = BookInstance.objects.get(pk=self.copy1.pk)
+        copy.imprint = 'Another Imprint'
+        copy.save()
+        self.assertEqual(LoanEvent.objects.count(), 1)
+
+    def test_rollups_are_maintained(self):
+        self.checkout(self.copy1)
+        self.copy1.status = 'a'
+        self.copy1.save()
+        self.checkout(self.copy1)
+        self.checkout(self.copy2)
+
+        rollup = BookLoanRollup.objects.get(book=self.book1)
+        self.assertEqual((rollup.checkouts, rollup.returns), (2, 1))
+        self.assertEqual(GenreLoanRollup.objects.get(genre=self.fantasy).checkouts, 3)
+        self.assertEqual(GenreLoanRollup.objects.get(genre=self.horror).checkouts, 2)
+
+    def test_most_borrowed_reads_rollups(self):
+        self.checkout(self.copy1)
+        self.copy1.status = 'a'
+        self.copy1.save()
+        self.checkout(self.copy1)
+        self.checkout(self.copy2)
+
+        with self.assertNumQueries(1):
+            report = most_borrowed_books()
+        self.assertEqual([(r['book__title'], r['loans']) for r in report],
+                         [('Book One', 2), ('Book Two', 1)])
+        self.assertEqual(loans_by_genre()[0]['loans'], 3)
+        self.assertEqual(loans_by_language()[0]['loans'], 3)
+
+    def test_report_excludes_previous_months(self):
+        last_month = timezone.now() - datetime.timedelta(days=40)
+        self.copy1.status = 'o'
+        record_loan_event(self.copy1, 'c', when=last_month)
+        self.assertEqual(most_borrowed_books(), [])
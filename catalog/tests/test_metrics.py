@@ -0,0 +1,90 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import metrics
+from catalog.models import Author
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.metrics_dir = tempfile.TemporaryDirectory()
+        self.override = self.settings(METRICS_DIR=self.metrics_dir.name)
+        self.override.enable()
+        Author.objects.create(first_name='Big', last_name='Bob')
+
+    def tearDown(self):
+        self.override.disable()
+        self.metrics_dir.cleanup()
+
+    def sample(self, name, **labels):
+        key_labels = tuple(sorted(labels.items()))
+        for (metric, sample, found), value in metrics.collect().items():
+            if metric + sample == name and found == key_labels:
+                return value
+        return None
+
+    def test_values_survive_reopen(self):
+        values = metrics.MmapValues(os.path.join(self.metrics_dir.name, '1.db'))
+        for i in range(2000):
+            values.inc(f'key {i}', i)
+        values.inc('key 5', 1)
+        reopened = metrics.MmapValues(values.path)
+        entries = {key: value for key, _, value in metrics.read_entries(reopened.mmap)}
+        self.assertEqual(entries['key 5'], 6)
+        self.assertEqual(entries['key 1999'], 1999)
+
+    def test_request_latency_and_queries_by_url_name(self):
+        self.client.get(reverse('authors'))
+        self.client.get(reverse('authors'))
+        self.assertEqual(self.sample('http_request_duration_seconds_count', view='authors'), 2)
+        self.assertGreater(self.sample('http_request_db_queries_sum', view='authors'), 0)
+
+    def test_page_cache_lookups_counted(self):
+        self.client.get(reverse('authors'))
+        self.client.get(reverse('authors'))
+        self.assertEqual(self.sample('cache_lookups_total', cache='page', result='miss'), 1)
+        self.assertEqual(self.sample('cache_lookups_total', cache='page', result='hit'), 1)
+
+    def test_session_writes_counted(self):
+        self.client.get(reverse('index'))
+        self.assertEqual(self.sample('session_writes_total'), 1)
+
+    def test_active_requests_back_to_zero(self):
+        self.client.get(reverse('index'))
+        self.assertEqual(self.sample('http_requests_active'), 0)
+
+    def test_endpoint_renders_prometheus_text(self):
+        self.client.get(reverse('authors'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_duration_seconds_bucket{view="authors",le="+Inf"} 1', body)
+        self.assertIn('# TYPE cache_lookups_total counter', body)
+
+    def test_endpoint_restricted_by_ip(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 403)
+
+    def test_reused_pid_starts_without_gauges(self):
+        path = os.path.join(self.metrics_dir.name, f'{os.getpid()}.db')
+        values = metrics.MmapValues(path)
+        values.inc(metrics.CACHE_LOOKUPS.key('_total', {'cache': 'page', 'result': 'hit'}), 3)
+        values.inc(metrics.ACTIVE_REQUESTS.key('', {}), 4)
+        with mock.patch.object(metrics, '_values', None):
+            metrics.process_values()
+        self.assertEqual(self.sample('cache_lookups_total', cache='page', result='hit'), 3)
+        self.assertEqual(self.sample('http_requests_active'), 0)
+
+    def test_samples_from_dead_processes(self):
+        values = metrics.MmapValues(os.path.join(self.metrics_dir.name, '999999999.db'))
+        values.inc(metrics.CACHE_LOOKUPS.key('_total', {'cache': 'page', 'result': 'hit'}), 3)
+        values.inc(metrics.ACTIVE_REQUESTS.key('', {}), 4)
+        # Counters are kept, gauges of dead processes are dropped
+        self.assertEqual(self.sample('cache_lookups_total', cache='page', result='hit'), 3)
+        self.assertIsNone(self.sample('http_requests_active'))
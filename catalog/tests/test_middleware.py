@@ -0,0 +1,233 @@
+import gzip
+import os
+import tempfile
+import time
+import unittest
+
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from catalog.checks import check_rate_limit_cache
+from catalog.middleware import (AnonymousPageCacheMiddleware,
+                                CompressionMiddleware, brotli, release_slot,
+                                take_slot, take_token)
+from catalog.models import Author
+
+class AnonymousPageCacheMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        for author_id in range(7):
+            Author.objects.create(
+                first_name=f'Dominique {author_id}',
+                last_name=f'Surname {author_id}',
+            )
+
+    def test_anonymous_get_is_cached(self):
+        response = self.client.get(reverse('authors'))
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        response = self.client.get(reverse('authors'))
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Surname 0')
+
+    def test_pagination_query_string_is_part_of_key(self):
+        self.client.get(reverse('authors'))
+        response = self.client.get(reverse('authors')+'?page=2')
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Surname 6')
+        self.assertNotContains(response, 'Surname 0')
+
+    def test_logged_in_user_is_not_cached(self):
+        User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        self.client.get(reverse('authors'))
+        response = self.client.get(reverse('authors'))
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertContains(response, 'testuser1')
+
+    def test_uncached_url_name(self):
+        response = self.client.get(reverse('index'))
+        self.assertFalse(response.has_header('X-Page-Cache'))
+
+    def test_model_change_invalidates(self):
+        self.client.get(reverse('authors'))
+        author = Author.objects.get(last_name='Surname 0')
+        author.first_name = 'Renamed'
+        author.save()
+        response = self.client.get(reverse('authors'))
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Renamed')
+
+    def test_edit_through_view_invalidates(self):
+        author = Author.objects.get(last_name='Surname 0')
+        self.client.get(author.get_absolute_url())
+        self.assertEqual(self.client.get(author.get_absolute_url())['X-Page-Cache'], 'hit')
+
+        librarian = self.client_class()
+        user = User.objects.create_user(username='librarian', password='1X<ISRUkw+tuK')
+        user.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        librarian.force_login(user)
+        response = librarian.post(reverse('author-update', args=[author.pk]), {
+            'first_name': 'Renamed', 'last_name': 'Surname 0',
+            'version': author.version})
+        self.assertRedirects(response, author.get_absolute_url(),
+                             fetch_redirect_response=False)
+
+        response = self.client.get(author.get_absolute_url())
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Renamed')
+
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    def test_expired_entry_served_stale_while_locked(self):
+        self.client.get(reverse('authors'))
+        request_key = AnonymousPageCacheMiddleware(None).cache_key(
+            self.client.get(reverse('authors')).wsgi_request)
+        # Simulate another worker regenerating the page
+        cache.add(request_key + ':lock', 1, 10)
+        response = self.client.get(reverse('authors'))
+        self.assertEqual(response['X-Page-Cache'], 'stale')
+
+class CompressionMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        for author_id in range(5):
+            Author.objects.create(
+                first_name=f'Dominique {author_id}',
+                last_name=f'Surname {author_id}',
+            )
+
+    def test_html_is_gzipped_when_accepted(self):
+        response = self.client.get(reverse('authors'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn(b'Surname 0', gzip.decompress(response.content))
+
+    def test_not_compressed_without_accept_encoding(self):
+        response = self.client.get(reverse('authors'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertContains(response, 'Surname 0')
+
+    def test_gzip_refused_with_zero_quality(self):
+        response = self.client.get(reverse('authors'), HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @override_settings(COMPRESSION_MIN_SIZE=100000)
+    def test_small_response_not_compressed(self):
+        response = self.client.get(reverse('authors'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_content_type_allowlist(self):
+        response = HttpResponse(b'x' * 1000, content_type='image/png')
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        response = CompressionMiddleware(lambda request: response)(request)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @unittest.skipIf(brotli is None, 'brotli is not installed')
+    def test_brotli_preferred_when_available(self):
+        response = self.client.get(reverse('authors'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+
+class ServeStaticTest(TestCase):
+    def setUp(self):
+        self.static_root = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.static_root.name, 'css'))
+        for name in ('styles.css', 'styles.0123456789ab.css'):
+            with open(os.path.join(self.static_root.name, 'css', name), 'w') as f:
+                f.write('body {}')
+
+    def tearDown(self):
+        self.static_root.cleanup()
+
+    def test_fingerprinted_file_is_immutable(self):
+        with self.settings(STATIC_ROOT=self.static_root.name):
+            response = self.client.get('/static/css/styles.0123456789ab.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+    def test_plain_file_must_revalidate(self):
+        with self.settings(STATIC_ROOT=self.static_root.name):
+            response = self.client.get('/static/css/styles.css')
+        self.assertIn('no-cache', response['Cache-Control'])
+
+@override_settings(
+    RATE_LIMIT_ENABLED=True,
+    RATE_LIMITS={'authors': {'rate': 1, 'burst': 3}},
+    CONCURRENCY_LIMITS={},
+)
+class RateLimitMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_burst_then_429_with_retry_after(self):
+        for _ in range(3):
+            response = self.client.get(reverse('authors'))
+            self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('authors'))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_buckets_are_per_ip(self):
+        for _ in range(3):
+            self.client.get(reverse('authors'))
+        response = self.client.get(reverse('authors'), REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 200)
+
+    def test_buckets_are_per_url_name(self):
+        for _ in range(4):
+            self.client.get(reverse('authors'))
+        response = self.client.get(reverse('books'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_bucket_refills(self):
+        now = time.time()
+        for _ in range(3):
+            self.assertTrue(take_token(cache, 'bucket', 1, 3, now)[0])
+        allowed, retry_after = take_token(cache, 'bucket', 1, 3, now)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(retry_after, 1)
+        self.assertTrue(take_token(cache, 'bucket', 1, 3, now + 1)[0])
+
+    @override_settings(RATE_LIMITS={}, CONCURRENCY_LIMITS={'authors': 2})
+    def test_concurrency_cap_returns_503(self):
+        cache.set_many({'catalog:concurrency:authors:0': 'a',
+                        'catalog:concurrency:authors:1': 'b'}, 60)
+        response = self.client.get(reverse('authors'))
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(response.has_header('Retry-After'))
+        # The rejected request took no slot from the others
+        self.assertEqual(cache.get_many(['catalog:concurrency:authors:0',
+                                         'catalog:concurrency:authors:1']),
+                         {'catalog:concurrency:authors:0': 'a',
+                          'catalog:concurrency:authors:1': 'b'})
+
+    @override_settings(RATE_LIMITS={}, CONCURRENCY_LIMITS={'authors': 2})
+    def test_concurrency_slot_released_after_response(self):
+        response = self.client.get(reverse('authors'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(cache.get('catalog:concurrency:authors:0'))
+
+    def test_expired_lease_not_released_for_another(self):
+        slot, lease = take_slot(cache, 'slots', 1, 60)
+        # The lease expired mid-request and another request took the slot
+        cache.delete(slot)
+        self.assertIsNotNone(take_slot(cache, 'slots', 1, 60))
+        release_slot(cache, slot, lease)
+        self.assertIsNone(take_slot(cache, 'slots', 1, 60))
+
+class RateLimitCacheCheckTest(SimpleTestCase):
+    def test_per_process_cache(self):
+        with self.settings(RATE_LIMIT_ENABLED=True):
+            errors = check_rate_limit_cache(None)
+        self.assertEqual([error.id for error in errors], ['catalog.E002'])
+
+    def test_shared_cache(self):
+        caches = {'default': {'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache'}}
+        with self.settings(RATE_LIMIT_ENABLED=True, CACHES=caches):
+            self.assertEqual(check_rate_limit_cache(None), [])
+
+    def test_disabled(self):
+        with self.settings(RATE_LIMIT_ENABLED=False):
+            self.assertEqual(check_rate_limit_cache(None), [])
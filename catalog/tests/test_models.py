@@ -1,6 +1,6 @@
 from django.test import TestCase
 
-from catalog.models import Author
+from catalog.models import Author, ConcurrentUpdateError
 
 # Create your tests here.
 class AuthorModelTest(TestCase):
@@ -32,3 +32,23 @@ class AuthorModelTest(TestCase):
     def test_get_absolute_url(self):
         author = Author.objects.get(id=1)
         self.assertEqual(author.get_absolute_url(), '/catalog/authors/1')
+
+    def test_save_changed_bumps_version(self):
+        author = Author.objects.get(id=1)
+        author.last_name = 'Robert'
+        author.save_changed(['last_name'])
+        author.refresh_from_db()
+        self.assertEqual(author.last_name, 'Robert')
+        self.assertEqual(author.version, 1)
+
+    def test_save_changed_with_stale_version_raises(self):
+        author = Author.objects.get(id=1)
+        stale = Author.objects.get(id=1)
+        author.first_name = 'Little'
+        author.save_changed(['first_name'])
+
+        stale.last_name = 'Robert'
+        with self.assertRaises(ConcurrentUpdateError):
+            stale.save_changed(['last_name'])
+        author.refresh_from_db()
+        self.assertEqual(author.last_name, 'Bob')
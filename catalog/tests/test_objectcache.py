@@ -0,0 +1,116 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import facets, objectcache
+from catalog.forms import BookForm
+from catalog.models import Author, Book, Genre, Language
+
+class ObjectCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        objectcache.local_cache.clear()
+        objectcache.reset_stats()
+        self.author = Author.objects.create(first_name='Big', last_name='Bob')
+        self.language = Language.objects.create(name='English')
+        self.book = Book.objects.create(title='Book Title', summary='Summary',
+                                        isbn='ABCDEFG', author=self.author,
+                                        language=self.language)
+
+    def test_pk_lookup_read_through(self):
+        with self.assertNumQueries(1):
+            Author.objects.get_cached(self.author.pk)
+        with self.assertNumQueries(0):
+            author = Author.objects.get_cached(str(self.author.pk))
+        self.assertEqual(author.last_name, 'Bob')
+
+    def test_shared_level_serves_after_local_expiry(self):
+        Author.objects.get_cached(self.author.pk)
+        objectcache.local_cache.clear()
+        with self.assertNumQueries(0):
+            Author.objects.get_cached(self.author.pk)
+        self.assertEqual(objectcache.stats()['catalog.Author'],
+                         {'local': 0, 'shared': 1, 'miss': 1, 'hit_rate': 0.5})
+
+    def test_callers_get_their_own_copy(self):
+        Author.objects.get_cached(self.author.pk).last_name = 'Changed'
+        self.assertEqual(Author.objects.get_cached(self.author.pk).last_name, 'Bob')
+
+    def test_missing_object_raises(self):
+        with self.assertRaises(Author.DoesNotExist):
+            Author.objects.get_cached(self.author.pk + 100)
+
+    def test_save_invalidates(self):
+        Author.objects.get_cached(self.author.pk)
+        self.author.last_name = 'Smith'
+        self.author.save()
+        self.assertEqual(Author.objects.get_cached(self.author.pk).last_name, 'Smith')
+
+    def test_save_changed_invalidates(self):
+        Author.objects.get_cached(self.author.pk)
+        self.author.last_name = 'Smith'
+        self.author.save_changed(['last_name'])
+        self.assertEqual(Author.objects.get_cached(self.author.pk).last_name, 'Smith')
+
+    def test_delete_invalidates(self):
+        Author.objects.get_cached(self.author.pk)
+        pk = self.author.pk
+        self.author.delete()
+        with self.assertRaises(Author.DoesNotExist):
+            Author.objects.get_cached(pk)
+
+    def test_whole_table_read(self):
+        Genre.objects.create(name='Fantasy')
+        with self.assertNumQueries(1):
+            Genre.objects.all_cached()
+        with self.assertNumQueries(0):
+            genres = Genre.objects.all_cached()
+        self.assertEqual([genre.name for genre in genres], ['Fantasy'])
+
+        Genre.objects.create(name='Poetry')
+        self.assertEqual(len(Genre.objects.all_cached()), 2)
+
+    def test_large_table_not_cached(self):
+        Genre.objects.create(name='Fantasy')
+        Genre.objects.create(name='Poetry')
+        with self.settings(OBJECT_CACHE_MAX_ROWS=1):
+            self.assertEqual(len(Genre.objects.all_cached()), 2)
+            with self.assertNumQueries(2):
+                Genre.objects.all_cached()
+
+    def test_m2m_change_invalidates_both_ends(self):
+        genre = Genre.objects.create(name='Fantasy')
+        Book.objects.get_cached(self.book.pk)
+        Genre.objects.all_cached()
+        self.book.genre.add(genre)
+        with self.assertNumQueries(2):
+            Book.objects.get_cached(self.book.pk)
+            Genre.objects.all_cached()
+
+    def test_detail_views_use_cache(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        self.client.get(url)
+        objectcache.reset_stats()
+        cache.clear()  # drops the cached page; the local level is kept
+        self.client.get(url)
+        stats = objectcache.stats()
+        self.assertEqual(stats['catalog.Book']['local'], 1)
+        self.assertEqual(stats['catalog.Author']['local'], 1)
+        self.assertEqual(stats['catalog.Language']['local'], 1)
+
+    def test_detail_view_404(self):
+        response = self.client.get(reverse('author-detail', args=[self.author.pk + 100]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_facet_labels_read_through(self):
+        Language.objects.all_cached()
+        labels = facets.build_index()['labels']
+        self.assertEqual(labels['language'], {self.language.pk: 'English'})
+        self.assertEqual(objectcache.stats()['catalog.Language']['local'], 1)
+
+    def test_selected_form_options_read_through(self):
+        widget = BookForm().fields['language'].widget
+        widget.optgroups('language', [self.language.pk])
+        with self.assertNumQueries(0):
+            [(_, options, _)] = widget.optgroups('language', [str(self.language.pk)])
+        self.assertEqual([option['label'] for option in options], ['English'])
@@ -0,0 +1,100 @@
+import io
+import unittest
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import archive
+from catalog.models import Author, Book, BookInstance, BookRecommendation, LoanEvent
+
+try:
+    import scipy
+except ImportError:
+    scipy = None
+
+@unittest.skipIf(scipy is None, 'build_recommendations needs numpy and scipy')
+class BuildRecommendationsTest(TestCase):
+    def setUp(self):
+        test_author = Author.objects.create(first_name='John', last_name='Smith')
+        self.books = [
+            Book.objects.create(title=f'Book {i}', summary='Summary.',
+                                isbn=str(i), author=test_author)
+            for i in range(4)
+        ]
+        self.users = [
+            User.objects.create_user(username=f'reader{i}', password='1X<ISRUkw+tuK')
+            for i in range(3)
+        ]
+        # reader0: books 0, 1   reader1: books 0, 1, 2   reader2: books 2, 3
+        self.borrow(0, 0)
+        self.borrow(0, 1)
+        self.borrow(1, 0)
+        self.borrow(1, 1)
+        self.borrow(1, 2)
+        self.borrow(2, 2)
+        self.borrow(2, 3)
+
+    def borrow(self, user, book):
+        BookInstance.objects.create(book=self.books[book], imprint='Imprint',
+                status='o', borrower=self.users[user])
+
+    def build(self, *args):
+        call_command('build_recommendations', *args, stdout=io.StringIO())
+
+    def recommended(self, book):
+        return [r.recommended for r in BookRecommendation.objects
+                .filter(book=book).select_related('recommended')]
+
+    def test_most_co_borrowed_book_ranks_first(self):
+        self.build('--chunk-size=2')
+        self.assertEqual(self.recommended(self.books[0]), [self.books[1], self.books[2]])
+        self.assertEqual(self.recommended(self.books[3]), [self.books[2]])
+        self.assertNotIn(self.books[2], self.recommended(self.books[2]))
+
+    def test_top_k(self):
+        self.build('--top-k=1')
+        self.assertEqual(BookRecommendation.objects.filter(book=self.books[2]).count(), 1)
+
+    def scores(self):
+        return sorted(BookRecommendation.objects
+                      .values_list('book', 'recommended', 'rank', 'score'))
+
+    def test_incremental_refreshes_affected_books_only(self):
+        # reader3 borrows books 4 and 5, which no one else reads
+        self.books += [
+            Book.objects.create(title=f'Book {i}', summary='Summary.',
+                                isbn=str(i), author=self.books[0].author)
+            for i in (4, 5)
+        ]
+        self.users.append(User.objects.create_user(username='reader3',
+                                                   password='1X<ISRUkw+tuK'))
+        self.borrow(3, 4)
+        self.borrow(3, 5)
+        self.build()
+        untouched = list(BookRecommendation.objects.filter(book=self.books[4])
+                         .values_list('pk', flat=True))
+
+        # reader2 now also borrows book 1, which changes the scores of
+        # book 0 too, since it shares readers with book 1
+        self.borrow(2, 1)
+        self.build('--incremental')
+        incremental = self.scores()
+        self.assertEqual(list(BookRecommendation.objects.filter(book=self.books[4])
+                              .values_list('pk', flat=True)), untouched)
+
+        self.build()
+        self.assertEqual(incremental, self.scores())
+
+    def test_archived_loans_count(self):
+        archive.move_events(LoanEvent.objects.filter(borrower=self.users[2]))
+        self.build()
+        self.assertEqual(self.recommended(self.books[3]), [self.books[2]])
+
+    def test_detail_view_shows_recommendations(self):
+        self.build()
+        response = self.client.get(reverse('book-detail', args=[self.books[0].pk]))
+        self.assertContains(response, 'Readers also borrowed')
+        self.assertEqual(list(r.recommended for r in response.context['recommendations']),
+                         [self.books[1], self.books[2]])
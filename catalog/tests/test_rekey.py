@@ -0,0 +1,94 @@
+import datetime
+from io import StringIO
+import uuid
+
+from django.contrib.auth.models import Permission, User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog import archive
+from catalog.models import ArchivedLoanEvent, Book, BookInstance, LoanEvent, uuid7
+
+class Uuid7Test(TestCase):
+    def test_version_and_variant(self):
+        value = uuid7()
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, uuid.RFC_4122)
+
+    def test_ids_are_ordered(self):
+        ids = [uuid7() for _ in range(5000)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_new_copies_get_time_ordered_ids(self):
+        copy = BookInstance.objects.create(imprint='Imprint')
+        self.assertEqual(copy.id.version, 7)
+
+
+class RekeyCopiesTest(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title='Book Title', summary='Summary',
+                                        isbn='ABCDEFG')
+        self.old_ids = [uuid.uuid4() for _ in range(3)]
+        for old_id in self.old_ids:
+            BookInstance.objects.create(id=old_id, book=self.book,
+                                        imprint='Imprint', status='a')
+        self.copy = BookInstance.objects.get(pk=self.old_ids[0])
+        self.copy.status = 'o'
+        self.copy.due_back = datetime.date.today() + datetime.timedelta(weeks=1)
+        self.copy.save()
+
+    def test_copies_rekeyed_with_legacy_id(self):
+        call_command('rekey_copies', batch_size=2, stdout=StringIO())
+        copies = BookInstance.objects.order_by('legacy_id')
+        self.assertEqual(sorted(copy.legacy_id for copy in copies), sorted(self.old_ids))
+        self.assertTrue(all(copy.id.version == 7 for copy in copies))
+        self.assertFalse(BookInstance.objects.filter(pk__in=self.old_ids).exists())
+
+    def test_references_follow_new_id(self):
+        call_command('rekey_copies', stdout=StringIO())
+        copy = BookInstance.objects.get(legacy_id=self.old_ids[0])
+        event = LoanEvent.objects.get()
+        self.assertEqual(event.book_instance_id, copy.id)
+
+    def test_archived_history_follows_new_id(self):
+        LoanEvent.objects.update(created=timezone.now() - datetime.timedelta(days=1000))
+        archive.archive_loan_events()
+        call_command('rekey_copies', stdout=StringIO())
+        copy = BookInstance.objects.get(legacy_id=self.old_ids[0])
+        copy.status = 'm'
+        copy.due_back = None
+        copy.save()
+        with self.settings(ARCHIVE_COPY_IDLE_DAYS=0):
+            archive.archive_copies()
+        self.assertEqual(archive.restore([copy.pk]), (1, 2))
+        self.assertEqual(LoanEvent.objects.filter(book_instance=copy).count(), 2)
+
+    def test_history_archived_under_old_id_restored(self):
+        call_command('rekey_copies', stdout=StringIO())
+        copy = BookInstance.objects.get(legacy_id=self.old_ids[0])
+        # Archived by a run of rekey_copies that didn't repoint it
+        archive.move_events(LoanEvent.objects.all())
+        ArchivedLoanEvent.objects.update(book_instance_id=copy.legacy_id)
+        self.assertEqual(archive.restore([copy.pk]), (0, 1))
+        self.assertEqual(LoanEvent.objects.get().book_instance_id, copy.pk)
+
+    def test_rerun_leaves_rekeyed_copies_alone(self):
+        call_command('rekey_copies', stdout=StringIO())
+        ids = set(BookInstance.objects.values_list('pk', flat=True))
+        call_command('rekey_copies', stdout=StringIO())
+        self.assertEqual(set(BookInstance.objects.values_list('pk', flat=True)), ids)
+
+    def test_old_renew_url_redirects(self):
+        user = User.objects.create_user(username='librarian', password='2HJ1vRV0Z&3iD')
+        user.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        self.client.login(username='librarian', password='2HJ1vRV0Z&3iD')
+        call_command('rekey_copies', stdout=StringIO())
+        copy = BookInstance.objects.get(legacy_id=self.old_ids[0])
+
+        response = self.client.get(reverse('renew-book-librarian', args=[self.old_ids[0]]))
+        self.assertRedirects(response,
+                             reverse('renew-book-librarian', args=[copy.id]),
+                             status_code=301)
@@ -0,0 +1,118 @@
+import datetime
+from io import StringIO
+
+from django.contrib.auth import SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.checks import check_session_cache
+from catalog.sessions import SessionStore, purge_expired
+
+class SessionStoreTest(TestCase):
+    def setUp(self):
+        self.session = SessionStore()
+        self.session['num_visits'] = 1
+        self.session.save()
+
+    def stored(self):
+        """The session data as written to the database."""
+        row = Session.objects.get(pk=self.session.session_key)
+        return self.session.decode(row.session_data)
+
+    def reload(self):
+        return SessionStore(self.session.session_key)
+
+    def test_new_session_written(self):
+        self.assertEqual(self.stored(), {'num_visits': 1})
+
+    def test_changes_held_in_cache(self):
+        session = self.reload()
+        session['num_visits'] = 2
+        with self.assertNumQueries(0):
+            session.save()
+        self.assertEqual(self.stored(), {'num_visits': 1})
+        self.assertEqual(self.reload()['num_visits'], 2)
+
+    def test_written_through_after_interval(self):
+        session = self.reload()
+        session['num_visits'] = 2
+        with self.settings(SESSION_DB_WRITE_INTERVAL=0):
+            session.save()
+        self.assertEqual(self.stored(), {'num_visits': 2})
+
+    def test_pending_changes_saved_on_next_load(self):
+        session = self.reload()
+        session['num_visits'] = 2
+        session.save()
+        with self.settings(SESSION_DB_WRITE_INTERVAL=0):
+            session = self.reload()
+            session.load()
+            self.assertTrue(session.modified)
+
+    def test_login_written_through(self):
+        user = User.objects.create_user('reader', password='secret')
+        session = self.reload()
+        session[SESSION_KEY] = str(user.pk)
+        session.save()
+        self.assertEqual(self.stored()[SESSION_KEY], str(user.pk))
+
+    def test_falls_back_to_database(self):
+        cache.clear()
+        self.assertEqual(self.reload()['num_visits'], 1)
+
+    def test_delete(self):
+        key = self.session.session_key
+        self.session.delete()
+        self.assertFalse(Session.objects.filter(pk=key).exists())
+        self.assertEqual(dict(SessionStore(key).items()), {})
+
+    @override_settings(SESSION_ENGINE='catalog.sessions')
+    def test_index_visits(self):
+        for _ in range(3):
+            self.client.get(reverse('index'))
+        session = self.client.session
+        self.assertEqual(session['num_visits'], 3)
+        row = Session.objects.get(pk=session.session_key)
+        self.assertEqual(session.decode(row.session_data), {'num_visits': 1})
+
+class PurgeExpiredTest(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        for i, age in enumerate([-1, 0, 1, 2, 3, 3600]):
+            Session.objects.create(session_key=f'key{i}', session_data='',
+                                   expire_date=now - datetime.timedelta(seconds=age))
+
+    def test_batches(self):
+        with self.settings(SESSION_DB_WRITE_INTERVAL=0):
+            self.assertEqual(purge_expired(batch_size=2, pause=0), 5)
+        self.assertEqual(list(Session.objects.values_list('pk', flat=True)), ['key0'])
+
+    def test_grace_for_pending_writes(self):
+        with self.settings(SESSION_DB_WRITE_INTERVAL=60):
+            self.assertEqual(purge_expired(pause=0), 1)
+        self.assertFalse(Session.objects.filter(pk='key5').exists())
+
+    def test_command(self):
+        out = StringIO()
+        with self.settings(SESSION_DB_WRITE_INTERVAL=0):
+            call_command('purge_sessions', pause=0, stdout=out)
+        self.assertIn('Deleted 5 expired sessions', out.getvalue())
+
+class SessionCacheCheckTest(SimpleTestCase):
+    def test_per_process_cache(self):
+        with self.settings(SESSION_ENGINE='catalog.sessions'):
+            errors = check_session_cache(None)
+        self.assertEqual([error.id for error in errors], ['catalog.E001'])
+
+    def test_shared_cache(self):
+        caches = {'default': {'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache'}}
+        with self.settings(SESSION_ENGINE='catalog.sessions', CACHES=caches):
+            self.assertEqual(check_session_cache(None), [])
+
+    def test_database_engine(self):
+        self.assertEqual(check_session_cache(None), [])
@@ -0,0 +1,84 @@
+import os
+import tempfile
+from xml.etree import ElementTree
+
+from django.test import TestCase
+
+from catalog import sitemaps
+from catalog.models import Author, Book
+
+NS = {'s': sitemaps.SITEMAP_NS}
+
+class SitemapTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.override = self.settings(SITEMAP_ROOT=self.root.name,
+                                      SITEMAP_BASE_URL='https://library.example')
+        self.override.enable()
+        self.authors = [Author.objects.create(first_name=f'First {i}', last_name='Last')
+                        for i in range(3)]
+        self.books = [Book.objects.create(title=f'Title {i}', summary='Summary',
+                                          isbn=f'ISBN{i}')
+                      for i in range(5)]
+
+    def tearDown(self):
+        self.override.disable()
+        self.root.cleanup()
+
+    def locs(self, name):
+        tree = ElementTree.parse(os.path.join(self.root.name, name))
+        return [loc.text for loc in tree.iterfind('.//s:loc', NS)]
+
+    def shard(self, model, pk):
+        return sitemaps.shard_name(
+            'books' if model is Book else 'authors', (pk - 1) // 2)
+
+    def test_shards_and_index(self):
+        written, total = sitemaps.build(shard_size=2)
+        shard_names = {self.shard(Book, book.pk) for book in self.books} | \
+            {self.shard(Author, author.pk) for author in self.authors}
+        self.assertEqual((written, total), (len(shard_names), len(shard_names)))
+
+        index = self.locs('sitemap.xml')
+        self.assertEqual(sorted(index), sorted(
+            f'https://library.example/{name}' for name in shard_names))
+        book_urls = [url for name in shard_names if 'books' in name
+                     for url in self.locs(name)]
+        self.assertEqual(sorted(book_urls), sorted(
+            'https://library.example' + book.get_absolute_url() for book in self.books))
+        for name in shard_names:
+            self.assertLessEqual(len(self.locs(name)), 2)
+
+    def test_incremental_rebuild(self):
+        sitemaps.build(shard_size=2)
+        self.assertEqual(sitemaps.build(shard_size=2)[0], 0)
+
+        book = self.books[0]
+        book.title = 'Changed'
+        book.save()
+        self.assertEqual(sitemaps.build(shard_size=2)[0], 1)
+
+        written, total = sitemaps.build(shard_size=2, full=True)
+        self.assertEqual(written, total)
+
+    def test_emptied_shard_removed(self):
+        sitemaps.build(shard_size=2)
+        name = self.shard(Author, self.authors[2].pk)
+        others = [author for author in self.authors
+                  if self.shard(Author, author.pk) == name]
+        for author in others:
+            author.delete()
+        sitemaps.build(shard_size=2)
+        self.assertFalse(os.path.exists(os.path.join(self.root.name, name)))
+        self.assertNotIn(f'https://library.example/{name}', self.locs('sitemap.xml'))
+
+    def test_served(self):
+        sitemaps.build(shard_size=2)
+        response = self.client.get('/sitemap.xml')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/xml')
+        name = self.shard(Book, self.books[0].pk)
+        response = self.client.get(f'/{name}')
+        self.assertIn(self.books[0].get_absolute_url(),
+                      b''.join(response.streaming_content).decode())
+        self.assertEqual(self.client.get('/sitemap-books-999.xml').status_code, 404)
@@ -0,0 +1,80 @@
+import tempfile
+from io import StringIO
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import CommandError, call_command
+from django.template import engines
+from django.test import SimpleTestCase, TestCase
+
+from catalog import startup, warmup
+from catalog.models import Book
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     django.contrib.admin.sites
+import time:       300 |        420 |   django.contrib.admin
+import time:        80 |         80 |   django.db.models.fields
+import time:        50 |        550 | catalog.admin
+"""
+
+class StartupProfileTest(SimpleTestCase):
+    def test_parse_importtime(self):
+        self.assertEqual(startup.parse_importtime(IMPORTTIME), [
+            ('django.contrib.admin.sites', 120, 120),
+            ('django.contrib.admin', 300, 420),
+            ('django.db.models.fields', 80, 80),
+            ('catalog.admin', 50, 550),
+        ])
+
+    def test_by_package(self):
+        imports = startup.parse_importtime(IMPORTTIME)
+        self.assertEqual(startup.by_package(imports), [
+            ('django.contrib.admin', 420), ('django.db', 80), ('catalog', 50)])
+
+    def test_regressions(self):
+        baseline = {'setup': 0.2, 'urlconf': 0.002, 'total': 0.5}
+        summary = {'setup': 0.3, 'urlconf': 0.004, 'total': 0.55, 'warm_up': 1}
+        # urlconf doubled but by less than the noise floor; warm_up is new
+        self.assertEqual(startup.regressions(summary, baseline, 0.2),
+                         {'setup': (0.2, 0.3)})
+
+    def test_worker_startup(self):
+        timings = startup.profile(startup.entry_point_module())
+        self.assertEqual(set(timings['phases']),
+                         {'setup', 'urlconf', 'entry_point', 'total'})
+        self.assertIn('catalog', timings['ready'])
+        self.assertIn('locallibrary.wsgi', timings['modules'])
+        # Only needed by management commands
+        self.assertNotIn('faker', timings['modules'])
+
+    def test_command_baseline(self):
+        out = StringIO()
+        baseline = tempfile.NamedTemporaryFile('w', suffix='.json')
+        self.addCleanup(baseline.close)
+        baseline.write('{"setup": 0.001, "total": 0.001}')
+        baseline.flush()
+        with self.assertRaisesMessage(CommandError, 'Startup regressed: setup'):
+            call_command('startup_profile', repeat=1, baseline=baseline.name,
+                         stdout=out)
+        self.assertIn('AppConfig.ready', out.getvalue())
+
+class WarmUpTest(TestCase):
+    def test_warm_up(self):
+        ContentType.objects.clear_cache()
+        timings = warmup.warm_up()
+        self.assertEqual(set(timings),
+                         {'load_urls', 'load_templates', 'load_content_types'})
+        with self.assertNumQueries(0):
+            ContentType.objects.get_for_model(Book)
+
+    def test_templates_cached(self):
+        warmup.warm_up()
+        loader = engines['django'].engine.template_loaders[0]
+        self.assertIn('catalog/book_list.html', loader.get_template_cache)
+
+    def test_disabled(self):
+        ContentType.objects.clear_cache()
+        with self.settings(WARM_UP_ON_STARTUP=False):
+            warmup.warm_up_on_startup()
+        with self.assertNumQueries(1):
+            ContentType.objects.get_for_model(Book)
@@ -0,0 +1,119 @@
+import datetime
+import io
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.models import Author, Task
+from catalog.tasks import claim_tasks, enqueue, retry_delay, run_task, task_name
+
+def create_author(first_name, last_name):
+    Author.objects.create(first_name=first_name, last_name=last_name)
+
+def always_fails():
+    raise RuntimeError('boom')
+
+ran = []
+
+def record_run(i):
+    ran.append(i)
+
+class TaskQueueTest(TestCase):
+    def test_enqueue_stores_dotted_path(self):
+        task = enqueue(create_author, 'Big', last_name='Bob')
+        self.assertEqual(task.name, 'catalog.tests.test_tasks.create_author')
+        self.assertEqual(task.status, 'q')
+
+    def test_claim_and_run(self):
+        enqueue(create_author, 'Big', last_name='Bob')
+        tasks = claim_tasks()
+        self.assertEqual(len(tasks), 1)
+        self.assertEqual(tasks[0].status, 'r')
+        self.assertEqual(tasks[0].attempts, 1)
+
+        self.assertTrue(run_task(tasks[0]))
+        self.assertEqual(Task.objects.get().status, 'd')
+        self.assertTrue(Author.objects.filter(last_name='Bob').exists())
+
+    def test_claimed_task_is_invisible_to_other_workers(self):
+        enqueue(create_author, 'Big', last_name='Bob')
+        self.assertEqual(len(claim_tasks()), 1)
+        self.assertEqual(claim_tasks(), [])
+
+    def test_expired_claim_is_reclaimed(self):
+        enqueue(create_author, 'Big', last_name='Bob')
+        claim_tasks(visibility_timeout=60)
+        Task.objects.update(locked_until=timezone.now() - datetime.timedelta(seconds=1))
+        tasks = claim_tasks()
+        self.assertEqual(len(tasks), 1)
+        self.assertEqual(tasks[0].attempts, 2)
+
+    def test_expired_last_attempt_fails(self):
+        enqueue(create_author, 'Big', last_name='Bob', max_attempts=1)
+        claim_tasks(visibility_timeout=60)
+        Task.objects.update(locked_until=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(claim_tasks(), [])
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), ('f', 1))
+
+    def test_reclaimed_task_outcome_kept(self):
+        enqueue(always_fails)
+        [stale] = claim_tasks(visibility_timeout=60)
+        Task.objects.update(locked_until=timezone.now() - datetime.timedelta(seconds=1))
+        [current] = claim_tasks()
+        Task.objects.filter(pk=current.pk).update(name=task_name(create_author),
+                                                  args=['Big', 'Bob'])
+        self.assertTrue(run_task(Task.objects.get()))
+        with self.assertLogs('catalog.tasks', 'WARNING') as logs:
+            self.assertFalse(run_task(stale))
+        self.assertIn('reclaimed', logs.output[-1])
+        self.assertEqual(Task.objects.get().status, 'd')
+
+    def test_delayed_task_not_claimed(self):
+        enqueue(create_author, 'Big', last_name='Bob', delay=60)
+        self.assertEqual(claim_tasks(), [])
+
+    def test_failure_is_retried_with_backoff(self):
+        enqueue(always_fails, max_attempts=2)
+        before = timezone.now()
+        with self.assertLogs('catalog.tasks'):
+            self.assertFalse(run_task(claim_tasks()[0]))
+        task = Task.objects.get()
+        self.assertEqual(task.status, 'q')
+        self.assertIn('boom', task.last_error)
+        self.assertGreaterEqual(task.run_at,
+                before + datetime.timedelta(seconds=retry_delay(1)))
+
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs('catalog.tasks'):
+            self.assertFalse(run_task(claim_tasks()[0]))
+        self.assertEqual(Task.objects.get().status, 'f')
+
+    def test_password_reset_email_is_queued(self):
+        User.objects.create_user(username='testuser1',
+                email='testuser1@example.com', password='1X<ISRUkw+tuK')
+        response = self.client.post(reverse('password_reset'),
+                {'email': 'testuser1@example.com'})
+        self.assertRedirects(response, reverse('password_reset_done'))
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertTrue(run_task(claim_tasks()[0]))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['testuser1@example.com'])
+
+class RunWorkersCommandTest(TransactionTestCase):
+    def test_run_workers_drains_queue(self):
+        # The in-memory test database fails rather than waits when two
+        # threads write in transactions at once, so the tasks only record
+        # that they ran
+        ran.clear()
+        for i in range(5):
+            enqueue(record_run, i)
+        call_command('run_workers', '--once', '--workers=2', '--batch-size=2',
+                     stdout=io.StringIO())
+        self.assertEqual(Task.objects.filter(status='d').count(), 5)
+        self.assertEqual(sorted(ran), list(range(5)))
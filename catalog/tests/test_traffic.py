@@ -0,0 +1,134 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import resolve, reverse
+
+from catalog import traffic
+from catalog.models import Author, Book
+
+class TrafficLogTestMixin:
+    def setUp(self):
+        cache.clear()
+        self.root = tempfile.TemporaryDirectory()
+        self.log = os.path.join(self.root.name, 'traffic.jsonl')
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def write_log(self, entries):
+        for entry in entries:
+            traffic.write(self.log, entry)
+
+class CaptureTest(TrafficLogTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.override = self.settings(TRAFFIC_LOG=self.log, TRAFFIC_SAMPLE_RATE=1)
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        super().tearDown()
+
+    def test_anonymized_entry(self):
+        self.client.get(reverse('books'), {'page': '1', 'q': 'Jane Doe'})
+        [entry] = traffic.read(self.log)
+        self.assertEqual(entry['view'], 'books')
+        self.assertEqual(entry['method'], 'GET')
+        self.assertEqual(entry['params'], {'page': ['1'], 'q': [traffic.REDACTED]})
+        self.assertEqual(entry['role'], 'anonymous')
+        self.assertEqual(entry['status'], 200)
+        self.assertGreater(entry['queries'], 0)
+        self.assertNotIn('Jane', json.dumps(entry))
+
+    def test_route_arguments(self):
+        author = Author.objects.create(first_name='Jane', last_name='Austen')
+        book = Book.objects.create(title='Emma', summary='-', isbn='1', author=author)
+        self.client.get(book.get_absolute_url())
+        [entry] = traffic.read(self.log)
+        self.assertEqual((entry['view'], entry['kwargs']), ('book-detail', {'pk': book.pk}))
+
+    def test_roles(self):
+        user = User.objects.create_user('librarian', password='secret')
+        user.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        self.client.login(username='librarian', password='secret')
+        self.client.get(reverse('all-borrowed'))
+        self.assertEqual([entry['role'] for entry in traffic.read(self.log)],
+                         ['librarian'])
+
+    def test_page_cache_hits_logged(self):
+        self.client.get(reverse('books'))
+        response = self.client.get(reverse('books'))
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertEqual([entry['view'] for entry in traffic.read(self.log)],
+                         ['books', 'books'])
+
+    def test_excluded_routes_not_logged(self):
+        self.client.get(reverse('metrics'))
+        self.client.get(reverse('password_reset_confirm',
+                                kwargs={'uidb64': 'MQ', 'token': 'set-password'}))
+        self.client.get(reverse('login'))
+        self.client.get(reverse('admin:auth_user_change', args=[1]))
+        self.assertFalse(os.path.exists(self.log))
+
+    def test_route_arguments_redacted(self):
+        match = resolve(reverse('sitemap-shard', args=['sitemap-books-1.xml']))
+        self.assertEqual(traffic.route_arguments(match),
+                         ([], {'name': 'sitemap-books-1.xml'}))
+        with self.settings(TRAFFIC_KWARGS={}):
+            self.assertEqual(traffic.route_arguments(match),
+                             ([], {'name': traffic.REDACTED}))
+
+    def test_sampling(self):
+        with self.settings(TRAFFIC_SAMPLE_RATE=0):
+            self.client.get(reverse('books'))
+        self.assertFalse(os.path.exists(self.log))
+
+class SummaryTest(SimpleTestCase):
+    def test_summarize(self):
+        results = [('books', 200, latency / 100, 3) for latency in range(1, 21)]
+        results.append(('authors', 500, 0.5, 1))
+        self.assertEqual(traffic.summarize(results), {
+            'authors': {'count': 1, 'errors': 1, 'p50': 0.5, 'p95': 0.5, 'queries': 1},
+            'books': {'count': 20, 'errors': 0, 'p50': 0.1, 'p95': 0.19, 'queries': 3},
+        })
+
+class ReplayCommandTest(TrafficLogTestMixin, TransactionTestCase):
+    def test_replay_and_compare(self):
+        author = Author.objects.create(first_name='Jane', last_name='Austen')
+        book = Book.objects.create(title='Emma', summary='-', isbn='1', author=author)
+        entry = {'time': 0, 'method': 'GET', 'args': [], 'kwargs': {}, 'params': {},
+                 'role': 'anonymous', 'status': 200, 'latency': 0.01, 'queries': 5}
+        self.write_log([
+            dict(entry, time=0, view='books', params={'page': ['1']}),
+            dict(entry, time=0.01, view='book-detail', kwargs={'pk': book.pk},
+                 role='patron'),
+            dict(entry, time=0.02, view='all-borrowed', role='librarian'),
+            dict(entry, time=0.03, view='renew-book-librarian', method='POST',
+                 kwargs={'pk': '0'}),
+            dict(entry, time=0.04, view='removed-view'),
+            dict(entry, time=0.05, view='author-update', role='librarian',
+                 kwargs={'pk': traffic.REDACTED}),
+        ])
+        saved = os.path.join(self.root.name, 'results.json')
+        out = StringIO()
+        call_command('replay_traffic', self.log, workers=2, speed=0, save=saved,
+                     stdout=out)
+        output = out.getvalue()
+        self.assertIn('Replayed 3 requests', output)
+        self.assertIn('Skipped 1: POST requests', output)
+        self.assertIn('Skipped 1: no route removed-view', output)
+        self.assertIn('Skipped 1: redacted arguments of author-update', output)
+        with open(saved) as f:
+            results = json.load(f)
+        self.assertEqual(set(results), {'books', 'book-detail', 'all-borrowed'})
+        self.assertEqual(results['all-borrowed']['errors'], 0)
+
+        out = StringIO()
+        call_command('replay_traffic', self.log, speed=0, compare=saved, stdout=out)
+        self.assertIn('p50 saved', out.getvalue())
@@ -1,4 +1,5 @@
 import datetime
+from unittest import mock
 import uuid
 
 from django.contrib.auth.models import User # required to assign User as a borrower
@@ -290,6 +291,18 @@ class RenewBookInstancesViewTest(TestCase):
                         {'renewal_date': valid_date_in_future})
         self.assertRedirects(response, reverse('all-borrowed'))
 
+    def test_renewal_rolled_back_without_loan_event(self):
+        login = self.client.login(username='testuser2',password='2HJ1vRV0Z&3iD')
+        due_back = self.test_bookinstance1.due_back
+        valid_date_in_future = datetime.date.today()+datetime.timedelta(weeks=2)
+        with mock.patch('catalog.views.record_loan_event', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            self.client.post(reverse('renew-book-librarian', \
+                        kwargs={'pk': self.test_bookinstance1.pk}), \
+                        {'renewal_date': valid_date_in_future})
+        self.test_bookinstance1.refresh_from_db()
+        self.assertEqual(self.test_bookinstance1.due_back, due_back)
+
     def test_form_invalid_renewal_date_in_past(self):
         login = self.client.login(username='testuser2',password='2HJ1vRV0Z&3iD')
         date_in_past = datetime.date.today()-datetime.timedelta(weeks=1)
@@ -308,9 +321,132 @@ class RenewBookInstancesViewTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertFormError(response, 'form', 'renewal_date', 'Invalid date - renewal more than 4 weeks ahead.')
 
+    def test_form_initial_version_matches_book_instance(self):
+        login = self.client.login(username='testuser2',password='2HJ1vRV0Z&3iD')
+        response = self.client.get(reverse('renew-book-librarian', \
+                        kwargs={'pk': self.test_bookinstance1.pk}))
+        self.assertEqual(response.context['form'].initial['version'],\
+                        self.test_bookinstance1.version)
+
+    def test_stale_renewal_reports_conflict(self):
+        login = self.client.login(username='testuser2',password='2HJ1vRV0Z&3iD')
+        stale_version = self.test_bookinstance1.version
+
+        # Another librarian renews the copy first
+        first_date = datetime.date.today()+datetime.timedelta(weeks=1)
+        self.test_bookinstance1.due_back = first_date
+        self.test_bookinstance1.save_changed(['due_back'])
+
+        valid_date_in_future = datetime.date.today()+datetime.timedelta(weeks=2)
+        response = self.client.post(reverse('renew-book-librarian', \
+                        kwargs={'pk': self.test_bookinstance1.pk}), \
+                        {'renewal_date': valid_date_in_future, 'version': stale_version})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].non_field_errors())
+
+        # The first renewal was not overwritten
+        self.test_bookinstance1.refresh_from_db()
+        self.assertEqual(self.test_bookinstance1.due_back, first_date)
+
 
 
 
 
 
     pass
+
+class BookUpdateViewTest(TestCase):
+    def setUp(self):
+        test_user = User.objects.create_user(
+            username='testuser2',
+            password='2HJ1vRV0Z&3iD'
+        )
+        permission = Permission.objects.get(name='Set book as returned')
+        test_user.user_permissions.add(permission)
+
+        self.test_author = Author.objects.create(first_name='John', last_name='Smith')
+        self.test_genre = Genre.objects.create(name='Fantasy')
+        self.test_language = Language.objects.create(name='English')
+        self.test_book = Book.objects.create(
+            title='Book Title',
+            summary='My book summary.',
+            isbn='ABCDEFG',
+            author=self.test_author,
+            language=self.test_language,
+        )
+
+    def post_update(self, **changes):
+        data = {
+            'title': self.test_book.title,
+            'author': self.test_author.pk,
+            'summary': self.test_book.summary,
+            'isbn': self.test_book.isbn,
+            'genre': [self.test_genre.pk],
+            'language': self.test_language.pk,
+            'version': self.test_book.version,
+        }
+        data.update(changes)
+        self.client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        return self.client.post(reverse('book-update',
+                        kwargs={'pk': self.test_book.pk}), data)
+
+    def test_update_writes_changed_fields(self):
+        response = self.post_update(title='New Title')
+        self.assertRedirects(response, self.test_book.get_absolute_url())
+        self.test_book.refresh_from_db()
+        self.assertEqual(self.test_book.title, 'New Title')
+        self.assertEqual(self.test_book.version, 1)
+        self.assertEqual(list(self.test_book.genre.all()), [self.test_genre])
+
+    def test_stale_update_reports_conflict(self):
+        Book.objects.get(pk=self.test_book.pk).save()
+        response = self.post_update(title='New Title')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].non_field_errors())
+        self.test_book.refresh_from_db()
+        self.assertEqual(self.test_book.title, 'Book Title')
+
+class AutocompleteViewTest(TestCase):
+    def setUp(self):
+        test_user = User.objects.create_user(
+            username='testuser2',
+            password='2HJ1vRV0Z&3iD'
+        )
+        permission = Permission.objects.get(name='Set book as returned')
+        test_user.user_permissions.add(permission)
+
+        for author_id in range(15):
+            Author.objects.create(first_name=f'Jane {author_id}', last_name='Smith')
+        Author.objects.create(first_name='John', last_name='Doe')
+        Genre.objects.create(name='Fantasy')
+        Genre.objects.create(name='Science Fiction')
+
+    def test_redirect_if_not_logged_in(self):
+        response = self.client.get(reverse('autocomplete', args=['author']))
+        self.assertEqual(response.status_code, 302)
+
+    def test_prefix_search_is_limited(self):
+        self.client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        response = self.client.get(reverse('autocomplete', args=['author']), {'q': 'smi'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 10)
+
+    def test_prefix_search_first_name(self):
+        self.client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        response = self.client.get(reverse('autocomplete', args=['author']), {'q': 'joh'})
+        self.assertEqual([r['text'] for r in response.json()['results']], ['Doe, John'])
+
+    def test_prefix_search_ignores_case(self):
+        self.client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        response = self.client.get(reverse('autocomplete', args=['author']), {'q': 'DOE'})
+        self.assertEqual([r['text'] for r in response.json()['results']], ['Doe, John'])
+
+    def test_genre_search(self):
+        self.client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        response = self.client.get(reverse('autocomplete', args=['genre']), {'q': 'sci'})
+        self.assertEqual([r['text'] for r in response.json()['results']], ['Science Fiction'])
+
+    def test_unknown_model_is_404(self):
+        self.client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        response = self.client.get(reverse('autocomplete', args=['bookinstance']))
+        self.assertEqual(response.status_code, 404)
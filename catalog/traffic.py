@@ -0,0 +1,170 @@
+"""
+Sampled request log for regression testing against real traffic.
+
+catalog.middleware.TrafficCaptureMiddleware appends one JSON line per sampled
+request to TRAFFIC_LOG, e.g.
+
+    {"time": 1700000000.0, "method": "GET", "view": "books", "args": [],
+     "kwargs": {}, "params": {"page": ["2"]}, "role": "patron",
+     "status": 200, "latency": 0.031, "queries": 4}
+
+Entries are anonymized: no path, IP, user, session or request body, only the
+URL name, the user's role, and route arguments and query parameters; values
+are kept only for those named in TRAFFIC_KWARGS and TRAFFIC_PARAMS. Admin and
+authentication pages aren't captured. The
+`replay_traffic` command replays a log and compares latency and query counts
+per route.
+"""
+import json
+import math
+import random
+import statistics
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.urls import Resolver404, resolve
+
+# Kept with their values; anything else may be personal, e.g. an admin search
+TRAFFIC_PARAMS = ['page', 'genre', 'language', 'author', 'available', 'since',
+                  'limit', 'o', 'status__exact', 'branch__id__exact']
+# Route arguments kept with their values, by URL name; those of other routes
+# may identify a user (e.g. admin change pages) and are replaced.
+TRAFFIC_KWARGS = {
+    'book-detail': ['pk'],
+    'author-detail': ['pk'],
+    'checkout-book': ['pk'],
+    'renew-book-librarian': ['pk'],
+    'autocomplete': ['model'],
+    'api-list': ['resource'],
+    'api-book-availability': ['pk'],
+    'sitemap-shard': ['name'],
+}
+# Never captured: their URLs and parameters carry credentials (password
+# reset tokens) or user ids, and they aren't catalog traffic.
+EXCLUDED_URL_NAMES = ['metrics', 'login', 'logout', 'password_change',
+                      'password_change_done', 'password_reset',
+                      'password_reset_done', 'password_reset_confirm',
+                      'password_reset_complete']
+EXCLUDED_NAMESPACES = ['admin']
+REDACTED = 'redacted'
+
+# Roles, most privileged first
+ROLES = ['staff', 'librarian', 'patron', 'anonymous']
+
+_write_lock = threading.Lock()
+
+
+def sampled():
+    return random.random() < getattr(settings, 'TRAFFIC_SAMPLE_RATE', 0.01)
+
+
+def role(user):
+    if user is None or not user.is_authenticated:
+        return 'anonymous'
+    if user.is_staff:
+        return 'staff'
+    if user.has_perm('catalog.can_mark_returned'):
+        return 'librarian'
+    return 'patron'
+
+
+def anonymize(query):
+    """Query parameters of `query` (a QueryDict), as {name: [values]}."""
+    allowed = getattr(settings, 'TRAFFIC_PARAMS', TRAFFIC_PARAMS)
+    return {
+        name: values if name in allowed else [REDACTED] * len(values)
+        for name, values in query.lists()
+    }
+
+
+def route_arguments(match):
+    """(args, kwargs) of `match`, with values outside TRAFFIC_KWARGS replaced."""
+    allowed = getattr(settings, 'TRAFFIC_KWARGS', TRAFFIC_KWARGS)\
+        .get(match.view_name, [])
+    kwargs = {name: value if name in allowed else REDACTED
+              for name, value in match.kwargs.items()}
+    return [REDACTED] * len(match.args), kwargs
+
+
+def excluded(match):
+    return match.url_name is None or match.url_name in EXCLUDED_URL_NAMES \
+        or any(namespace in EXCLUDED_NAMESPACES for namespace in match.namespaces)
+
+
+def entry(request, response, started, latency, queries):
+    """The log entry for `request`, or None if it isn't worth replaying."""
+    match = request.resolver_match
+    if match is None:
+        # Answered before URL resolution, e.g. from the page cache
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+    if excluded(match):
+        return None
+    args, kwargs = route_arguments(match)
+    return {
+        'time': started,
+        'method': request.method,
+        'view': match.view_name,
+        'args': args,
+        'kwargs': kwargs,
+        'params': anonymize(request.GET),
+        # No user if a middleware answered before authentication
+        'role': role(getattr(request, 'user', None)),
+        'status': response.status_code,
+        'latency': latency,
+        'queries': queries,
+    }
+
+
+def write(path, record):
+    line = json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+    # One write() per line on a file opened for appending, so lines from
+    # several processes don't interleave
+    with _write_lock, open(path, 'a') as f:
+        f.write(line)
+
+
+def read(path):
+    """Log entries in time order, skipping a torn last line."""
+    entries = []
+    with open(path) as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return sorted(entries, key=lambda record: record['time'])
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def summarize(results):
+    """Per-route statistics of (view, status, latency, queries) results:
+        {view: {count, errors, p50, p95 (seconds), queries (mean)}}.
+    """
+    routes = defaultdict(list)
+    for view, status, latency, queries in results:
+        routes[view].append((status, latency, queries))
+    return {
+        view: {
+            'count': len(rows),
+            'errors': sum(1 for status, _, _ in rows if status >= 500),
+            'p50': percentile([latency for _, latency, _ in rows], 0.5),
+            'p95': percentile([latency for _, latency, _ in rows], 0.95),
+            'queries': statistics.mean(queries for _, _, queries in rows),
+        }
+        for view, rows in sorted(routes.items())
+    }
+
+
+def recorded(entries):
+    """summarize() of the timings captured with the log."""
+    return summarize((record['view'], record['status'], record['latency'],
+                      record['queries']) for record in entries)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.index, name='index'),
@@ -13,6 +13,7 @@ urlpatterns = [
 
 urlpatterns += [
     path('book/<uuid:pk>/renew/', views.renew_book_librarian, name='renew-book-librarian'),
+    path('book/<int:pk>/checkout/', views.checkout_book, name='checkout-book'),
 ]
 
 urlpatterns += [
@@ -26,3 +27,13 @@ urlpatterns += [
     path('book/<int:pk>/update', views.BookUpdate.as_view(), name='book-update'),
     path('book/<int:pk>/delete', views.BookDelete.as_view(), name='book-delete'),
 ]
+
+urlpatterns += [
+    path('autocomplete/<str:model>/', views.autocomplete, name='autocomplete'),
+]
+
+urlpatterns += [
+    path('api/changes/', api.changes, name='api-changes'),
+    path('api/<str:resource>/', api.api_list, name='api-list'),
+    path('api/books/<int:pk>/availability/', api.book_availability, name='api-book-availability'),
+]
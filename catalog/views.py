@@ -2,14 +2,37 @@ import datetime
 
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.http import HttpResponseRedirect
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.forms import modelform_factory
+from django.db.models.functions import Lower
+from django.http import (Http404, HttpResponsePermanentRedirect,
+                         HttpResponseRedirect, JsonResponse)
 from django.shortcuts import render, get_object_or_404
 from django.urls import reverse, reverse_lazy
+from django.utils.translation import gettext_lazy as _
 from django.views import generic
+from django.views.decorators.http import require_POST
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 
-from catalog.forms import RenewBookForm
-from .models import Book, Author, BookInstance, Genre
+from catalog import facets, inventory
+from catalog.checkout import NoCopyAvailable, check_out
+from catalog.objectcache import fill_related, get_cached_or_404
+from catalog.forms import BookForm, RenewBookForm, VersionedModelForm
+from catalog.loans import most_borrowed_books, record_loan_event
+from .models import Book, Author, BookInstance, Genre, Language, ConcurrentUpdateError
+
+CONFLICT_MESSAGE = _('This record was changed by someone else while you were '
+                     'editing it. Review the current values and submit again.')
+
+def report_conflict(form, instance):
+    """Flag a lost update on `form` and re-arm it with the current version of
+        `instance`, so that a deliberate resubmit overwrites the newer row.
+    """
+    instance.refresh_from_db()
+    form.add_error(None, CONFLICT_MESSAGE)
+    form.data = form.data.copy()
+    form.data['version'] = instance.version
 
 # Create your views here.
 def index(request):
@@ -40,17 +63,54 @@ def index(request):
         'num_genres': num_genres,
         'num_harry_potter_books': num_harry_potter_books,
         'num_visits': num_visits,
+        'most_borrowed': most_borrowed_books(limit=5),
     }
 
     return render(request, 'index.html', context=context)
 
 class BookListView(generic.ListView):
+    """Books narrowed by the facets in the query string, e.g.
+        ?genre=1&genre=2&language=3&available=1 (see catalog.facets).
+    """
     model = Book
     paginate_by = 5
+    template_name = 'catalog/book_list.html'
+    context_object_name = 'book_list'
+
+    def get_queryset(self):
+        self.browse = facets.Browse(self.request.GET)
+        # Ids in id order; only the page shown is extracted and loaded
+        return self.browse.book_ids
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator, page, book_ids, is_paginated = \
+            super().paginate_queryset(queryset, page_size)
+        books = Book.objects.select_related('author').in_bulk(book_ids)
+        books = [books[pk] for pk in book_ids if pk in books]
+        return paginator, page, books, is_paginated
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['facets'] = self.browse.facets
+        context['facet_query'] = self.browse.query
+        return context
 
 class BookDetailView(generic.DetailView):
     model = Book
 
+    def get_object(self, queryset=None):
+        book = get_cached_or_404(Book, self.kwargs['pk'])
+        fill_related(book, 'author', 'language')
+        return book
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Precomputed by the build_recommendations command
+        context['recommendations'] = self.object.recommendations\
+                .select_related('recommended')
+        context['availability'] = inventory.available_at(self.object)
+        return context
+
 class AuthorListView(generic.ListView):
     model = Author
     paginate_by = 5
@@ -58,6 +118,9 @@ class AuthorListView(generic.ListView):
 class AuthorDetailView(generic.DetailView):
     model = Author
 
+    def get_object(self, queryset=None):
+        return get_cached_or_404(Author, self.kwargs['pk'])
+
 class LoanedBookByUserListView(LoginRequiredMixin, generic.ListView):
     """Generic class-based view listing all books on loan to current user"""
     model = BookInstance
@@ -69,25 +132,40 @@ class LoanedBookByUserListView(LoginRequiredMixin, generic.ListView):
         return BookInstance.objects\
                 .filter(borrower=self.request.user)\
                 .filter(status__exact='o')\
+                .select_related('book', 'borrower')\
                 .order_by('due_back')
 
 class AllBorrowedListView(PermissionRequiredMixin, generic.ListView):
     model = BookInstance
-    permission_required = 'can_mark_returned'
+    permission_required = 'catalog.can_mark_returned'
     template_name = 'catalog/all_borrowed_list.html'
     paginate_by=10
 
     def get_queryset(self):
         return BookInstance.objects\
                 .filter(status__exact='o')\
+                .select_related('book', 'borrower')\
                 .order_by('due_back')
 
+def get_book_instance(pk):
+    """The copy with id `pk`, or with legacy id `pk` if it has been re-keyed
+        by the `rekey_copies` command.
+    """
+    try:
+        return BookInstance.objects.get(pk=pk)
+    except BookInstance.DoesNotExist:
+        return get_object_or_404(BookInstance, legacy_id=pk)
+
 @login_required
 @permission_required('catalog.can_mark_returned', raise_exception=True)
 def renew_book_librarian(request, pk):
     """View function for renewing a specific book instance by a Libraian, or
         any other user with the `can_mark_returned` permission."""
-    book_instance = get_object_or_404(BookInstance, pk=pk)
+    book_instance = get_book_instance(pk)
+    if book_instance.pk != pk and request.method != 'POST':
+        # Old random id from before the copy was re-keyed
+        return HttpResponsePermanentRedirect(
+            reverse('renew-book-librarian', args=[book_instance.pk]))
 
     # If this is a POST request, process Form data
     if request.method == 'POST':
@@ -95,16 +173,26 @@ def renew_book_librarian(request, pk):
         form = RenewBookForm(request.POST)
 
         if form.is_valid():
-            # Write clean data back to database
+            # Write clean data back to database, only if nobody else renewed
+            # the copy since the form was rendered.
+            if form.cleaned_data['version'] is not None:
+                book_instance.version = form.cleaned_data['version']
             book_instance.due_back = form.cleaned_data['renewal_date']
-            book_instance.save()
-
-            return HttpResponseRedirect(reverse('all-borrowed'))
+            try:
+                # The renewal and its loan event and rollups commit together
+                with transaction.atomic():
+                    book_instance.save_changed(['due_back'])
+                    record_loan_event(book_instance, 'n')
+            except ConcurrentUpdateError:
+                report_conflict(form, book_instance)
+            else:
+                return HttpResponseRedirect(reverse('all-borrowed'))
     else:
         proposed_renewal_date = \
             datetime.date.today() + datetime.timedelta(weeks=3)
         form = RenewBookForm(initial={
-            'renewal_date': proposed_renewal_date
+            'renewal_date': proposed_renewal_date,
+            'version': book_instance.version,
         })
 
     context = {
@@ -114,23 +202,124 @@ def renew_book_librarian(request, pk):
 
     return render(request, 'catalog/book_renew_librarian.html', context)
 
+@require_POST
+@login_required
+@permission_required('catalog.can_mark_returned', raise_exception=True)
+def checkout_book(request, pk):
+    """Lend any available copy of a book, e.g. POST /catalog/book/1/checkout/
+        with `borrower` (a username) and optionally `branch` (an id).
+        Answers 409 when no copy is available.
+    """
+    book = get_object_or_404(Book.objects.only('pk'), pk=pk)
+    try:
+        borrower = User.objects.get(username=request.POST.get('borrower', ''))
+    except User.DoesNotExist:
+        return JsonResponse({'error': _('Unknown borrower.')}, status=400)
+    try:
+        branch_id = int(request.POST['branch']) if request.POST.get('branch') else None
+    except ValueError:
+        return JsonResponse({'error': _('Invalid branch.')}, status=400)
+
+    try:
+        book_instance = check_out(book.pk, borrower, branch_id)
+    except NoCopyAvailable:
+        return JsonResponse({'error': _('No copy of this book is available.')},
+                            status=409)
+    return JsonResponse({
+        'copy': book_instance.pk,
+        'branch': book_instance.branch_id,
+        'due_back': book_instance.due_back,
+        'renew_url': reverse('renew-book-librarian', args=[book_instance.pk]),
+    })
+
+AUTOCOMPLETE_LIMIT = 10
+
+# Prefix lookups available to the autocomplete endpoint; each field has a
+# Lower() index (see the models' Meta.indexes)
+AUTOCOMPLETE_SEARCHES = {
+    'author': (Author, ['last_name', 'first_name']),
+    'genre': (Genre, ['name']),
+    'language': (Language, ['name']),
+}
+
+def prefix_range(prefix):
+    """Bounds of the strings starting with `prefix`: a range lookup can seek
+        an index where LIKE 'prefix%' scans it.
+    """
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+@login_required
+@permission_required('catalog.can_mark_returned', raise_exception=True)
+def autocomplete(request, model):
+    """JSON prefix search used by the book form pickers, e.g.
+        /catalog/autocomplete/author/?q=smi
+    """
+    try:
+        model_class, search_fields = AUTOCOMPLETE_SEARCHES[model]
+    except KeyError:
+        raise Http404(f'No autocomplete for {model}')
+
+    query = request.GET.get('q', '').strip().lower()
+    base = model_class.objects.only('pk', *search_fields)
+    if not query:
+        results = base.order_by(*search_fields)[:AUTOCOMPLETE_LIMIT]
+    else:
+        # One index range scan per field, merged; OR-ing them would scan
+        start, end = prefix_range(query)
+        matches = {}
+        for field in search_fields:
+            for obj in base.alias(key=Lower(field))\
+                    .filter(key__gte=start, key__lt=end)\
+                    .order_by('key')[:AUTOCOMPLETE_LIMIT]:
+                matches[obj.pk] = obj
+        results = sorted(matches.values(), key=lambda obj: [
+            getattr(obj, field).lower() for field in search_fields
+        ])[:AUTOCOMPLETE_LIMIT]
+
+    return JsonResponse({'results': [
+        {'id': obj.pk, 'text': str(obj)} for obj in results
+    ]})
+
+class OptimisticUpdateMixin:
+    """UpdateView mixin writing only the changed fields, conditioned on the
+        version the form was rendered with. A conflict is reported back on
+        the form instead of overwriting the other editor's changes.
+    """
+    def get_form_class(self):
+        if self.form_class is not None:
+            return self.form_class
+        return modelform_factory(self.model, form=VersionedModelForm,
+                                 fields=self.fields)
+
+    def form_valid(self, form):
+        self.object = form.save(commit=False)
+        if form.cleaned_data['version'] is not None:
+            self.object.version = form.cleaned_data['version']
+        try:
+            self.object.save_changed(form.changed_data)
+        except ConcurrentUpdateError:
+            report_conflict(form, self.object)
+            return self.form_invalid(form)
+        form.save_m2m()
+        return HttpResponseRedirect(self.get_success_url())
+
 class AuthorCreate(PermissionRequiredMixin, CreateView):
     """For authenticated and permissioned users, create a new Author entry.
         success URL defaults to page displaying new/updated info, here will be:
         'author-detail'
     """
     model = Author
-    permission_required = 'can_mark_returned'
+    permission_required = 'catalog.can_mark_returned'
     fields = ['first_name', 'last_name', 'date_of_birth', 'date_of_death']
     # initial = {'date_of_death': '11/06/2020'}  # for example of initial data
 
-class AuthorUpdate(PermissionRequiredMixin, UpdateView):
+class AuthorUpdate(PermissionRequiredMixin, OptimisticUpdateMixin, UpdateView):
     """For authenticated and permissioned users, create a new Author entry
         success URL defaults to page displaying new/updated info, here will be:
         'author-detail'
     """
     model = Author
-    permission_required = 'can_mark_returned'
+    permission_required = 'catalog.can_mark_returned'
     # fields = '__all__' # BAD Idea. Future model alterations can cause this to be unsafe.
     fields = ['first_name', 'last_name', 'date_of_birth', 'date_of_death']
 
@@ -140,7 +329,7 @@ class AuthorDelete(PermissionRequiredMixin, DeleteView):
         author-detail.
     """
     model = Author
-    permission_required = 'can_mark_returned'
+    permission_required = 'catalog.can_mark_returned'
     # Must be overridden
     # Lazy because we're providing a url to a class-based view attribute.
     success_url = reverse_lazy('authors')
@@ -151,17 +340,17 @@ class BookCreate(PermissionRequiredMixin, CreateView):
         'book-detail'
     """
     model = Book
-    permission_required = 'can_mark_returned'
-    fields = ['title', 'author', 'summary', 'isbn', 'genre', 'language']
+    permission_required = 'catalog.can_mark_returned'
+    form_class = BookForm
 
-class BookUpdate(PermissionRequiredMixin, UpdateView):
+class BookUpdate(PermissionRequiredMixin, OptimisticUpdateMixin, UpdateView):
     """For authenticated and permissioned users, create a new Book entry.
         success URL defaults to page displaying new/updated info, here will be:
         'book-detail'
     """
     model = Book
-    permission_required = 'can_mark_returned'
-    fields = ['title', 'author', 'summary', 'isbn', 'genre', 'language']
+    permission_required = 'catalog.can_mark_returned'
+    form_class = BookForm
 
 class BookDelete(PermissionRequiredMixin, DeleteView):
     """For authenticated and permissioned users, create a new Book entry.
@@ -169,6 +358,6 @@ class BookDelete(PermissionRequiredMixin, DeleteView):
         'book-detail' to show details.
     """
     model = Book
-    permission_required = 'can_mark_returned'
+    permission_required = 'catalog.can_mark_returned'
     fields = ['title', 'author', 'summary', 'isbn', 'genre', 'language']
     success_url = reverse_lazy('books')
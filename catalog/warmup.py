@@ -0,0 +1,76 @@
+"""
+Warm-up run by the WSGI/ASGI entry points when WARM_UP_ON_STARTUP is set, so
+that the first requests a worker serves don't pay for building the URL
+resolver, compiling templates and looking up content types.
+"""
+import logging
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import DatabaseError, connections
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+# Templates of the busiest pages, parents first
+WARM_UP_TEMPLATES = [
+    'base_generic.html',
+    'index.html',
+    'catalog/book_list.html',
+    'catalog/book_detail.html',
+    'catalog/author_list.html',
+    'catalog/author_detail.html',
+]
+
+
+def load_urls():
+    """Build the reverse lookup tables of the root resolver and of every
+        namespace under it, e.g. 'admin'.
+    """
+    resolvers = [get_resolver()]
+    while resolvers:
+        resolver = resolvers.pop()
+        resolver.reverse_dict
+        resolvers.extend(sub for _, sub in resolver.namespace_dict.values())
+
+
+def load_templates():
+    # Compiled templates stay in the cached template loader
+    for name in getattr(settings, 'WARM_UP_TEMPLATES', WARM_UP_TEMPLATES):
+        get_template(name)
+
+
+def load_content_types():
+    """Fill the ContentType cache used by permission checks and the admin."""
+    ContentType.objects.get_for_models(*apps.get_models())
+
+
+def warm_up():
+    """Run each warm-up step and return the seconds it took, by step name.
+        A database that can't be reached yet only skips the content types.
+    """
+    timings = {}
+    for step in (load_urls, load_templates, load_content_types):
+        start = time.perf_counter()
+        try:
+            step()
+        except DatabaseError as error:
+            logger.warning('Warm-up step %s failed: %s', step.__name__, error)
+            continue
+        timings[step.__name__] = time.perf_counter() - start
+    logger.info('Warmed up in %.3fs: %s', sum(timings.values()),
+                ', '.join(f'{name} {seconds:.3f}s' for name, seconds in timings.items()))
+    return timings
+
+
+def warm_up_on_startup():
+    """Called by locallibrary.wsgi and locallibrary.asgi."""
+    if not getattr(settings, 'WARM_UP_ON_STARTUP', False):
+        return
+    warm_up()
+    # Servers that fork after loading the application (e.g. gunicorn
+    # --preload) must not share the connection opened here.
+    connections.close_all()
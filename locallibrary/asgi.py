@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'locallibrary.settings')
 
 application = get_asgi_application()
+
+# Preload URLs, templates and content types if WARM_UP_ON_STARTUP is set
+from catalog.warmup import warm_up_on_startup
+warm_up_on_startup()
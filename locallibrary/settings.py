@@ -11,6 +11,8 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
 import os
+import sys
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -28,6 +30,12 @@ DEBUG = True
 
 ALLOWED_HOSTS = []
 
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+
+# Flag related objects loaded one row at a time (catalog.lazyload): the test
+# suite fails on them, DEBUG logs them.
+LAZY_LOAD_DETECTION = 'raise' if TESTING else ('log' if DEBUG else None)
+
 LOGIN_REDIRECT_URL = '/'
 
 # UPDATE this when using real email output.
@@ -46,11 +54,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'catalog.middleware.MetricsMiddleware',
+    'catalog.middleware.TrafficCaptureMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'catalog.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'catalog.middleware.RateLimitMiddleware',
+    'catalog.middleware.AnonymousPageCacheMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -75,6 +88,11 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'locallibrary.wsgi.application'
 
+# Startup warm-up (catalog.warmup): the WSGI/ASGI entry points build the URL
+# resolver, compile the busiest templates and cache content types before the
+# worker takes requests. Profile with the `startup_profile` command.
+WARM_UP_ON_STARTUP = False
+
 
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
@@ -87,6 +105,96 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Local-memory or file-based backends both work with the page cache.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Anonymous page cache (catalog.middleware.AnonymousPageCacheMiddleware):
+# pages are fresh for PAGE_CACHE_TIMEOUT seconds, then served stale for up to
+# PAGE_CACHE_STALE_TIMEOUT more while one request regenerates them.
+PAGE_CACHE_TIMEOUT = 60
+PAGE_CACHE_STALE_TIMEOUT = 300
+
+# Object cache (catalog.objectcache): rows are kept OBJECT_CACHE_TIMEOUT
+# seconds in the shared cache and OBJECT_CACHE_LOCAL_TIMEOUT seconds in each
+# process's LRU of OBJECT_CACHE_LOCAL_SIZE entries; the latter bounds how long
+# another process can serve a row after it changed.
+OBJECT_CACHE_TIMEOUT = 300
+OBJECT_CACHE_LOCAL_TIMEOUT = 5
+OBJECT_CACHE_LOCAL_SIZE = 1000
+
+# Admission control (catalog.middleware.RateLimitMiddleware), by URL name.
+# Token buckets per client IP and per user: `burst` requests at once, then
+# `rate` per second.
+RATE_LIMITS = {
+    'books': {'rate': 5, 'burst': 20},
+    'authors': {'rate': 5, 'burst': 20},
+    'book-detail': {'rate': 10, 'burst': 40},
+    'author-detail': {'rate': 10, 'burst': 40},
+    'api-list': {'rate': 5, 'burst': 20},
+    'login': {'rate': 0.2, 'burst': 5},
+    'password_reset': {'rate': 0.1, 'burst': 3},
+}
+# Requests allowed to run at once across all workers
+CONCURRENCY_LIMITS = {
+    'books': 16,
+    'authors': 16,
+    'api-list': 8,
+}
+# Buckets and slots are kept in the RATE_LIMIT_CACHE_ALIAS cache, which must be
+# shared by all workers; with a per-process one the limits are off. The test
+# suite would trip them too; tests that need them enable them.
+RATE_LIMIT_CACHE_ALIAS = 'default'
+RATE_LIMIT_ENABLED = not TESTING and CACHES[RATE_LIMIT_CACHE_ALIAS]['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache')
+
+# Archival (catalog.archive, `archive_cold_rows` command): copies in
+# ARCHIVE_COPY_STATUSES with no loan activity for ARCHIVE_COPY_IDLE_DAYS move
+# to the archive tables with their history; loan events of other copies
+# follow after ARCHIVE_LOAN_EVENT_DAYS. There is no "retired" status, so
+# copies left in maintenance are the cold ones.
+ARCHIVE_COPY_STATUSES = ['m']
+ARCHIVE_COPY_IDLE_DAYS = 365
+ARCHIVE_LOAN_EVENT_DAYS = 2 * 365
+
+# Change feed (catalog.changefeed): compaction drops delete tombstones after
+# CHANGE_FEED_TOMBSTONE_DAYS, so mirrors further behind must re-export.
+CHANGE_FEED_TOMBSTONE_DAYS = 30
+
+# Sessions (catalog.sessions): served from the cache, and a changed session is
+# written to the database at most every SESSION_DB_WRITE_INTERVAL seconds
+# unless the user logs in or out. The SESSION_CACHE_ALIAS cache must be
+# shared by all workers (memcached, redis); with a per-process one Django's
+# database engine is used instead. Purge expired rows with the
+# `purge_sessions` command.
+SESSION_CACHE_ALIAS = 'default'
+SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+if CACHES[SESSION_CACHE_ALIAS]['BACKEND'] not in (
+        'django.core.cache.backends.locmem.LocMemCache',
+        'django.core.cache.backends.dummy.DummyCache'):
+    SESSION_ENGINE = 'catalog.sessions'
+SESSION_DB_WRITE_INTERVAL = 60
+
+# Traffic capture (catalog.traffic): when TRAFFIC_LOG is a file path, a
+# TRAFFIC_SAMPLE_RATE share of requests is logged there, anonymized, for the
+# `replay_traffic` command.
+TRAFFIC_LOG = None
+TRAFFIC_SAMPLE_RATE = 0.01
+
+# Metrics (catalog.metrics): each worker process writes its samples to a file
+# in METRICS_DIR, merged by the /metrics view. Empty the directory when the
+# server (re)starts so counters from a previous deployment are not reported.
+METRICS_DIR = os.path.join(tempfile.gettempdir(), 'locallibrary-metrics')
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -124,6 +232,23 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# `collectstatic` copies assets here under content-hashed names, which
+# catalog.assets.serve_static serves with far-future immutable caching.
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
+if TESTING:
+    # The manifest only exists after collectstatic
+    STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+# Response compression (catalog.middleware.CompressionMiddleware)
+COMPRESSION_MIN_SIZE = 500
+
+# Sitemaps (catalog.sitemaps): the build_sitemaps command writes them to
+# SITEMAP_ROOT with absolute URLs on SITEMAP_BASE_URL.
+SITEMAP_ROOT = BASE_DIR / 'sitemaps'
+SITEMAP_BASE_URL = 'http://localhost:8000'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
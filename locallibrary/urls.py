@@ -33,6 +33,33 @@ from django.conf import settings
 from django.conf.urls.static import static
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 
+# Outside DEBUG, serve collected (fingerprinted) assets with long-lived caching
+from django.urls import re_path
+from catalog.assets import serve_static
 urlpatterns += [
+    re_path(r'^static/(?P<path>.*)$', serve_static),
+]
+
+# Password reset emails are sent by the background workers
+from django.contrib.auth import views as auth_views
+from catalog.forms import QueuedPasswordResetForm
+urlpatterns += [
+    path('accounts/password_reset/',
+         auth_views.PasswordResetView.as_view(form_class=QueuedPasswordResetForm),
+         name='password_reset'),
     path('accounts/', include('django.contrib.auth.urls')),
 ]
+
+# Prometheus scrape endpoint
+from catalog.metrics import metrics_view
+urlpatterns += [
+    path('metrics', metrics_view, name='metrics'),
+]
+
+# Sitemaps written by the build_sitemaps command
+from catalog.sitemaps import sitemap_view
+urlpatterns += [
+    path('sitemap.xml', sitemap_view, name='sitemap'),
+    re_path(r'^(?P<name>sitemap-[a-z]+-[0-9]+\.xml)$', sitemap_view,
+            name='sitemap-shard'),
+]